@@ -0,0 +1,10 @@
+from .lease import LeaderLease, PROCESS_ID, scheduler_lease
+from .channel import ClusterChannel, cluster_channel
+
+__all__ = [
+    'LeaderLease',
+    'PROCESS_ID',
+    'scheduler_lease',
+    'ClusterChannel',
+    'cluster_channel'
+]
@@ -0,0 +1,188 @@
+# app/core/cluster/channel.py
+"""
+进程间消息通道（基于数据库表）
+
+多个 uvicorn worker 共用同一个数据库，消息写入 cluster_messages 表，
+各进程的通道线程按自增 ID 轮询读取其他进程发出的消息并分发给订阅的处理函数：
+- publish 只放入发件箱，由通道线程每个周期合并成一个事务写入
+- 每个进程维护 member:进程标识 的存活租约；没有其他存活进程时，
+  publish 直接丢弃、也不轮询，单进程部署没有额外开销
+- 超过保留时间的消息定期清理
+
+配置（环境变量）：
+- CLUSTER_POLL_INTERVAL：轮询间隔（秒），默认 0.2
+- CLUSTER_MESSAGE_TTL：消息保留时间（秒），默认 60
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import delete, func, insert, select
+
+from app.core.db.database import engine
+from .lease import CLUSTER_HEARTBEAT, PROCESS_ID, LeaderLease
+from .models import cluster_leases_table, cluster_messages_table
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_POLL_INTERVAL = float(os.getenv("CLUSTER_POLL_INTERVAL", "0.2"))
+CLUSTER_MESSAGE_TTL = int(os.getenv("CLUSTER_MESSAGE_TTL", "60"))
+
+# 单次轮询最多读取的消息数
+_POLL_BATCH = 1000
+
+Handler = Callable[[dict, str], None]  # (消息内容, 发送者进程标识)
+
+
+class ClusterChannel:
+    """基于数据库表的进程间广播"""
+
+    def __init__(self, owner: str = PROCESS_ID):
+        self.owner = owner
+        self.member = LeaderLease(f"member:{owner}", owner=owner)
+        self.handlers: Dict[str, List[Handler]] = {}
+        self.peers = 0  # 其他存活进程数
+        self._outbox: List[dict] = []
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._beat_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._published = 0
+        self._received = 0
+
+    @property
+    def has_peers(self) -> bool:
+        return self.peers > 0
+
+    def live_members(self) -> Set[str]:
+        """当前存活的进程标识（包括本进程），用于识别已退出进程遗留的执行记录"""
+        leases = cluster_leases_table
+        with engine.connect() as conn:
+            owners = set(conn.execute(
+                select(leases.c.owner)
+                .where(leases.c.name.like("member:%"), leases.c.expires_at >= datetime.now())
+            ).scalars())
+        owners.add(self.owner)
+        return owners
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        """订阅主题（处理函数在通道线程中调用，不要阻塞）"""
+        self.handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic: str, payload: dict) -> bool:
+        """广播给其他进程（不包括自己），没有其他进程时返回 False"""
+        if not self.has_peers or self._thread is None:
+            return False
+        row = {
+            "topic": topic,
+            "sender": self.owner,
+            "payload": json.dumps(payload, ensure_ascii=False, default=str),
+            "created_at": datetime.now(),
+        }
+        with self._lock:
+            self._outbox.append(row)
+        return True
+
+    # ========== 通道线程 ==========
+
+    def start(self) -> None:
+        """注册存活心跳并启动通道线程（从当前最新的消息之后开始接收）"""
+        if self._thread is not None:
+            return
+        with engine.connect() as conn:
+            self._last_id = conn.execute(select(func.max(cluster_messages_table.c.id))).scalar() or 0
+        self._heartbeat()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cluster-channel", daemon=True)
+        self._thread.start()
+        logger.info(f"🔗 进程间通道已启动: {self.owner}, 其他进程: {self.peers}")
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(5)
+        self._thread = None
+        self._flush()
+        try:
+            self.member.release()
+        except Exception as e:
+            logger.warning(f"注销进程失败: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(CLUSTER_POLL_INTERVAL):
+            try:
+                if time.monotonic() - self._beat_at >= CLUSTER_HEARTBEAT:
+                    self._heartbeat()
+                self._flush()
+                if self.has_peers:
+                    self._poll()
+            except Exception as e:
+                logger.warning(f"进程间通道处理失败: {e}")
+
+    def _heartbeat(self) -> None:
+        """续约存活租约，统计其他存活进程，清理过期消息"""
+        self._beat_at = time.monotonic()
+        self.member.try_acquire()
+        now = datetime.now()
+        leases = cluster_leases_table
+        with engine.begin() as conn:
+            self.peers = conn.execute(
+                select(func.count()).select_from(leases)
+                .where(leases.c.name.like("member:%"), leases.c.expires_at >= now, leases.c.owner != self.owner)
+            ).scalar() or 0
+            conn.execute(delete(leases).where(leases.c.name.like("member:%"), leases.c.expires_at < now))
+            conn.execute(
+                delete(cluster_messages_table)
+                .where(cluster_messages_table.c.created_at < now - timedelta(seconds=CLUSTER_MESSAGE_TTL))
+            )
+
+    def _flush(self) -> None:
+        with self._lock:
+            rows, self._outbox = self._outbox, []
+        if not rows:
+            return
+        with engine.begin() as conn:
+            conn.execute(insert(cluster_messages_table), rows)
+        self._published += len(rows)
+
+    def _poll(self) -> None:
+        table = cluster_messages_table
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.topic, table.c.sender, table.c.payload)
+                .where(table.c.id > self._last_id)
+                .order_by(table.c.id)
+                .limit(_POLL_BATCH)
+            ).all()
+        for row in rows:
+            self._last_id = row.id
+            if row.sender == self.owner:
+                continue
+            self._received += 1
+            for handler in self.handlers.get(row.topic, ()):
+                try:
+                    handler(json.loads(row.payload), row.sender)
+                except Exception as e:
+                    logger.error(f"进程间消息处理失败 {row.topic}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            outbox = len(self._outbox)
+        return {
+            "process": self.owner,
+            "started": self._thread is not None,
+            "peers": self.peers,
+            "outbox": outbox,
+            "published": self._published,
+            "received": self._received,
+        }
+
+
+# 全局实例
+cluster_channel = ClusterChannel()
@@ -0,0 +1,149 @@
+# app/core/cluster/lease.py
+"""
+数据库租约
+
+同名租约同一时刻只有一个持有者：持有者每 heartbeat 秒续约一次，
+超过 ttl 秒未续约视为失效，其他进程可以接管。用于：
+- 调度主进程选举（scheduler_lease）：只有持有者运行定时调度
+- 进程存活心跳（member:进程标识）：统计当前存活的其他进程
+
+配置（环境变量）：
+- CLUSTER_LEASE_TTL：租约有效期（秒），默认 30，即主进程异常退出后最迟 30 秒由其他进程接管
+- CLUSTER_HEARTBEAT：续约间隔（秒），默认 10
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.db.database import engine
+from .models import cluster_leases_table
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_LEASE_TTL = int(os.getenv("CLUSTER_LEASE_TTL", "30"))
+CLUSTER_HEARTBEAT = int(os.getenv("CLUSTER_HEARTBEAT", "10"))
+
+# 当前进程标识
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaderLease:
+    """带心跳和故障转移的租约"""
+
+    def __init__(self, name: str, ttl: int = CLUSTER_LEASE_TTL, heartbeat: int = CLUSTER_HEARTBEAT,
+                 owner: str = PROCESS_ID):
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = owner
+        self.is_leader = False
+        self._renewed_at = 0.0
+        self._on_elected: Optional[Callable[[], None]] = None
+        self._on_revoked: Optional[Callable[[], None]] = None
+        self._listeners: List[Tuple[Optional[Callable[[], None]], Optional[Callable[[], None]]]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def try_acquire(self) -> bool:
+        """获取或续约，返回当前是否持有"""
+        table = cluster_leases_table
+        now = datetime.now()
+        values = {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl), "updated_at": now}
+        with engine.begin() as conn:
+            renewed = conn.execute(
+                update(table)
+                .where(table.c.name == self.name, or_(table.c.owner == self.owner, table.c.expires_at < now))
+                .values(**values)
+            ).rowcount
+        if renewed:
+            return True
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table).values(name=self.name, **values))
+            return True
+        except IntegrityError:
+            return False
+
+    def release(self) -> None:
+        """主动释放，其他进程在下一次心跳时即可接管"""
+        table = cluster_leases_table
+        with engine.begin() as conn:
+            conn.execute(
+                update(table)
+                .where(table.c.name == self.name, table.c.owner == self.owner)
+                .values(expires_at=datetime.now() - timedelta(seconds=1))
+            )
+
+    def start(self, on_elected: Callable[[], None] = None, on_revoked: Callable[[], None] = None) -> bool:
+        """
+        启动心跳线程
+
+        第一次竞选在调用线程中同步完成，返回时 is_leader 已是结果。
+        """
+        self._on_elected, self._on_revoked = on_elected, on_revoked
+        self._stop.clear()
+        self._beat()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.name}", daemon=True)
+        self._thread.start()
+        return self.is_leader
+
+    def add_listener(self, on_elected: Callable[[], None] = None, on_revoked: Callable[[], None] = None) -> None:
+        """追加获得/失去租约时的回调（在 start 传入的回调之后调用），用于只应在主进程运行的其他后台任务"""
+        self._listeners.append((on_elected, on_revoked))
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.heartbeat + 5)
+            self._thread = None
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                self.release()
+            except Exception as e:
+                logger.warning(f"释放租约失败 {self.name}: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.heartbeat):
+            self._beat()
+
+    def _beat(self) -> None:
+        try:
+            held = self.try_acquire()
+            if held:
+                self._renewed_at = time.monotonic()
+        except Exception as e:
+            # 数据库暂时不可用：租约未过期前保持现状，过期后主动退位
+            held = self.is_leader and time.monotonic() - self._renewed_at < self.ttl
+            logger.warning(f"续约失败 {self.name}: {e}")
+
+        if held and not self.is_leader:
+            self.is_leader = True
+            logger.info(f"👑 已获得租约 {self.name}: {self.owner}")
+            for callback in [self._on_elected, *(elected for elected, _ in self._listeners)]:
+                self._notify(callback)
+        elif not held and self.is_leader:
+            self.is_leader = False
+            logger.warning(f"⚠️ 已失去租约 {self.name}: {self.owner}")
+            for callback in [self._on_revoked, *(revoked for _, revoked in self._listeners)]:
+                self._notify(callback)
+
+    def _notify(self, callback: Optional[Callable[[], None]]) -> None:
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"租约回调执行失败 {self.name}: {e}")
+
+
+# 全局实例：调度主进程选举
+scheduler_lease = LeaderLease("scheduler")
@@ -0,0 +1,35 @@
+# app/core/cluster/models.py
+"""
+多进程协作 - 数据模型定义
+
+包含：
+- cluster_leases_table: 租约表（调度主进程选举、进程存活心跳）
+- cluster_messages_table: 进程间消息表（停止信号、日志转发）
+"""
+from sqlalchemy import Table, Column, Integer, String, Text, DateTime
+from app.core.db.database import metadata
+
+
+# ========== 1. 租约表 ==========
+cluster_leases_table = Table(
+    "cluster_leases",
+    metadata,
+    Column("name", String(100), primary_key=True, comment ="租约名称（scheduler / member:进程标识）"),
+    Column("owner", String(100), nullable=False, comment ="持有者进程标识"),
+    Column("expires_at", DateTime, nullable=False, comment ="过期时间，过期后可被其他进程接管"),
+    Column("updated_at", DateTime, comment ="最后续约时间"),
+)
+
+
+# ========== 2. 进程间消息表 ==========
+cluster_messages_table = Table(
+    "cluster_messages",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("topic", String(50), nullable=False, comment ="消息主题"),
+    Column("sender", String(100), nullable=False, comment ="发送者进程标识"),
+    Column("payload", Text, comment ="消息内容（JSON）"),
+    Column("created_at", DateTime, index=True, comment ="创建时间，超过保留时间后清理"),
+    # 消息按 id 递增读取：清空后也不能复用旧 id，否则其他进程会漏收
+    sqlite_autoincrement=True,
+)
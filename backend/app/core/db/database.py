@@ -4,7 +4,7 @@ import os
 from contextlib import asynccontextmanager
 from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy import create_engine, event, MetaData, text
 from sqlalchemy.orm import sessionmaker
 
 logger = logging.getLogger(__name__)
@@ -22,11 +22,51 @@ logger.info(f"数据库路径：{data_dir}")
 data_dir.mkdir(parents=True, exist_ok=True)
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{data_dir}/notes.db")
 
+# SQLite 性能参数（每个连接建立时通过 connect 事件设置）
+# WAL 模式下读写互不阻塞；synchronous=NORMAL 在 WAL 下仍保证崩溃一致性，只在断电时可能丢失最后几个事务
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "30000")),  # 毫秒，锁冲突时等待而不是立即报 database is locked
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # 负数单位为 KiB，即 64MiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: Dict[str, Any] = None):
+    """在原生 sqlite3 连接上设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas or SQLITE_PRAGMAS).items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str, tuned: bool = True):
+    """创建引擎；SQLite 且 tuned=True 时在每个新连接上应用 SQLITE_PRAGMAS"""
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+
+    db_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False}  # SQLite 特有
+    )
+    if tuned:
+        event.listen(db_engine, "connect", lambda dbapi_connection, _: apply_sqlite_pragmas(dbapi_connection))
+    return db_engine
+
+
+def checkpoint():
+    """把 WAL 中的内容合并回主库文件（复制数据库文件前调用）"""
+    if DATABASE_URL.startswith("sqlite"):
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
 # Engine 全局单例
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}  # SQLite 特有
-)
+engine = create_db_engine(DATABASE_URL)
 
 def get_engine():
     return engine
@@ -140,8 +140,40 @@ class VersionedAutoMigrator:
         if added_fields:
             self._update_default_values(conn, table_name, table_obj, added_fields)
 
+        # 索引在字段之后创建（新索引可能用到刚添加的字段）
+        added_fields.extend(self.sync_indexes(table_name, table_obj))
+
         return added_fields
 
+    def sync_indexes(self, table_name: str, table_obj) -> list:
+        """创建模型中声明、数据库中缺失的索引，返回新添加的索引（index:索引名）"""
+        existing_indexes = {
+            idx['name'] for idx in self.inspector.get_indexes(table_name)
+        }
+
+        added_indexes = []
+        for index in sorted(table_obj.indexes, key=lambda idx: idx.name):
+            if index.name in existing_indexes:
+                continue
+
+            columns = [col.name for col in index.columns]
+            try:
+                index.create(self.engine)
+
+                checksum = hashlib.md5(
+                    json.dumps({'columns': columns, 'unique': bool(index.unique)}).encode()
+                ).hexdigest()[:8]
+                self._record_migration(table_name, f"index:{index.name}", "INDEX", checksum)
+
+                logger.info(f"✅ 添加索引: {table_name}.{index.name} ({', '.join(columns)})")
+                added_indexes.append(f"index:{index.name}")
+
+            except Exception as e:
+                # 例如唯一索引与已有的重复数据冲突：记录后继续，不影响启动
+                logger.error(f"❌ 添加索引失败 {table_name}.{index.name}: {e}")
+
+        return added_indexes
+
     def _get_sqlite_compatible_type(self, column) -> str:
         """获取 SQLite 兼容的类型"""
         from sqlalchemy import types
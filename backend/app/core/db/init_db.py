@@ -1,6 +1,7 @@
 # app/core/db/init_db.py
 import logging
-from app.core.db.database import metadata,engine
+from contextlib import contextmanager
+from app.core.db.database import metadata,engine,data_dir
 from app.core.db.registry import *
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ def init_module_data():
     logger.debug("✅ 初始化业务数据完成！")
 
 def upgrade():
-    logger.debug("🔧 检测数据库字段升级...")
+    logger.debug("🔧 检测数据库字段、索引升级...")
 
     from .db_upgrade import VersionedAutoMigrator
 
@@ -38,14 +39,35 @@ def upgrade():
 
     if results:
         for table, fields in results.items():
-            logger.info(f"表 {table} 自动添加了字段: {', '.join(fields)}")
+            logger.info(f"表 {table} 自动添加了字段/索引: {', '.join(fields)}")
     else:
         logger.info("✅ 所有表已是最新")
     
-    logger.debug("✅ 检测数据库字段升级完成！")
+    logger.debug("✅ 检测数据库字段、索引升级完成！")
 
 
+@contextmanager
+def _init_lock():
+    """
+    多 worker 同时启动时串行执行建表、初始化数据和升级（数据目录下的文件锁）
+
+    先拿到锁的进程完成初始化后，其余进程再执行时都已是最新，不会并发 ALTER/CREATE INDEX
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # Windows 没有 fcntl：只支持单 worker 启动
+        yield
+        return
+    with open(data_dir / ".init_db.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 def init_database():
-    create_all_tables()
-    init_module_data()
-    upgrade()
+    with _init_lock():
+        create_all_tables()
+        init_module_data()
+        upgrade()
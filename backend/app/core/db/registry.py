@@ -29,3 +29,6 @@ for item in modules_dir.iterdir():
         except Exception as e:
             logger.error(f"❌ 加载模块 {modname} 失败: {e}")
             raise
+
+# 核心模块的表
+importlib.import_module('app.core.cluster.models')
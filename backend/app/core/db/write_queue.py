@@ -0,0 +1,204 @@
+#app/core/db/write_queue.py
+"""
+单写线程队列（可选，DB_WRITE_QUEUE=true 时启用）
+
+SQLite 同一时刻只允许一个写事务。高频的小写入（日志分块、节点日志、状态更新）
+来自多个线程时，会互相等待锁并各自提交一次。启用后这些写入交给一个写线程：
+- 按提交顺序（FIFO）执行，同一调用方的写入顺序不变
+- 排队中的多条写入合并到一个事务中提交（group commit）
+- 合并事务失败时逐条重试，只有出错的那条返回异常
+
+未启用时 execute 直接在调用线程中执行，行为与原来一致。
+
+用法：
+    db_writer.execute(insert(table).values(...))            # 等待提交完成
+    db_writer.execute(lambda conn: ..., wait=False)          # 只入队，不等待
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Union
+
+from sqlalchemy import Connection, Engine
+from sqlalchemy.sql import Executable
+
+from app.core.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+Work = Union[Executable, Callable[[Connection], Any]]
+
+_STOP = object()
+
+
+class _WriteItem:
+    __slots__ = ("work", "future")
+
+    def __init__(self, work, future: Optional[Future]):
+        self.work = work
+        self.future = future
+
+
+class WriteQueue:
+    """把小写入合并成批量事务的单写线程"""
+
+    def __init__(self, engine: Engine, enabled: bool = False,
+                 max_batch: int = 200, max_delay: float = 0.005, max_queue_size: int = 10000):
+        """
+        Args:
+            max_batch: 单个事务最多合并的写入数
+            max_delay: 收到第一条写入后等待更多写入的最长时间（秒）
+            max_queue_size: 队列上限，满时提交方阻塞等待
+        """
+        self.engine = engine
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # 累计指标
+        self._writes = 0
+        self._batches = 0
+        self._retries = 0
+        self._errors = 0
+
+    # ========== 提交 ==========
+
+    def execute(self, work: Work, wait: bool = True) -> Any:
+        """
+        执行一次写入
+
+        Args:
+            work: SQLAlchemy 语句，或接收 Connection 的函数（在事务内调用）
+            wait: 是否等待提交完成；为 False 时不返回结果，错误只记录日志
+
+        Returns:
+            语句的 CursorResult 或函数返回值（wait=False 时为 None）
+        """
+        if not self.enabled or threading.current_thread() is self._thread:
+            with self.engine.begin() as conn:
+                return self._run(conn, work)
+
+        self._ensure_thread()
+        future = Future() if wait else None
+        self._queue.put(_WriteItem(work, future))
+        return future.result() if future else None
+
+    def flush(self) -> None:
+        """等待此前入队的写入全部提交"""
+        if self.enabled and self._thread is not None:
+            self.execute(lambda conn: None)
+
+    @staticmethod
+    def _run(conn: Connection, work: Work) -> Any:
+        if callable(work):
+            return work(conn)
+        return conn.execute(work)
+
+    # ========== 写线程 ==========
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+                logger.info(f"⚙️ 数据库写队列已启动: 单事务最多 {self.max_batch} 条")
+
+    def _collect(self, first) -> List:
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect(self._queue.get())
+            stop = _STOP in batch
+            items = [item for item in batch if item is not _STOP]
+            if items:
+                self._commit(items)
+            if stop:
+                return
+
+    def _commit(self, items: List[_WriteItem]) -> None:
+        """合并提交；失败时回滚并逐条重试"""
+        results = []
+        try:
+            with self.engine.begin() as conn:
+                for item in items:
+                    results.append(self._run(conn, item.work))
+        except Exception as e:
+            if len(items) == 1:
+                self._fail(items[0], e)
+                return
+            self._retries += 1
+            logger.warning(f"批量写入失败，逐条重试 {len(items)} 条: {e}")
+            for item in items:
+                try:
+                    with self.engine.begin() as conn:
+                        result = self._run(conn, item.work)
+                except Exception as item_error:
+                    self._fail(item, item_error)
+                else:
+                    self._done(item, result)
+            return
+
+        self._batches += 1
+        for item, result in zip(items, results):
+            self._done(item, result)
+
+    def _done(self, item: _WriteItem, result: Any) -> None:
+        self._writes += 1
+        if item.future:
+            item.future.set_result(result)
+
+    def _fail(self, item: _WriteItem, error: Exception) -> None:
+        self._errors += 1
+        if item.future:
+            item.future.set_exception(error)
+        else:
+            logger.error(f"数据库写入失败: {error}")
+
+    def close(self) -> None:
+        """提交剩余写入并停止写线程"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=30)
+        self._thread = None
+
+    # ========== 指标 ==========
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "writes": self._writes,
+            "batches": self._batches,
+            "avg_batch_size": round(self._writes / self._batches, 2) if self._batches else 0,
+            "retries": self._retries,
+            "errors": self._errors,
+        }
+
+
+# 全局实例
+db_writer = WriteQueue(
+    engine,
+    enabled=os.getenv("DB_WRITE_QUEUE", "false").lower() in ("1", "true", "yes"),
+    max_batch=int(os.getenv("DB_WRITE_BATCH", "200")),
+)
@@ -1,5 +1,10 @@
-from threading import Event
-from typing import Dict
+import logging
+from threading import Event, Lock
+from typing import Callable, Dict, List
+
+from app.core.cluster import cluster_channel
+
+logger = logging.getLogger(__name__)
 
 """中断异常"""
 class ExecutionCancelledError(Exception):
@@ -9,15 +14,44 @@ class ExecutionManager:
     def __init__(self):
         # execution_id -> Event
         self.stop_events: Dict[int, Event] = {}
+        # execution_id -> 停止时的回调（如关闭 SSH 通道以唤醒阻塞读取）
+        self.stop_callbacks: Dict[int, List[Callable[[], None]]] = {}
+        self._lock = Lock()
 
     def create_execution(self, execution_id: int):
         """创建执行任务的停止事件"""
         self.stop_events[execution_id] = Event()
 
-    def stop_execution(self, execution_id: int):
-        """触发停止事件"""
-        if execution_id in self.stop_events:
-            self.stop_events[execution_id].set()
+    def stop_execution(self, execution_id: int, forward: bool = True):
+        """触发停止事件；执行不在本进程时转发给其他进程"""
+        # 设置事件与取出回调在同一把锁内，与 on_stop 的检查和注册互斥，回调不会漏执行
+        with self._lock:
+            event = self.stop_events.get(execution_id)
+            if event is not None:
+                event.set()
+                callbacks = self.stop_callbacks.pop(execution_id, [])
+        if event is None:
+            if forward:
+                cluster_channel.publish("execution", {"action": "stop", "execution_id": execution_id})
+            return
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def on_stop(self, execution_id: int, callback: Callable[[], None]):
+        """注册停止回调；已停止时立即执行"""
+        with self._lock:
+            stopped = self.should_stop(execution_id)
+            if not stopped:
+                self.stop_callbacks.setdefault(execution_id, []).append(callback)
+        if stopped:
+            self._run_callback(callback)
+
+    @staticmethod
+    def _run_callback(callback: Callable[[], None]):
+        try:
+            callback()
+        except Exception as e:
+            logger.warning(f"执行停止回调失败: {e}")
 
     def should_stop(self, execution_id: int) -> bool:
         """检查是否应该停止"""
@@ -29,6 +63,14 @@ class ExecutionManager:
         """清理资源"""
         if execution_id in self.stop_events:
             del self.stop_events[execution_id]
+        with self._lock:
+            self.stop_callbacks.pop(execution_id, None)
+
+    def _on_cluster_message(self, message: dict, sender: str):
+        """其他进程转发的停止信号，只处理本进程中的执行"""
+        if message.get("action") == "stop":
+            self.stop_execution(message["execution_id"], forward=False)
 
 # 全局实例
 execution_manager = ExecutionManager()
+cluster_channel.subscribe("execution", execution_manager._on_cluster_message)
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 from datetime import datetime
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,6 +28,11 @@ class JobInfo:
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
 
+    def fingerprint(self) -> str:
+        """调度相关内容（schedule, enabled, params）的哈希，变化时才需要重新调度"""
+        content = json.dumps([self.schedule, self.enabled, self.params], sort_keys=True, default=str)
+        return hashlib.sha1(content.encode()).hexdigest()
+
 
 class JobProvider(ABC):
     """任务提供者抽象基类"""
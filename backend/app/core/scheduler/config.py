@@ -1,28 +1,45 @@
 # app/core/scheduler/config.py
 import importlib
 import logging
-from typing import List
+from typing import List, Tuple
 
+from app.core.cluster import scheduler_lease
 from app.core.scheduler import scheduler_service
 from app.core.scheduler.base import JobProvider
 logger = logging.getLogger(__name__)
 
 # 集中配置所有提供者
+# misfire_grace_time: 错过执行（停机、线程繁忙）后仍补执行的宽限秒数，超过则跳过本次
+# coalesce: 多次错过时只补执行一次
+# spread_seconds: 错峰窗口（0-59 秒），每个任务在窗口内按ID哈希固定偏移触发，不配置时取 SCHEDULER_SPREAD_SECONDS
 PROVIDER_CONFIGS = [
     {
         'module_path': 'app.modules.cron.job_provider',
         'provider_name': 'cron_job_provider',
-        'enabled': True
+        'enabled': True,
+        'misfire_grace_time': 300,
+        'coalesce': True
+    },
+    {
+        'module_path': 'app.modules.cron.job_provider',
+        'provider_name': 'cron_retention_job_provider',
+        'enabled': True,
+        'misfire_grace_time': 600,
+        'coalesce': True
     },
     {
         'module_path': 'app.modules.workflow.job_provider',
         'provider_name': 'workflow_job_provider',
-        'enabled': True
+        'enabled': True,
+        'misfire_grace_time': 300,
+        'coalesce': True
     },
     {
         'module_path': 'app.modules.acme.job_provider',
         'provider_name': 'ssl_job_provider',
-        'enabled': True
+        'enabled': True,
+        'misfire_grace_time': 12 * 3600,  # 每天一次的续期检查，当天错过的都补上
+        'coalesce': True
     },
     # {
     #     'module_path': 'app.modules.cleanup.job_provider',
@@ -31,8 +48,8 @@ PROVIDER_CONFIGS = [
     # }
 ]
 
-def load_providers_from_config() -> List[JobProvider]:
-    """从配置加载提供者"""
+def load_providers_from_config() -> List[Tuple[JobProvider, dict]]:
+    """从配置加载提供者，返回 (提供者, 配置)"""
     providers = []
 
     for config in PROVIDER_CONFIGS:
@@ -42,7 +59,7 @@ def load_providers_from_config() -> List[JobProvider]:
         try:
             module = importlib.import_module(config['module_path'])
             provider = getattr(module, config['provider_name'])
-            providers.append(provider)
+            providers.append((provider, config))
             logger.info(f"⚙️ 从配置加载提供者: {provider.get_module_name()}")
         except Exception as e:
             logger.error(f"加载提供者 {config['module_path']} 失败: {e}")
@@ -55,18 +72,26 @@ def init_schedule():
 
     # 注册所有提供者到调度器
     registered_count = 0
-    for provider in providers:
+    for provider, config in providers:
         try:
-            scheduler_service.register_provider(provider)
+            scheduler_service.register_provider(
+                provider,
+                misfire_grace_time=config.get('misfire_grace_time'),
+                coalesce=config.get('coalesce'),
+                spread_seconds=config.get('spread_seconds')
+            )
             registered_count += 1
             logger.info(f"✅ 已注册任务提供者: {provider.get_module_name()}")
         except Exception as e:
             logger.error(f"❌ 注册任务提供者失败: {e}")
 
-    # 启动调度器
+    # 启动调度器（待命），竞选调度主进程：多 worker 时只有一个进程执行定时任务
     scheduler_service.start()
-    logger.info(f"✅ 调度器启动完成，共注册 {registered_count} 个提供者")
+    scheduler_lease.start(on_elected=scheduler_service.activate, on_revoked=scheduler_service.standby)
+    logger.info(f"✅ 调度器启动完成，共注册 {registered_count} 个提供者，"
+                f"{'主进程' if scheduler_lease.is_leader else '待命（由其他进程调度）'}")
 
 def destroy_schedule():
+    scheduler_lease.stop()
     scheduler_service.shutdown()
     logger.info("✅ 定时调度器已关闭")
@@ -0,0 +1,73 @@
+# app/core/scheduler/limiter.py
+"""
+定时任务派发限速
+
+令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个。调度器每派发一个任务取一个令牌，
+没有令牌时在调度器的工作线程中等待，把同一秒触发的大量任务摊开到随后的几秒，
+避免同时建立大量 SSH 会话和数据库写入。
+
+配置（环境变量）：
+- SCHEDULER_DISPATCH_RATE：每秒最多派发的任务数，0 表示不限速（默认）
+- SCHEDULER_DISPATCH_BURST：允许的突发数，默认与 rate 相同（至少 1）
+"""
+import os
+import threading
+import time
+
+
+SCHEDULER_DISPATCH_RATE = float(os.getenv("SCHEDULER_DISPATCH_RATE", "0"))
+SCHEDULER_DISPATCH_BURST = int(os.getenv("SCHEDULER_DISPATCH_BURST", "0")) or max(1, int(SCHEDULER_DISPATCH_RATE))
+
+
+class DispatchRateLimiter:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._dispatched = 0
+        self._delayed = 0
+        self._waited = 0.0
+
+    def acquire(self) -> float:
+        """取一个令牌，返回等待的秒数"""
+        if self.rate <= 0:
+            with self._lock:
+                self._dispatched += 1
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先扣减再等待：并发的调用方按到达顺序排到各自的时间点
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self._dispatched += 1
+            if wait > 0:
+                self._delayed += 1
+                self._waited += wait
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "dispatched": self._dispatched,
+                "delayed": self._delayed,
+                "waited_seconds": round(self._waited, 3),
+            }
+
+
+# 全局实例
+dispatch_limiter = DispatchRateLimiter(SCHEDULER_DISPATCH_RATE, SCHEDULER_DISPATCH_BURST)
+
+
+__all__ = ["DispatchRateLimiter", "dispatch_limiter"]
@@ -1,17 +1,52 @@
 # app/core/scheduler/service.py
+"""
+通用定时任务调度服务
+
+任务保存在数据库的 apscheduler_jobs 表中（SCHEDULER_JOBSTORE=memory 时仍使用内存），
+重启后保留下一次执行时间，停机期间错过的执行按各提供者的 misfire_grace_time / coalesce 处理。
+
+启动和同步时不再清空重建，而是按 (schedule, enabled, params) 的指纹
+对比提供者的任务和已调度的任务，只新增、替换、删除有变化的条目。
+
+整分钟触发的任务可按提供者开启错峰（spread_seconds）：每个任务按ID哈希得到
+固定的秒偏移，在窗口内分散触发；派发时再经过全局限速（见 limiter.py）。
+
+多进程部署时每个进程都以暂停状态启动调度器，只有持有 scheduler 租约的主进程
+（见 app.core.cluster）恢复调度；其他进程对任务的增删改通过进程间通道转发给主进程。
+"""
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
 from typing import Dict, List, Optional, Type, Any
+from collections import Counter
+import hashlib
 import logging
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 
 from .base import JobProvider, JobInfo, JobEvent
+from .limiter import dispatch_limiter
 
 # 关闭 APScheduler 日志
 logging.getLogger('apscheduler').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# 任务存储：sqlalchemy（应用数据库）或 memory
+SCHEDULER_JOBSTORE = os.getenv("SCHEDULER_JOBSTORE", "sqlalchemy")
+
+# 提供者未单独配置时的错过执行处理
+DEFAULT_MISFIRE_GRACE_TIME = int(os.getenv("SCHEDULER_MISFIRE_GRACE_TIME", "60"))  # 秒，超过则跳过本次
+DEFAULT_COALESCE = os.getenv("SCHEDULER_COALESCE", "true").lower() == "true"  # 多次错过只补执行一次
+DEFAULT_SPREAD_SECONDS = int(os.getenv("SCHEDULER_SPREAD_SECONDS", "0"))  # 错峰窗口（秒），0 表示不错峰
+
+# 错峰偏移只落在分钟内（cron 表达式的秒字段）
+MAX_SPREAD_SECONDS = 59
+
+
+def _run_scheduled_job(job_info: JobInfo) -> None:
+    """调度入口（模块级函数，便于持久化存储按引用保存）"""
+    scheduler_service._execute_job_wrapper(job_info)
+
 
 class SchedulerService:
     """通用定时任务调度服务"""
@@ -21,16 +56,42 @@ class SchedulerService:
         self.providers: Dict[str, JobProvider] = {}  # module_name -> provider
         self.job_ids: set = set()  # 所有已调度任务的ID
         self.event_handlers: Dict[str, list] = {}  # 事件处理器
-
-        # 配置 jobstores
-        self.scheduler.add_jobstore(MemoryJobStore(), 'default')
-
-    def register_provider(self, provider: JobProvider) -> None:
-        """注册任务提供者"""
+        self.job_options: Dict[str, dict] = {}  # module_name -> misfire_grace_time / coalesce
+        self.spread_seconds: Dict[str, int] = {}  # module_name -> 错峰窗口
+        self.active = False  # 是否为调度主进程（暂停状态下只转发任务变更）
+
+    def _setup_jobstore(self) -> None:
+        """配置 jobstores（启动时创建，使用应用数据库）"""
+        if SCHEDULER_JOBSTORE == "sqlalchemy":
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+            from app.core.db.database import get_engine
+            self.scheduler.add_jobstore(SQLAlchemyJobStore(engine=get_engine()), 'default')
+        else:
+            self.scheduler.add_jobstore(MemoryJobStore(), 'default')
+
+    def register_provider(self, provider: JobProvider,
+                          misfire_grace_time: Optional[int] = None,
+                          coalesce: Optional[bool] = None,
+                          spread_seconds: Optional[int] = None) -> None:
+        """
+        注册任务提供者
+
+        Args:
+            provider: 任务提供者
+            misfire_grace_time: 错过执行后仍补执行的宽限秒数，默认 SCHEDULER_MISFIRE_GRACE_TIME
+            coalesce: 多次错过时是否合并为一次，默认 SCHEDULER_COALESCE
+            spread_seconds: 错峰窗口（0-59 秒），默认 SCHEDULER_SPREAD_SECONDS
+        """
         module_name = provider.get_module_name()
         if module_name in self.providers:
             logger.warning(f"模块 {module_name} 已存在，将被覆盖")
         self.providers[module_name] = provider
+        self.job_options[module_name] = {
+            'misfire_grace_time': DEFAULT_MISFIRE_GRACE_TIME if misfire_grace_time is None else misfire_grace_time,
+            'coalesce': DEFAULT_COALESCE if coalesce is None else coalesce,
+        }
+        spread = DEFAULT_SPREAD_SECONDS if spread_seconds is None else spread_seconds
+        self.spread_seconds[module_name] = max(0, min(spread, MAX_SPREAD_SECONDS))
         logger.info(f"✅ 已注册任务提供者: {module_name}")
 
     def unregister_provider(self, module_name: str) -> None:
@@ -44,31 +105,138 @@ class SchedulerService:
             logger.info(f"✅ 已注销任务提供者: {module_name}")
 
     def start(self) -> None:
-        """启动调度器"""
+        """以暂停状态启动调度器，成为主进程（activate）后才开始调度"""
+        from app.core.cluster import cluster_channel
+
+        self._setup_jobstore()
+        self.scheduler.start(paused=True)
+        cluster_channel.subscribe("scheduler", self._on_cluster_message)
+        logger.info("✅ 定时任务调度器已启动（待命）")
+
+    def activate(self) -> None:
+        """成为调度主进程：同步所有任务后开始调度"""
+        self.active = True
         self.load_all_jobs()
-        self.scheduler.start()
-        logger.info("✅ 定时任务调度器已启动")
+        self.scheduler.resume()
+        logger.info("✅ 定时任务调度器开始调度（主进程）")
+
+    def standby(self) -> None:
+        """失去主进程身份：暂停调度，任务变更改为转发"""
+        self.active = False
+        self.scheduler.pause()
+        self.job_ids.clear()
+        logger.info("⏸️ 定时任务调度器已转为待命")
+
+    def _forward(self, message: Dict) -> bool:
+        """非主进程：把任务变更转发给主进程"""
+        from app.core.cluster import cluster_channel
+
+        if not cluster_channel.publish("scheduler", message):
+            logger.warning(f"没有可用的调度主进程，任务变更将在下次选举后同步: {message}")
+        return True
+
+    def _on_cluster_message(self, message: Dict, sender: str) -> None:
+        """主进程处理其他进程转发的任务变更"""
+        if not self.active:
+            return
+        action = message.get('action')
+        if action == 'reconcile':
+            self.reconcile(message['module'])
+        elif action == 'pause':
+            self.pause_job(message['job_id'])
+        elif action == 'resume':
+            self.resume_job(message['job_id'])
+        elif action == 'run_now':
+            self.run_job_now(message['job_id'])
 
     def shutdown(self) -> None:
         """关闭调度器"""
-        self.scheduler.shutdown()
+        self.active = False
+        if self.scheduler.running:
+            self.scheduler.shutdown()
         logger.info("⏹️ 定时任务调度器已停止")
 
     def load_all_jobs(self) -> None:
-        """从所有注册的提供者加载任务"""
-        for module_name, provider in self.providers.items():
-            try:
-                jobs = provider.get_enabled_jobs()
-                for job_info in jobs:
-                    self.add_job(job_info)
-            except Exception as e:
-                logger.error(f"❌ 从模块 {module_name} 加载任务失败: {e}")
+        """从所有注册的提供者同步任务，并移除已不存在的模块留下的任务"""
+        for module_name in self.providers:
+            self.reconcile(module_name)
+
+        for job in self.scheduler.get_jobs():
+            if job.id.split(':', 1)[0] not in self.providers:
+                self.scheduler.remove_job(job.id)
+                logger.info(f"🗑️ 已移除未注册模块的定时任务: {job.id}")
+
+    def reconcile(self, module_name: str) -> Dict[str, int]:
+        """
+        按指纹对比提供者的任务与已调度的任务，只处理有变化的条目
+
+        - 新任务：添加
+        - schedule / enabled / params 或错峰偏移变化：替换（重新计算下一次执行时间）
+        - 只有名称、描述或错过执行配置变化：原地更新，保留下一次执行时间和暂停状态
+        - 提供者已不再返回的任务：移除
+
+        Returns:
+            各类变化的数量
+        """
+        counts = {'added': 0, 'replaced': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        provider = self.providers.get(module_name)
+        if provider is None:
+            return counts
+        try:
+            wanted = {
+                f"{job_info.module}:{job_info.job_id}": job_info
+                for job_info in provider.get_enabled_jobs() if job_info.enabled
+            }
+        except Exception as e:
+            logger.error(f"❌ 从模块 {module_name} 加载任务失败: {e}")
+            return counts
+
+        prefix = f"{module_name}:"
+        scheduled = {job.id: job for job in self.scheduler.get_jobs() if job.id.startswith(prefix)}
+
+        for full_job_id, job in scheduled.items():
+            if full_job_id not in wanted:
+                self.job_ids.add(full_job_id)
+                self.remove_job(full_job_id)
+                counts['removed'] += 1
+
+        for full_job_id, job_info in wanted.items():
+            job = scheduled.get(full_job_id)
+            current = job.args[0] if job is not None and job.args else None
+            if current is None:
+                self.add_job(job_info)
+                counts['added'] += 1
+            elif (current.fingerprint() != job_info.fingerprint()
+                  or str(job.trigger) != str(self._build_trigger(job_info))):
+                self.job_ids.discard(full_job_id)
+                self.add_job(job_info)
+                counts['replaced'] += 1
+            else:
+                self.job_ids.add(full_job_id)
+                changes = {
+                    key: value for key, value in self.job_options.get(module_name, {}).items()
+                    if getattr(job, key) != value
+                }
+                if (current.name, current.description) != (job_info.name, job_info.description):
+                    changes.update(name=job_info.name, args=[job_info])
+                if changes:
+                    self.scheduler.modify_job(full_job_id, **changes)
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+
+        logger.info(f"🔄 已同步[{module_name}]定时任务: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+        return counts
 
     def add_job(self, job_info: JobInfo) -> bool:
         """添加单个任务到调度器"""
         # 使用 module:job_id 作为唯一标识
         full_job_id = f"{job_info.module}:{job_info.job_id}"
 
+        if not self.active:
+            # 由主进程按提供者的数据同步
+            return self._forward({'action': 'reconcile', 'module': job_info.module})
+
         if full_job_id in self.job_ids:
             logger.debug(f"任务 {full_job_id} 已存在，跳过")
             return False
@@ -79,16 +247,17 @@ class SchedulerService:
 
         try:
             # 创建 CronTrigger
-            trigger = CronTrigger.from_crontab(job_info.schedule)
+            trigger = self._build_trigger(job_info)
 
             # 添加到调度器
             self.scheduler.add_job(
-                func=self._execute_job_wrapper,
+                func=_run_scheduled_job,
                 trigger=trigger,
                 args=[job_info],
                 id=full_job_id,
                 name=job_info.name,
-                replace_existing=True
+                replace_existing=True,
+                **self.job_options.get(job_info.module, {})
             )
             self.job_ids.add(full_job_id)
 
@@ -106,8 +275,26 @@ class SchedulerService:
             logger.error(f"❌ 添加任务失败 {job_info.name}: {e}")
             return False
 
+    def _build_trigger(self, job_info: JobInfo) -> CronTrigger:
+        """由 cron 表达式创建触发器，开启错峰时按任务ID哈希设置固定的秒偏移"""
+        trigger = CronTrigger.from_crontab(job_info.schedule, timezone=self.scheduler.timezone)
+        window = self.spread_seconds.get(job_info.module, 0)
+        if window <= 0:
+            return trigger
+
+        full_job_id = f"{job_info.module}:{job_info.job_id}"
+        offset = int(hashlib.sha1(full_job_id.encode()).hexdigest(), 16) % (window + 1)
+        if offset == 0:
+            return trigger
+        minute, hour, day, month, day_of_week = job_info.schedule.split()
+        return CronTrigger(minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week,
+                           second=offset, timezone=self.scheduler.timezone)
+
     def remove_job(self, job_id: str) -> bool:
         """移除任务"""
+        if not self.active:
+            return self._forward({'action': 'reconcile', 'module': job_id.split(':', 1)[0]})
+
         if job_id in self.job_ids:
             try:
                 self.scheduler.remove_job(job_id)
@@ -144,6 +331,11 @@ class SchedulerService:
         job_id = job_info.job_id
         job_name = job_info.name
 
+        # 全局派发限速，同一时刻触发的任务依次错开
+        waited = dispatch_limiter.acquire()
+        if waited > 0:
+            logger.debug(f"任务 {module}:{job_id} 派发限速等待 {waited:.2f} 秒")
+
         logger.info(f"▶️ 开始执行任务 {module}:{job_id} ({job_name})")
 
         try:
@@ -188,17 +380,15 @@ class SchedulerService:
                 logger.error(f"事件处理器执行失败: {e}")
 
     def get_all_jobs(self) -> List[Dict]:
-        """获取所有任务信息"""
+        """获取所有任务信息（从任务存储读取，非主进程同样可用）"""
         jobs = []
-        for job_id in self.job_ids:
-            job = self.scheduler.get_job(job_id)
-            if job:
-                jobs.append({
-                    'id': job_id,
-                    'name': job.name,
-                    'next_run': job.next_run_time,
-                    'schedule': str(job.trigger)
-                })
+        for job in self.scheduler.get_jobs():
+            jobs.append({
+                'id': job.id,
+                'name': job.name,
+                'next_run': job.next_run_time,
+                'schedule': str(job.trigger)
+            })
         return jobs
 
     def get_job(self, job_id: str) -> Optional[Dict]:
@@ -213,8 +403,78 @@ class SchedulerService:
             }
         return None
 
+    def load_profile(self, hours: int = 24) -> Dict:
+        """
+        统计未来一段时间内每秒、每分钟触发的任务数
+
+        同一 cron 表达式只计算一次触发时间，错峰的任务在此基础上平移秒偏移，
+        再乘以任务数；暂停的任务不计入。
+        """
+        now = datetime.now(self.scheduler.timezone)
+        end = now + timedelta(hours=hours)
+
+        triggers, counts = {}, Counter()  # 表达式 -> 触发器; (表达式, 秒偏移) -> 任务数
+        for job in self.scheduler.get_jobs():
+            if job.next_run_time is None:
+                continue
+            job_info = job.args[0] if job.args and isinstance(job.args[0], JobInfo) else None
+            if job_info is not None:
+                second = str(job.trigger.fields[CronTrigger.FIELD_NAMES.index('second')])
+                key, offset = job_info.schedule, int(second) if second.isdigit() else 0
+                if key not in triggers:
+                    triggers[key] = CronTrigger.from_crontab(key, timezone=self.scheduler.timezone)
+            else:
+                key, offset = str(job.trigger), 0
+                triggers.setdefault(key, job.trigger)
+            counts[(key, offset)] += 1
+
+        fire_times = {}
+        for key, trigger in triggers.items():
+            times = []
+            # 从窗口前一分钟算起，平移后仍在当前分钟内的触发也计入
+            fire_time = trigger.get_next_fire_time(None, now - timedelta(seconds=MAX_SPREAD_SECONDS))
+            while fire_time is not None and fire_time < end:
+                times.append(fire_time.replace(microsecond=0))
+                fire_time = trigger.get_next_fire_time(fire_time, fire_time)
+            fire_times[key] = times
+
+        per_second, per_minute = Counter(), Counter()
+        for (key, offset), count in counts.items():
+            shift = timedelta(seconds=offset)
+            for fire_time in fire_times[key]:
+                fire_time += shift
+                if fire_time < now:
+                    continue
+                if fire_time >= end:
+                    break
+                per_second[fire_time] += count
+                per_minute[fire_time.replace(second=0)] += count
+
+        second_of_minute = [0] * 60
+        for second, count in per_second.items():
+            second_of_minute[second.second] += count
+
+        def point(item):
+            return {'time': item[0].isoformat(), 'count': item[1]} if item else None
+
+        return {
+            'start': now.isoformat(),
+            'end': end.isoformat(),
+            'jobs': sum(counts.values()),
+            'schedules': len(triggers),
+            'fires': sum(per_minute.values()),
+            'peak_second': point(max(per_second.items(), key=lambda item: item[1], default=None)),
+            'peak_minute': point(max(per_minute.items(), key=lambda item: item[1], default=None)),
+            'top_seconds': [point(item) for item in per_second.most_common(10)],
+            'second_of_minute': second_of_minute,
+            'per_minute': [point(item) for item in sorted(per_minute.items())],
+            'dispatch': dispatch_limiter.stats(),
+        }
+
     def pause_job(self, job_id: str) -> bool:
         """暂停任务"""
+        if not self.active:
+            return self._forward({'action': 'pause', 'job_id': job_id})
         try:
             self.scheduler.pause_job(job_id)
             logger.info(f"⏸️ 已暂停任务: {job_id}")
@@ -225,6 +485,8 @@ class SchedulerService:
 
     def resume_job(self, job_id: str) -> bool:
         """恢复任务"""
+        if not self.active:
+            return self._forward({'action': 'resume', 'job_id': job_id})
         try:
             self.scheduler.resume_job(job_id)
             logger.info(f"▶️ 已恢复任务: {job_id}")
@@ -235,6 +497,8 @@ class SchedulerService:
 
     def run_job_now(self, job_id: str) -> bool:
         """立即执行任务"""
+        if not self.active:
+            return self._forward({'action': 'run_now', 'job_id': job_id})
         try:
             self.scheduler.modify_job(job_id, next_run_time=datetime.now())
             logger.info(f"⚡ 已触发立即执行: {job_id}")
@@ -0,0 +1,293 @@
+# app/core/sh/async_ssh_client.py
+"""
+异步 SSH 客户端（基于 asyncssh）
+
+与 SSHClient 接口一致，但所有远程操作都是协程，直接运行在事件循环上：
+- 不为每条命令占用线程，同一个循环可并发执行大量远程命令
+- 连接由 async_ssh_pool 按节点复用，一条连接上复用多个会话通道
+
+用法：
+    async with async_ssh_pool.session(node) as ssh:
+        exit_code, output, error = await ssh.execute_command("uptime")
+"""
+import asyncio
+import inspect
+import io
+import os
+from typing import Callable, Optional
+
+import asyncssh
+
+from app.modules.node.schemas import NodeRead
+from app.core.interrupt.execution_manager import ExecutionCancelledError
+
+
+async def _call(callback: Callable, *args):
+    """回调既可以是普通函数也可以是协程函数"""
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        await result
+
+
+class AsyncSSHClient:
+    def __init__(self, node: NodeRead, conn: asyncssh.SSHClientConnection = None):
+        """
+        Args:
+            node: 节点信息
+            conn: 已建立的 asyncssh 连接（由连接池借出时共享）
+        """
+        self.node = node
+        self.shared = conn is not None  # 共享连接由连接池负责关闭
+        self.conn = conn
+        self.sftp: Optional[asyncssh.SFTPClient] = None
+
+    async def connect(self, keepalive_interval: int = 0):
+        try:
+            options = dict(
+                host=self.node.host,
+                port=self.node.port,
+                username=self.node.username,
+                known_hosts=None,
+                connect_timeout=10,
+                keepalive_interval=keepalive_interval,
+            )
+            if self.node.auth_type == "ssh_key" and self.node.private_key:
+                options["client_keys"] = [asyncssh.import_private_key(self.node.private_key)]
+                options["password"] = None
+            else:
+                options["client_keys"] = None
+                options["password"] = self.node.password
+            self.conn = await asyncssh.connect(**options)
+            return True
+        except Exception as e:
+            raise ConnectionError(f"SSH连接失败: {str(e)}")
+
+    async def execute_command(self, command: str, timeout: Optional[float] = 30):
+        """
+        执行命令并等待完成，返回 (退出码, 标准输出, 错误输出)
+
+        timeout 是整体超时（秒），到时关闭会话并报错；None 表示不限时。
+        注意与 SSHClient.execute_command 不同：paramiko 的 timeout 只限制单次读取，不限制命令总耗时，
+        可能长时间运行的命令（docker stop、compose up 等）应传 None。
+        """
+        try:
+            result = await self.conn.run(command, check=False, timeout=timeout,
+                                         encoding='utf-8', errors='replace')
+            exit_code = result.exit_status if result.exit_status is not None else -1
+            return exit_code, result.stdout or "", result.stderr or ""
+        except Exception as e:
+            raise Exception(f"命令执行失败: {str(e)}")
+
+    async def stream_command(self, command: str,
+                             on_stdout: Callable[[str], None],
+                             on_stderr: Optional[Callable[[str], None]] = None,
+                             should_stop: Optional[Callable[[], bool]] = None,
+                             wait_interval: float = 1.0,
+                             chunk_size: int = 32768) -> int:
+        """
+        执行命令并流式读取输出，直到远端退出
+
+        Args:
+            on_stdout/on_stderr: 输出回调（普通函数或协程函数）
+            should_stop: 返回 True 时关闭会话并中断
+            wait_interval: 检查 should_stop 的最长间隔
+
+        Returns:
+            退出码（会话异常关闭时为 -1）
+
+        Raises:
+            ExecutionCancelledError: should_stop 返回 True
+        """
+        process = await self.conn.create_process(command, encoding='utf-8', errors='replace')
+
+        async def pump(reader, callback):
+            while True:
+                text = await reader.read(chunk_size)
+                if not text:
+                    return
+                if callback:
+                    await _call(callback, text)
+
+        readers = [
+            asyncio.ensure_future(pump(process.stdout, on_stdout)),
+            asyncio.ensure_future(pump(process.stderr, on_stderr)),
+        ]
+        try:
+            pending = set(readers)
+            while pending:
+                if should_stop and should_stop():
+                    raise ExecutionCancelledError("任务已被用户中断")
+                done, pending = await asyncio.wait(pending, timeout=wait_interval)
+                for task in done:
+                    task.result()  # 传播回调异常
+            await process.wait_closed()
+            if should_stop and should_stop():
+                raise ExecutionCancelledError("任务已被用户中断")
+            return process.exit_status if process.exit_status is not None else -1
+        finally:
+            for task in readers:
+                task.cancel()
+            process.close()
+
+    async def open_terminal(self, command: str, width: int = 120, height: int = 40) -> asyncssh.SSHClientProcess:
+        """以伪终端方式执行交互命令，返回进程对象（调用方负责 close）"""
+        return await self.conn.create_process(
+            command, term_type="xterm", term_size=(width, height),
+            encoding='utf-8', errors='replace'
+        )
+
+    def is_alive(self) -> bool:
+        """连接是否仍可用"""
+        return self.conn is not None and not self.conn.is_closed()
+
+    async def close(self):
+        if self.sftp:
+            try:
+                self.sftp.exit()
+                await self.sftp.wait_closed()
+            finally:
+                self.sftp = None
+        if not self.shared and self.conn:
+            self.conn.close()
+            await self.conn.wait_closed()
+
+    # ========== 文件传输方法 ==========
+
+    async def get_sftp(self) -> asyncssh.SFTPClient:
+        """获取 SFTP 客户端（懒加载，随连接复用，由 close 关闭）"""
+        if not self.sftp:
+            self.sftp = await self.conn.start_sftp_client()
+        return self.sftp
+
+    async def upload_file(self, local_path: str, remote_path: str, callback=None):
+        """
+        上传文件到远程服务器
+
+        Args:
+            local_path: 本地文件路径
+            remote_path: 远程文件路径
+            callback: 进度回调函数 (bytes_sent, total_bytes)
+        """
+        try:
+            sftp = await self.get_sftp()
+            remote_dir = os.path.dirname(remote_path)
+            if remote_dir:
+                await sftp.makedirs(remote_dir, exist_ok=True)
+            progress = (lambda src, dst, sent, total: callback(sent, total)) if callback else None
+            await sftp.put(local_path, remote_path, progress_handler=progress)
+            return True
+        except Exception as e:
+            raise Exception(f"上传文件失败: {str(e)}")
+
+    async def download_file(self, remote_path: str, local_path: str, callback=None):
+        """
+        从远程服务器下载文件
+
+        Args:
+            remote_path: 远程文件路径
+            local_path: 本地保存路径
+            callback: 进度回调函数 (bytes_received, total_bytes)
+        """
+        try:
+            sftp = await self.get_sftp()
+            local_dir = os.path.dirname(local_path)
+            if local_dir:
+                os.makedirs(local_dir, exist_ok=True)
+            progress = (lambda src, dst, received, total: callback(received, total)) if callback else None
+            await sftp.get(remote_path, local_path, progress_handler=progress)
+            return True
+        except Exception as e:
+            raise Exception(f"下载文件失败: {str(e)}")
+
+    async def upload_fileobj(self, fileobj, remote_path: str):
+        """上传文件对象（适用于内存中的文件）"""
+        try:
+            sftp = await self.get_sftp()
+            async with sftp.open(remote_path, 'wb') as f:
+                await f.write(fileobj.read())
+            return True
+        except Exception as e:
+            raise Exception(f"上传文件对象失败: {str(e)}")
+
+    async def download_fileobj(self, remote_path: str):
+        """
+        下载文件到内存
+
+        Returns:
+            BytesIO 对象
+        """
+        try:
+            sftp = await self.get_sftp()
+            async with sftp.open(remote_path, 'rb') as f:
+                fileobj = io.BytesIO(await f.read())
+            return fileobj
+        except Exception as e:
+            raise Exception(f"下载文件到内存失败: {str(e)}")
+
+    async def list_files(self, remote_path: str = '.'):
+        """列出远程目录下的文件"""
+        try:
+            sftp = await self.get_sftp()
+            return [name for name in await sftp.listdir(remote_path) if name not in ('.', '..')]
+        except Exception as e:
+            raise Exception(f"列出文件失败: {str(e)}")
+
+    async def list_files_attr(self, remote_path: str = '.'):
+        """列出远程目录下的文件详细信息"""
+        try:
+            sftp = await self.get_sftp()
+            return [entry for entry in await sftp.readdir(remote_path) if entry.filename not in ('.', '..')]
+        except Exception as e:
+            raise Exception(f"列出文件详情失败: {str(e)}")
+
+    async def stat(self, remote_path: str):
+        """获取远程文件状态"""
+        try:
+            sftp = await self.get_sftp()
+            return await sftp.stat(remote_path)
+        except Exception as e:
+            raise Exception(f"获取文件状态失败: {str(e)}")
+
+    async def remove_file(self, remote_path: str):
+        """删除远程文件"""
+        try:
+            sftp = await self.get_sftp()
+            await sftp.remove(remote_path)
+            return True
+        except Exception as e:
+            raise Exception(f"删除文件失败: {str(e)}")
+
+    async def rename_file(self, old_path: str, new_path: str):
+        """重命名远程文件"""
+        try:
+            sftp = await self.get_sftp()
+            await sftp.rename(old_path, new_path)
+            return True
+        except Exception as e:
+            raise Exception(f"重命名文件失败: {str(e)}")
+
+    async def mkdir(self, remote_path: str):
+        """创建远程目录"""
+        try:
+            sftp = await self.get_sftp()
+            await sftp.mkdir(remote_path)
+            return True
+        except Exception as e:
+            raise Exception(f"创建目录失败: {str(e)}")
+
+    async def rmdir(self, remote_path: str):
+        """删除远程目录"""
+        try:
+            sftp = await self.get_sftp()
+            await sftp.rmdir(remote_path)
+            return True
+        except Exception as e:
+            raise Exception(f"删除目录失败: {str(e)}")
+
+    async def exists(self, remote_path: str) -> bool:
+        """检查远程文件/目录是否存在"""
+        try:
+            sftp = await self.get_sftp()
+            return await sftp.exists(remote_path)
+        except Exception as e:
+            raise Exception(f"检查文件存在失败: {str(e)}")
@@ -0,0 +1,288 @@
+# app/core/sh/async_ssh_pool.py
+"""
+异步 SSH 连接池
+
+与 ssh_pool 的策略一致（按节点复用、单连接多会话、凭据变更失效、空闲回收），
+区别在于连接是 asyncssh 连接，借出/归还都是协程，等待名额时不阻塞线程。
+
+asyncssh 连接绑定在创建它的事件循环上，因此连接按事件循环分别管理：
+主应用循环与工作流运行循环各自持有自己的连接，互不共享。
+
+用法：
+    async with async_ssh_pool.session(node) as ssh:
+        await ssh.execute_command("uptime")
+"""
+import asyncio
+import logging
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from app.core.sh.async_ssh_client import AsyncSSHClient
+from app.core.sh.ssh_pool import SSHConnectionPool
+from app.modules.node.schemas import NodeRead
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    """连接池中的一条物理连接"""
+
+    def __init__(self, ssh: AsyncSSHClient, fingerprint: str):
+        self.ssh = ssh
+        self.fingerprint = fingerprint
+        self.leases = 0
+        self.retired = False
+        self.created_at = time.monotonic()
+        self.last_used = time.monotonic()
+
+
+class _LoopState:
+    """单个事件循环内的连接池状态"""
+
+    def __init__(self):
+        self.cond = asyncio.Condition()
+        self.pools: Dict[int, List[_PooledConnection]] = {}  # node_id -> 连接列表
+        self.connecting: Dict[int, int] = {}  # node_id -> 正在建立的连接数
+        self.reaper: Optional[asyncio.Task] = None
+
+
+class AsyncSSHConnectionPool:
+    """节点维度的异步 SSH 连接池"""
+
+    def __init__(self,
+                 max_sessions_per_connection: int = 8,
+                 max_connections_per_node: int = 4,
+                 idle_timeout: float = 300,
+                 keepalive_interval: int = 30,
+                 acquire_timeout: float = 30):
+        self.max_sessions_per_connection = max_sessions_per_connection
+        self.max_connections_per_node = max_connections_per_node
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._leases: Dict[int, _PooledConnection] = {}  # id(借出的 AsyncSSHClient) -> 连接
+        self._invalidated: Dict[int, float] = {}  # node_id -> 失效时间，早于此时间建立的连接不再借出
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        return state
+
+    # ========== 借出 / 归还 ==========
+
+    async def acquire(self, node: NodeRead) -> AsyncSSHClient:
+        """
+        借出一个共享连接的 AsyncSSHClient
+
+        Raises:
+            ConnectionError: 连接失败或等待超时
+        """
+        state = self._state()
+        self._ensure_reaper(state)
+        fingerprint = SSHConnectionPool._fingerprint(node)
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            conn, create = await self._reserve(state, node.id, fingerprint, deadline)
+            if create:
+                conn = await self._open_connection(state, node, fingerprint)
+            elif not conn.ssh.is_alive():
+                await self._release_conn(state, conn, broken=True)
+                continue
+
+            lease = AsyncSSHClient(node, conn=conn.ssh.conn)
+            self._leases[id(lease)] = conn
+            return lease
+
+    async def release(self, ssh: Optional[AsyncSSHClient]) -> None:
+        """归还借出的 AsyncSSHClient（重复归还或传入 None 时忽略）"""
+        if ssh is None:
+            return
+        conn = self._leases.pop(id(ssh), None)
+        try:
+            await ssh.close()  # 共享连接只关闭本会话的 SFTP
+        except Exception as e:
+            logger.debug(f"关闭 SFTP 会话失败: {e}")
+        if conn:
+            await self._release_conn(self._state(), conn, broken=not conn.ssh.is_alive())
+
+    @asynccontextmanager
+    async def session(self, node: NodeRead):
+        """借出连接的异步上下文管理器"""
+        ssh = await self.acquire(node)
+        try:
+            yield ssh
+        finally:
+            await self.release(ssh)
+
+    async def _reserve(self, state: _LoopState, node_id: int, fingerprint: str, deadline: float):
+        """挑选可复用连接，或占用一个新建连接的名额"""
+        to_close = []
+        try:
+            async with state.cond:
+                while True:
+                    conns = state.pools.setdefault(node_id, [])
+                    invalidated_at = self._invalidated.get(node_id, 0)
+                    for conn in list(conns):
+                        if conn.fingerprint != fingerprint or conn.created_at < invalidated_at:
+                            conn.retired = True
+                        if conn.retired and conn.leases == 0:
+                            conns.remove(conn)
+                            to_close.append(conn)
+
+                    usable = [c for c in conns
+                              if not c.retired and c.leases < self.max_sessions_per_connection]
+                    if usable:
+                        conn = min(usable, key=lambda c: c.leases)
+                        conn.leases += 1
+                        conn.last_used = time.monotonic()
+                        return conn, False
+
+                    alive = len([c for c in conns if not c.retired]) + state.connecting.get(node_id, 0)
+                    if alive < self.max_connections_per_node:
+                        state.connecting[node_id] = state.connecting.get(node_id, 0) + 1
+                        return None, True
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ConnectionError(f"SSH连接池已满: 节点 {node_id} 等待超时")
+                    try:
+                        await asyncio.wait_for(state.cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            for conn in to_close:
+                await self._close_conn(conn)
+
+    async def _open_connection(self, state: _LoopState, node: NodeRead, fingerprint: str) -> _PooledConnection:
+        """建立新连接（握手期间不持有锁）"""
+        try:
+            ssh = AsyncSSHClient(node)
+            await ssh.connect(keepalive_interval=self.keepalive_interval)
+        except BaseException:
+            async with state.cond:
+                state.connecting[node.id] -= 1
+                state.cond.notify_all()
+            raise
+
+        conn = _PooledConnection(ssh, fingerprint)
+        conn.leases = 1
+        async with state.cond:
+            state.connecting[node.id] -= 1
+            state.pools.setdefault(node.id, []).append(conn)
+        logger.debug(f"🔌 新建异步 SSH 连接: 节点 {node.name} ({node.host}:{node.port})")
+        return conn
+
+    async def _release_conn(self, state: _LoopState, conn: _PooledConnection, broken: bool = False) -> None:
+        close = False
+        async with state.cond:
+            conn.leases -= 1
+            conn.last_used = time.monotonic()
+            if broken:
+                conn.retired = True
+            if conn.retired and conn.leases == 0:
+                self._remove_conn(state, conn)
+                close = True
+            state.cond.notify_all()
+        if close:
+            await self._close_conn(conn)
+
+    @staticmethod
+    def _remove_conn(state: _LoopState, conn: _PooledConnection) -> None:
+        for node_id, conns in list(state.pools.items()):
+            if conn in conns:
+                conns.remove(conn)
+                if not conns:
+                    del state.pools[node_id]
+                return
+
+    @staticmethod
+    async def _close_conn(conn: _PooledConnection) -> None:
+        try:
+            await conn.ssh.close()
+        except Exception as e:
+            logger.debug(f"关闭异步 SSH 连接失败: {e}")
+
+    # ========== 失效 / 回收 ==========
+
+    def invalidate(self, node_id: int) -> None:
+        """
+        使节点的所有连接失效（可在任意线程调用）
+
+        已借出的连接归还后关闭，空闲连接在下次借出或回收时关闭。
+        """
+        self._invalidated[node_id] = time.monotonic()
+
+    async def evict_idle(self) -> int:
+        """关闭当前事件循环中空闲超时或已失效的连接，返回关闭数量"""
+        state = self._state()
+        now = time.monotonic()
+        to_close = []
+        async with state.cond:
+            for node_id, conns in list(state.pools.items()):
+                invalidated_at = self._invalidated.get(node_id, 0)
+                for conn in list(conns):
+                    if conn.leases == 0 and (conn.retired or conn.created_at < invalidated_at
+                                             or now - conn.last_used > self.idle_timeout
+                                             or not conn.ssh.is_alive()):
+                        self._remove_conn(state, conn)
+                        to_close.append(conn)
+        for conn in to_close:
+            await self._close_conn(conn)
+        return len(to_close)
+
+    def _ensure_reaper(self, state: _LoopState) -> None:
+        if state.reaper is None or state.reaper.done():
+            state.reaper = asyncio.ensure_future(self._reap_loop())
+
+    async def _reap_loop(self) -> None:
+        interval = max(5.0, min(self.idle_timeout, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                closed = await self.evict_idle()
+                if closed:
+                    logger.debug(f"🧹 回收空闲异步 SSH 连接 {closed} 个")
+            except Exception as e:
+                logger.error(f"回收空闲异步 SSH 连接失败: {e}")
+
+    async def close_all(self) -> None:
+        """关闭当前事件循环的所有连接（循环结束或应用关闭前调用）"""
+        loop = asyncio.get_running_loop()
+        state = self._states.pop(loop, None)
+        if state is None:
+            return
+        if state.reaper:
+            state.reaper.cancel()
+        conns = [c for cs in state.pools.values() for c in cs]
+        state.pools.clear()
+        for lease_id, conn in list(self._leases.items()):
+            if conn in conns:
+                del self._leases[lease_id]
+        for conn in conns:
+            await self._close_conn(conn)
+        if conns:
+            logger.info(f"⏹️ 已关闭异步 SSH 连接 {len(conns)} 个")
+
+    def stats(self) -> Dict[int, dict]:
+        """当前事件循环的连接池状态：node_id -> {connections, sessions}"""
+        state = self._states.get(asyncio.get_running_loop())
+        if state is None:
+            return {}
+        return {
+            node_id: {
+                "connections": len(conns),
+                "sessions": sum(c.leases for c in conns),
+            }
+            for node_id, conns in state.pools.items()
+        }
+
+
+# 全局实例
+async_ssh_pool = AsyncSSHConnectionPool()
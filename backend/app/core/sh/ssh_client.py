@@ -1,16 +1,149 @@
 # app/core/sh/ssh_client.py
 from app.modules.node.schemas import NodeRead
+from app.core.interrupt.execution_manager import ExecutionCancelledError
 
 import paramiko
+import codecs
+import selectors
+import threading
 import io
 import os
+from typing import Callable, Optional
+
+
+class ChannelReader:
+    """
+    事件驱动地读取命令输出，直到远端退出
+
+    通过 selector 等待通道可读（stdout/stderr 有数据或通道关闭），空闲时线程阻塞不占 CPU。
+    wait_interval 为检查 should_stop 的最长间隔；中断方调用 wakeup() 可立即唤醒读取线程。
+    """
+
+    def __init__(self, channel: paramiko.Channel,
+                 on_stdout: Callable[[str], None],
+                 on_stderr: Optional[Callable[[str], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 wait_interval: float = 1.0,
+                 chunk_size: int = 32768):
+        """
+        Args:
+            channel: 已执行 exec_command 的通道
+            on_stdout: 标准输出回调
+            on_stderr: 错误输出回调
+            should_stop: 返回 True 时中断读取
+            wait_interval: 无数据时的最长等待秒数
+            chunk_size: 单次读取字节数
+        """
+        self.channel = channel
+        self.on_stdout = on_stdout
+        self.on_stderr = on_stderr
+        self.should_stop = should_stop
+        self.wait_interval = wait_interval
+        self.chunk_size = chunk_size
+        # 按流增量解码，避免多字节字符被分块截断
+        self._out_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._err_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def wakeup(self):
+        """唤醒阻塞中的读取（线程安全，可在读取结束后调用）"""
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                os.write(self._wake_w, b'\0')
+            except BlockingIOError:
+                pass  # 管道已满说明已有待处理的唤醒
+
+    def _check_stop(self):
+        if self.should_stop and self.should_stop():
+            raise ExecutionCancelledError("任务已被用户中断")
+
+    def _drain(self):
+        channel = self.channel
+        while channel.recv_ready():
+            data = channel.recv(self.chunk_size)
+            if not data:
+                break
+            text = self._out_decoder.decode(data)
+            if text:
+                self.on_stdout(text)
+        while channel.recv_stderr_ready():
+            data = channel.recv_stderr(self.chunk_size)
+            if not data:
+                break
+            text = self._err_decoder.decode(data)
+            if text and self.on_stderr:
+                self.on_stderr(text)
+
+    def read(self) -> int:
+        """
+        Returns:
+            退出码（通道异常关闭时为 -1）
+
+        Raises:
+            ExecutionCancelledError: should_stop 返回 True
+        """
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.channel, selectors.EVENT_READ)
+                selector.register(self._wake_r, selectors.EVENT_READ)
+                while True:
+                    self._check_stop()
+                    self._drain()
+
+                    # 退出码在全部输出之后到达；通道关闭后管道常驻可读，必须退出循环
+                    if self.channel.exit_status_ready() or self.channel.closed:
+                        self._drain()
+                        break
+
+                    for key, _ in selector.select(self.wait_interval):
+                        if key.fileobj == self._wake_r:
+                            os.read(self._wake_r, 64)
+        finally:
+            with self._lock:
+                self._closed = True
+                os.close(self._wake_r)
+                os.close(self._wake_w)
+
+        # 通道关闭与中断同时发生时，以中断为准
+        self._check_stop()
+
+        tail = self._out_decoder.decode(b'', final=True)
+        if tail:
+            self.on_stdout(tail)
+        tail = self._err_decoder.decode(b'', final=True)
+        if tail and self.on_stderr:
+            self.on_stderr(tail)
+
+        return self.channel.recv_exit_status()
+
+
+def read_channel(channel: paramiko.Channel,
+                 on_stdout: Callable[[str], None],
+                 on_stderr: Optional[Callable[[str], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 wait_interval: float = 1.0) -> int:
+    """读取命令输出直到远端退出，返回退出码（参见 ChannelReader）"""
+    return ChannelReader(channel, on_stdout, on_stderr, should_stop, wait_interval).read()
+
 
 class SSHClient:
-    def __init__(self, node: NodeRead):
+    def __init__(self, node: NodeRead, client: paramiko.SSHClient = None):
+        """
+        Args:
+            node: 节点信息
+            client: 已建立连接的 paramiko 客户端（由连接池借出时共享传输层）
+        """
         self.node = node
-        self.client = paramiko.SSHClient()
+        self.shared = client is not None  # 共享连接由连接池负责关闭
+        self.client = client or paramiko.SSHClient()
         self.sftp = None  # SFTP 客户端
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        if not self.shared:
+            self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
     def connect(self):
         try:
@@ -40,22 +173,35 @@ class SSHClient:
     def execute_command(self, command: str, timeout=30):
         try:
             _, stdout, stderr = self.client.exec_command(command, timeout=timeout)
-            exit_code = stdout.channel.recv_exit_status()
-            output = stdout.read().decode('utf-8', errors='replace')
-            error = stderr.read().decode('utf-8', errors='replace')
-            return exit_code, output, error
+            try:
+                exit_code = stdout.channel.recv_exit_status()
+                output = stdout.read().decode('utf-8', errors='replace')
+                error = stderr.read().decode('utf-8', errors='replace')
+                return exit_code, output, error
+            finally:
+                # 共享连接下只关闭本次会话通道，不影响传输层
+                stdout.channel.close()
         except Exception as e:
             raise Exception(f"命令执行失败: {str(e)}")
 
+    def is_alive(self) -> bool:
+        """传输层是否仍可用"""
+        transport = self.client.get_transport()
+        return bool(transport and transport.is_active() and transport.is_authenticated())
+
     def close(self):
         if self.sftp:
-            self.sftp.close()
-        self.client.close()
+            try:
+                self.sftp.close()
+            finally:
+                self.sftp = None
+        if not self.shared:
+            self.client.close()
 
     # ========== 文件传输方法 ==========
 
-    def _get_sftp(self):
-        """获取 SFTP 客户端（懒加载）"""
+    def get_sftp(self):
+        """获取 SFTP 客户端（懒加载，随连接复用，由 close 关闭）"""
         if not self.sftp:
             self.sftp = self.client.open_sftp()
         return self.sftp
@@ -70,7 +216,7 @@ class SSHClient:
             callback: 进度回调函数 (bytes_sent, total_bytes)
         """
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             # 确保远程目录存在
             remote_dir = os.path.dirname(remote_path)
             try:
@@ -94,7 +240,7 @@ class SSHClient:
             callback: 进度回调函数 (bytes_received, total_bytes)
         """
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             # 确保本地目录存在
             local_dir = os.path.dirname(local_path)
             os.makedirs(local_dir, exist_ok=True)
@@ -114,7 +260,7 @@ class SSHClient:
             remote_path: 远程文件路径
         """
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             with sftp.open(remote_path, 'wb') as f:
                 f.write(fileobj.read())
             return True
@@ -129,7 +275,7 @@ class SSHClient:
             BytesIO 对象
         """
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             fileobj = io.BytesIO()
             with sftp.open(remote_path, 'rb') as f:
                 fileobj.write(f.read())
@@ -141,7 +287,7 @@ class SSHClient:
     def list_files(self, remote_path: str = '.'):
         """列出远程目录下的文件"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             return sftp.listdir(remote_path)
         except Exception as e:
             raise Exception(f"列出文件失败: {str(e)}")
@@ -149,7 +295,7 @@ class SSHClient:
     def list_files_attr(self, remote_path: str = '.'):
         """列出远程目录下的文件详细信息"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             return sftp.listdir_attr(remote_path)
         except Exception as e:
             raise Exception(f"列出文件详情失败: {str(e)}")
@@ -157,7 +303,7 @@ class SSHClient:
     def stat(self, remote_path: str):
         """获取远程文件状态"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             return sftp.stat(remote_path)
         except Exception as e:
             raise Exception(f"获取文件状态失败: {str(e)}")
@@ -165,7 +311,7 @@ class SSHClient:
     def remove_file(self, remote_path: str):
         """删除远程文件"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             sftp.remove(remote_path)
             return True
         except Exception as e:
@@ -174,7 +320,7 @@ class SSHClient:
     def rename_file(self, old_path: str, new_path: str):
         """重命名远程文件"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             sftp.rename(old_path, new_path)
             return True
         except Exception as e:
@@ -183,7 +329,7 @@ class SSHClient:
     def mkdir(self, remote_path: str):
         """创建远程目录"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             sftp.mkdir(remote_path)
             return True
         except Exception as e:
@@ -192,7 +338,7 @@ class SSHClient:
     def rmdir(self, remote_path: str):
         """删除远程目录"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             sftp.rmdir(remote_path)
             return True
         except Exception as e:
@@ -201,7 +347,7 @@ class SSHClient:
     def exists(self, remote_path: str) -> bool:
         """检查远程文件/目录是否存在"""
         try:
-            sftp = self._get_sftp()
+            sftp = self.get_sftp()
             sftp.stat(remote_path)
             return True
         except FileNotFoundError:
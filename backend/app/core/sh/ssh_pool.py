@@ -0,0 +1,311 @@
+# app/core/sh/ssh_pool.py
+"""
+SSH 连接池
+
+按节点复用 SSH 传输层：
+- 每个节点保持若干条长连接（keepalive），每条连接上复用多个会话通道
+- 借出前做健康检查，失效连接自动重建
+- 空闲连接由后台线程定期回收
+- 节点凭据变更时调用 invalidate 使旧连接失效
+
+用法：
+    with ssh_pool.session(node) as ssh:
+        ssh.execute_command("uptime")
+
+    # 需要跨函数持有时
+    ssh = ssh_pool.acquire(node)
+    try:
+        ...
+    finally:
+        ssh_pool.release(ssh)
+"""
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from app.core.sh.ssh_client import SSHClient
+from app.modules.node.schemas import NodeRead
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    """连接池中的一条物理连接"""
+
+    def __init__(self, ssh: SSHClient, fingerprint: str):
+        self.ssh = ssh
+        self.fingerprint = fingerprint
+        self.leases = 0  # 当前借出的会话数
+        self.retired = False  # 凭据已变更或连接已损坏，归还后关闭
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+
+
+class SSHConnectionPool:
+    """节点维度的 SSH 连接池"""
+
+    def __init__(self,
+                 max_sessions_per_connection: int = 8,
+                 max_connections_per_node: int = 4,
+                 idle_timeout: float = 300,
+                 health_check_interval: float = 30,
+                 keepalive_interval: int = 30,
+                 acquire_timeout: float = 30):
+        # OpenSSH 默认 MaxSessions=10，留出余量
+        self.max_sessions_per_connection = max_sessions_per_connection
+        self.max_connections_per_node = max_connections_per_node
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._pools: Dict[int, List[_PooledConnection]] = {}  # node_id -> 连接列表
+        self._connecting: Dict[int, int] = {}  # node_id -> 正在建立的连接数
+        self._leases: Dict[int, _PooledConnection] = {}  # id(借出的 SSHClient) -> 连接
+        self._reaper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _fingerprint(node: NodeRead) -> str:
+        """连接参数指纹，任一项变化即视为新凭据"""
+        raw = "|".join(str(v) for v in (
+            node.host, node.port, node.username, node.auth_type,
+            node.password or "", node.private_key or ""
+        ))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    # ========== 借出 / 归还 ==========
+
+    def acquire(self, node: NodeRead) -> SSHClient:
+        """
+        借出一个与节点连接共享传输层的 SSHClient
+
+        Raises:
+            ConnectionError: 连接失败或等待超时
+        """
+        self._ensure_reaper()
+        fingerprint = self._fingerprint(node)
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            conn, create = self._reserve(node.id, fingerprint, deadline)
+
+            if create:
+                conn = self._open_connection(node, fingerprint)
+            elif not self._check_health(conn):
+                # 健康检查失败：归还并丢弃，重新申请
+                self._release_conn(conn, broken=True)
+                continue
+
+            lease = SSHClient(node, client=conn.ssh.client)
+            with self._cond:
+                self._leases[id(lease)] = conn
+            return lease
+
+    def release(self, ssh: Optional[SSHClient]) -> None:
+        """归还借出的 SSHClient（重复归还或传入 None 时忽略）"""
+        if ssh is None:
+            return
+        with self._cond:
+            conn = self._leases.pop(id(ssh), None)
+        try:
+            ssh.close()  # 共享连接只关闭本会话的 SFTP
+        except Exception as e:
+            logger.debug(f"关闭 SFTP 会话失败: {e}")
+        if conn:
+            self._release_conn(conn, broken=not conn.ssh.is_alive())
+
+    @contextmanager
+    def session(self, node: NodeRead):
+        """借出连接的上下文管理器"""
+        ssh = self.acquire(node)
+        try:
+            yield ssh
+        finally:
+            self.release(ssh)
+
+    def _reserve(self, node_id: int, fingerprint: str, deadline: float):
+        """在锁内挑选可复用连接，或占用一个新建连接的名额"""
+        to_close = []
+        try:
+            with self._cond:
+                while True:
+                    conns = self._pools.setdefault(node_id, [])
+                    for conn in list(conns):
+                        if conn.fingerprint != fingerprint:
+                            conn.retired = True
+                        if conn.retired and conn.leases == 0:
+                            conns.remove(conn)
+                            to_close.append(conn)
+
+                    usable = [c for c in conns
+                              if not c.retired and c.leases < self.max_sessions_per_connection]
+                    if usable:
+                        conn = min(usable, key=lambda c: c.leases)
+                        conn.leases += 1
+                        conn.last_used = time.monotonic()
+                        return conn, False
+
+                    alive = len([c for c in conns if not c.retired]) + self._connecting.get(node_id, 0)
+                    if alive < self.max_connections_per_node:
+                        self._connecting[node_id] = self._connecting.get(node_id, 0) + 1
+                        return None, True
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ConnectionError(f"SSH连接池已满: 节点 {node_id} 等待超时")
+                    self._cond.wait(remaining)
+        finally:
+            for conn in to_close:
+                self._close_conn(conn)
+
+    def _open_connection(self, node: NodeRead, fingerprint: str) -> _PooledConnection:
+        """建立新连接（锁外执行握手）"""
+        try:
+            ssh = SSHClient(node)
+            ssh.connect()
+            transport = ssh.client.get_transport()
+            if transport and self.keepalive_interval:
+                transport.set_keepalive(self.keepalive_interval)
+        except Exception:
+            with self._cond:
+                self._connecting[node.id] -= 1
+                self._cond.notify_all()
+            raise
+
+        conn = _PooledConnection(ssh, fingerprint)
+        conn.leases = 1
+        with self._cond:
+            self._connecting[node.id] -= 1
+            self._pools.setdefault(node.id, []).append(conn)
+        logger.debug(f"🔌 新建 SSH 连接: 节点 {node.name} ({node.host}:{node.port})")
+        return conn
+
+    def _check_health(self, conn: _PooledConnection) -> bool:
+        """借出前检查连接；超过检查间隔时发送 ignore 包探活"""
+        if not conn.ssh.is_alive():
+            return False
+        if time.monotonic() - conn.last_checked < self.health_check_interval:
+            return True
+        try:
+            conn.ssh.client.get_transport().send_ignore()
+            conn.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.debug(f"SSH 连接健康检查失败: {e}")
+            return False
+
+    def _release_conn(self, conn: _PooledConnection, broken: bool = False) -> None:
+        close = False
+        with self._cond:
+            conn.leases -= 1
+            conn.last_used = time.monotonic()
+            if broken:
+                conn.retired = True
+            if conn.retired and conn.leases == 0:
+                self._remove_conn(conn)
+                close = True
+            self._cond.notify_all()
+        if close:
+            self._close_conn(conn)
+
+    def _remove_conn(self, conn: _PooledConnection) -> None:
+        """从池中摘除连接（调用方持有锁）"""
+        for node_id, conns in list(self._pools.items()):
+            if conn in conns:
+                conns.remove(conn)
+                if not conns:
+                    del self._pools[node_id]
+                return
+
+    @staticmethod
+    def _close_conn(conn: _PooledConnection) -> None:
+        try:
+            conn.ssh.close()
+        except Exception as e:
+            logger.debug(f"关闭 SSH 连接失败: {e}")
+
+    # ========== 失效 / 回收 ==========
+
+    def invalidate(self, node_id: int) -> None:
+        """使节点的所有连接失效（节点凭据变更、停用或删除时调用）"""
+        to_close = []
+        with self._cond:
+            for conn in list(self._pools.get(node_id, [])):
+                conn.retired = True
+                if conn.leases == 0:
+                    self._remove_conn(conn)
+                    to_close.append(conn)
+            self._cond.notify_all()
+        for conn in to_close:
+            self._close_conn(conn)
+        if to_close:
+            logger.info(f"♻️ 已使节点 {node_id} 的 SSH 连接失效")
+
+    def evict_idle(self) -> int:
+        """关闭空闲超时的连接，返回关闭数量"""
+        now = time.monotonic()
+        to_close = []
+        with self._cond:
+            for conns in list(self._pools.values()):
+                for conn in list(conns):
+                    if conn.leases == 0 and (conn.retired or now - conn.last_used > self.idle_timeout
+                                             or not conn.ssh.is_alive()):
+                        self._remove_conn(conn)
+                        to_close.append(conn)
+        for conn in to_close:
+            self._close_conn(conn)
+        return len(to_close)
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper and self._reaper.is_alive():
+            return
+        with self._cond:
+            if self._reaper and self._reaper.is_alive():
+                return
+            self._stop_event.clear()
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        interval = max(5.0, min(self.idle_timeout, self.health_check_interval))
+        while not self._stop_event.wait(interval):
+            try:
+                closed = self.evict_idle()
+                if closed:
+                    logger.debug(f"🧹 回收空闲 SSH 连接 {closed} 个")
+            except Exception as e:
+                logger.error(f"回收空闲 SSH 连接失败: {e}")
+
+    def close_all(self) -> None:
+        """关闭所有连接（应用关闭时调用）"""
+        self._stop_event.set()
+        with self._cond:
+            conns = [c for cs in self._pools.values() for c in cs]
+            for conn in conns:
+                conn.retired = True
+            self._pools.clear()
+            self._leases.clear()
+            self._cond.notify_all()
+        for conn in conns:
+            self._close_conn(conn)
+        logger.info("⏹️ SSH 连接池已关闭")
+
+    def stats(self) -> Dict[int, dict]:
+        """连接池状态：node_id -> {connections, sessions}"""
+        with self._cond:
+            return {
+                node_id: {
+                    "connections": len(conns),
+                    "sessions": sum(c.leases for c in conns),
+                }
+                for node_id, conns in self._pools.items()
+            }
+
+
+# 全局实例
+ssh_pool = SSHConnectionPool()
@@ -1,125 +1,308 @@
 import asyncio
+import logging
+import os
+import threading
 from fastapi import WebSocket
-from typing import Dict, Set, Deque
+from typing import Dict, List, Optional, Set, Deque, Tuple
 from collections import deque
 
-from app.core.interrupt.execution_manager import execution_manager
+from app.core.cluster import cluster_channel
+
+logger = logging.getLogger(__name__)
+
+# 每个订阅者的待发送队列长度，满时合并积压的日志片段
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+# 单帧最多合并的日志片段数
+WS_MAX_BATCH = int(os.getenv("WS_MAX_BATCH", "256"))
+# 每个执行的回放缓存字节上限（供后连接的客户端补齐日志）
+WS_REPLAY_BYTES = int(os.getenv("WS_REPLAY_BYTES", str(1024 * 1024)))
+# 队列积压合并时单个片段保留的最大字节数，超出部分丢弃最早的内容
+WS_COALESCE_BYTES = int(os.getenv("WS_COALESCE_BYTES", str(256 * 1024)))
+
+_CLOSE = object()  # 订阅者队列结束标记
+
+
+def _size(log_data: dict) -> int:
+    return len(log_data.get("output") or "") + len(log_data.get("error") or "") + 64
+
+
+def _is_final(log_data: dict) -> bool:
+    return bool(log_data.get("end_time"))
+
+
+def _coalesce(messages: List[dict], max_bytes: int = 0) -> List[dict]:
+    """
+    合并相邻的运行中日志片段（同状态、同节点），结束消息保持独立
+
+    max_bytes > 0 时，合并后的片段只保留最后 max_bytes 个字符，并标注丢弃量
+    """
+    merged: List[dict] = []
+    for msg in messages:
+        last = merged[-1] if merged else None
+        if (last is not None and not _is_final(last) and not _is_final(msg)
+                and last.get("status") == msg.get("status")
+                and last.get("node_id") == msg.get("node_id")):
+            merged[-1] = {
+                **last,
+                "output": (last.get("output") or "") + (msg.get("output") or ""),
+                "error": (last.get("error") or "") + (msg.get("error") or ""),
+            }
+        else:
+            merged.append(msg)
+
+    if max_bytes > 0:
+        for i, msg in enumerate(merged):
+            if _is_final(msg):
+                continue
+            trimmed = dict(msg)
+            for key in ("output", "error"):
+                text = trimmed.get(key) or ""
+                if len(text) > max_bytes:
+                    trimmed[key] = f"...[已丢弃 {len(text) - max_bytes} 字符]\n" + text[-max_bytes:]
+            merged[i] = trimmed
+    return merged
+
+
+class _ReplayBuffer:
+    """按字节数封顶的环形回放缓存"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.items: Deque[Tuple[int, dict, int]] = deque()  # (seq, 消息, 字节数)
+        self.bytes = 0
+        self.dropped = 0  # 因超出上限被淘汰的片段数
+
+    def append(self, seq: int, log_data: dict) -> None:
+        size = _size(log_data)
+        self.items.append((seq, log_data, size))
+        self.bytes += size
+        # 至少保留最新一条（通常是结束消息）
+        while self.bytes > self.max_bytes and len(self.items) > 1:
+            _, _, old_size = self.items.popleft()
+            self.bytes -= old_size
+            self.dropped += 1
+
+    def snapshot(self) -> List[dict]:
+        messages = [msg for _, msg, _ in self.items]
+        if self.dropped:
+            messages.insert(0, {
+                "status": "running",
+                "output": "...[早期日志已省略，完整日志请在执行结束后查看]\n",
+                "error": "",
+                "end_time": None,
+            })
+        return messages
+
+
+class _Subscriber:
+    """一个 WebSocket 连接：有界队列 + 独立发送协程"""
+
+    def __init__(self, websocket: WebSocket, start_seq: int, replay: List[dict]):
+        self.websocket = websocket
+        self.start_seq = start_seq  # 回放已覆盖到的序号，之后的消息走队列
+        self.replay = replay
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.task: Optional[asyncio.Task] = None
+        self.coalesced = 0  # 队列满时触发合并的次数
+
+    def put(self, log_data) -> None:
+        """入队（事件循环线程内调用）；队列满时合并积压片段，不阻塞发布方"""
+        try:
+            self.queue.put_nowait(log_data)
+            return
+        except asyncio.QueueFull:
+            pass
+        pending = []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        closing = _CLOSE in pending
+        pending = [m for m in pending if m is not _CLOSE]
+        if log_data is not _CLOSE:
+            pending.append(log_data)
+        self.coalesced += 1
+        for msg in _coalesce(pending, WS_COALESCE_BYTES)[-(WS_QUEUE_SIZE - 1):]:
+            self.queue.put_nowait(msg)
+        if closing or log_data is _CLOSE:
+            self.queue.put_nowait(_CLOSE)
+
 
 class ConnectionManager:
+    """
+    执行日志的 WebSocket 广播
+
+    - 发布方（任意线程）调用 send_log_sync：写入回放缓存，有订阅者时才投递到事件循环
+    - 每个订阅者一个有界 asyncio.Queue 和一个发送协程，空闲时阻塞在 queue.get()，不轮询
+    - 发送时把队列中积压的片段合并成一帧（单条为对象，多条为数组）
+    - 回放缓存按字节封顶，后连接的客户端先收到缓存的日志
+    - 多进程时，订阅的执行不在本进程运行：通过进程间通道（ws 主题）向其他进程登记订阅，
+      运行该执行的进程把回放缓存和后续日志转发过来，在本进程内照常推送
+    """
+
     def __init__(self):
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
-        self.log_cache: Dict[int, list] = {}
-        self.message_queues: Dict[int, Deque[dict]] = {}
-        self.queue_workers: Dict[int, asyncio.Task] = {}
+        self.active_connections: Dict[int, Set[_Subscriber]] = {}
+        self.replay: Dict[int, _ReplayBuffer] = {}
+        self.remote_watchers: Dict[int, Set[str]] = {}  # execution_id -> 订阅了该执行的其他进程
+        self.relayed: Set[int] = set()  # 日志由其他进程转发而来的执行
         self.loop = None
+        self._lock = threading.Lock()
+        self._seq = 0
 
     def set_event_loop(self, loop):
         self.loop = loop
 
     async def connect(self, websocket: WebSocket, execution_id: int):
         await websocket.accept()
-        if execution_id not in self.active_connections:
-            self.active_connections[execution_id] = set()
-            self.message_queues[execution_id] = deque()
-
-        self.active_connections[execution_id].add(websocket)
-
-        if execution_id not in self.queue_workers or self.queue_workers[execution_id].done():
-            self.queue_workers[execution_id] = asyncio.create_task(
-                self._process_message_queue(execution_id)
-            )
-
-        if execution_id in self.log_cache:
-            for log_data in self.log_cache[execution_id]:
-                self.message_queues[execution_id].append(log_data.copy())
-
-    async def _process_message_queue(self, execution_id: int):
-        while True:
-            # 🔑 关键1：每次循环强制释放控制权
-            await asyncio.sleep(0)
-
-            # 🔑 关键2：循环开始立即检查中断
-            if execution_manager.should_stop(execution_id):
-                # print(f'ws {datetime.now()} - 收到停止信号，立即退出')
-                break
-
-            try:
-                # 检查队列
-                if not self.message_queues[execution_id]:
-                    await asyncio.sleep(0.05)
-                    continue
-
-                # 🔑 关键3：处理消息前再次检查
-                if execution_manager.should_stop(execution_id):
-                    # print(f'ws {datetime.now()} - 处理中收到停止信号')
-                    break
-
-                # 处理单条消息
-                log_data = self.message_queues[execution_id].popleft()
-
-                # 🔑 关键4：仅当有连接时才广播
-                if execution_id in self.active_connections and self.active_connections[execution_id]:
-                    to_remove = set()
-                    for connection in self.active_connections[execution_id]:
-                        try:
-                            await connection.send_json(log_data)
-                        except Exception:
-                            to_remove.add(connection)
-
-                    # 清理失效连接
-                    for conn in to_remove:
-                        self.active_connections[execution_id].discard(conn)
-
-                # 🔑 关键5：无连接时主动休眠（防止CPU 100%）
-                elif len(self.message_queues[execution_id]) > 100:
-                    await asyncio.sleep(0.01)
-
-            except Exception as e:
-                print(f"处理消息队列失败: {e}")
-                break
-
-        # 清理资源
-        self._cleanup_execution(execution_id)
-
-    def _cleanup_execution(self, execution_id: int):
-        """统一清理资源"""
-        if execution_id in self.active_connections:
-            del self.active_connections[execution_id]
-        if execution_id in self.message_queues:
-            del self.message_queues[execution_id]
-        if execution_id in self.queue_workers:
-            self.queue_workers[execution_id].cancel()
+        with self._lock:
+            buffer = self.replay.get(execution_id)
+            replay = buffer.snapshot() if buffer else []
+            subscriber = _Subscriber(websocket, self._seq, replay)
+            first = execution_id not in self.active_connections
+            self.active_connections.setdefault(execution_id, set()).add(subscriber)
+            running_here = execution_id in self.replay and execution_id not in self.relayed
+        if first and not running_here:
+            # 执行可能在其他进程中运行
+            cluster_channel.publish("ws", {"action": "subscribe", "execution_id": execution_id})
+        subscriber.task = asyncio.create_task(self._sender(execution_id, subscriber))
 
     def disconnect(self, websocket: WebSocket, execution_id: int):
-        if execution_id in self.active_connections:
-            self.active_connections[execution_id].discard(websocket)
-            if not self.active_connections[execution_id]:
-                del self.active_connections[execution_id]
+        with self._lock:
+            subscribers = self.active_connections.get(execution_id)
+            if not subscribers:
+                return
+            for subscriber in [s for s in subscribers if s.websocket is websocket]:
+                subscribers.discard(subscriber)
+                if subscriber.task:
+                    subscriber.task.cancel()
+            if not subscribers:
+                self._unwatch(execution_id)
+
+    async def _sender(self, execution_id: int, subscriber: _Subscriber):
+        websocket = subscriber.websocket
+        try:
+            for i in range(0, len(subscriber.replay), WS_MAX_BATCH):
+                await self._send_frame(websocket, subscriber.replay[i:i + WS_MAX_BATCH])
+            subscriber.replay = []
+
+            while True:
+                batch = [await subscriber.queue.get()]
+                while len(batch) < WS_MAX_BATCH and not subscriber.queue.empty():
+                    batch.append(subscriber.queue.get_nowait())
+                closing = _CLOSE in batch
+                messages = [m for m in batch if m is not _CLOSE]
+                if messages:
+                    await self._send_frame(websocket, messages)
+                if closing:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"推送执行日志失败: execution_id={execution_id}, error={e}")
+        finally:
+            with self._lock:
+                subscribers = self.active_connections.get(execution_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        self._unwatch(execution_id)
+
+    def _unwatch(self, execution_id: int):
+        """最后一个订阅者离开（持有 _lock 时调用）"""
+        del self.active_connections[execution_id]
+        if execution_id not in self.replay or execution_id in self.relayed:
+            cluster_channel.publish("ws", {"action": "unsubscribe", "execution_id": execution_id})
+        if execution_id in self.relayed:
+            self.relayed.discard(execution_id)
+            self.replay.pop(execution_id, None)
+
+    @staticmethod
+    async def _send_frame(websocket: WebSocket, messages: List[dict]):
+        frame = _coalesce(messages)
+        await websocket.send_json(frame[0] if len(frame) == 1 else frame)
 
     def send_log_sync(self, execution_id: int, log_data: dict):
-        #先放入缓存
-        if execution_id not in self.log_cache:
-            self.log_cache[execution_id] = []
-        self.log_cache[execution_id].append(log_data)
+        """发布一条日志片段（线程安全；调用后不要再修改 log_data）"""
+        self._append(execution_id, log_data)
+        if execution_id in self.remote_watchers:
+            cluster_channel.publish("ws", {"action": "log", "execution_id": execution_id, "messages": [log_data]})
 
-        #消息队列
-        if execution_id not in self.message_queues:
-            return
+    def _append(self, execution_id: int, log_data: dict):
+        """写入回放缓存并投递给本进程的订阅者"""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            buffer = self.replay.get(execution_id)
+            if buffer is None:
+                buffer = self.replay[execution_id] = _ReplayBuffer(WS_REPLAY_BYTES)
+            buffer.append(seq, log_data)
+            has_subscribers = bool(self.active_connections.get(execution_id))
 
-        # 限制队列长度防内存爆炸
-        if len(self.message_queues[execution_id]) > 10000:
-            return
+        # 无订阅者时不唤醒事件循环
+        if has_subscribers and self.loop:
+            self.loop.call_soon_threadsafe(self._publish, execution_id, seq, log_data)
 
-        # 通过事件循环线程安全入队
-        if self.loop:
-            self.loop.call_soon_threadsafe(
-                self.message_queues[execution_id].append,
-                log_data.copy()
-            )
+    def _publish(self, execution_id: int, seq: int, log_data):
+        """在事件循环线程中投递到各订阅者队列"""
+        with self._lock:
+            subscribers = list(self.active_connections.get(execution_id, ()))
+        for subscriber in subscribers:
+            if log_data is _CLOSE or seq > subscriber.start_seq:
+                subscriber.put(log_data)
 
     def cleanup(self, execution_id: int):
-        self._cleanup_execution(execution_id)
-        if execution_id in self.log_cache:
-            del self.log_cache[execution_id]
+        """执行结束：发完已排队的日志后关闭发送协程，并释放回放缓存"""
+        with self._lock:
+            self.replay.pop(execution_id, None)
+            self.relayed.discard(execution_id)
+            has_subscribers = bool(self.active_connections.get(execution_id))
+            watchers = self.remote_watchers.pop(execution_id, None)
+        if watchers:
+            cluster_channel.publish("ws", {"action": "close", "execution_id": execution_id})
+        if has_subscribers and self.loop:
+            self.loop.call_soon_threadsafe(self._publish, execution_id, 0, _CLOSE)
+
+    def _on_cluster_message(self, message: dict, sender: str):
+        """处理其他进程的订阅登记与转发来的日志（在通道线程中调用）"""
+        action, execution_id = message.get("action"), message.get("execution_id")
+        if action == "subscribe":
+            with self._lock:
+                self.remote_watchers.setdefault(execution_id, set()).add(sender)
+                buffer = self.replay.get(execution_id)
+                snapshot = buffer.snapshot() if buffer and execution_id not in self.relayed else None
+            if snapshot:
+                cluster_channel.publish("ws", {"action": "log", "execution_id": execution_id, "messages": snapshot})
+        elif action == "unsubscribe":
+            with self._lock:
+                watchers = self.remote_watchers.get(execution_id)
+                if watchers is not None:
+                    watchers.discard(sender)
+                    if not watchers:
+                        del self.remote_watchers[execution_id]
+        elif action in ("log", "close"):
+            with self._lock:
+                if execution_id not in self.active_connections:
+                    return
+                self.relayed.add(execution_id)
+            if action == "log":
+                for log_data in message.get("messages", []):
+                    self._append(execution_id, log_data)
+            else:
+                self.cleanup(execution_id)
+
+    def stats(self) -> dict:
+        """广播状态：订阅数、回放缓存占用、队列合并次数"""
+        with self._lock:
+            subscribers = [s for subs in self.active_connections.values() for s in subs]
+            return {
+                "executions": len(self.active_connections),
+                "subscribers": len(subscribers),
+                "queued": sum(s.queue.qsize() for s in subscribers),
+                "coalesced": sum(s.coalesced for s in subscribers),
+                "replay_executions": len(self.replay),
+                "replay_bytes": sum(b.bytes for b in self.replay.values()),
+                "remote_watchers": sum(len(w) for w in self.remote_watchers.values()),
+                "relayed": len(self.relayed),
+            }
+
 
 ws_manager = ConnectionManager()
+cluster_channel.subscribe("ws", ws_manager._on_cluster_message)
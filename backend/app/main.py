@@ -49,23 +49,49 @@ async def lifespan(app: FastAPI):
     from app.core.ws.ws_manager import ws_manager
     ws_manager.set_event_loop(asyncio.get_running_loop())
 
-    # 4. 定时任务配置
+    # 3.1 进程间通道（多 worker 时转发停止信号、执行日志和任务变更）
+    from app.core.cluster import cluster_channel
+    cluster_channel.start()
+
+    # 3.2 清理已退出进程遗留的任务执行记录（排队中/运行中）
+    try:
+        from app.core.db.database import get_engine
+        from app.modules.cron.services import reconcile_orphaned_executions
+        reconcile_orphaned_executions(get_engine())
+    except Exception as e:
+        logger.warning(f"清理中断的任务执行失败: {e}")
+
+    # 4. 定时任务配置（多 worker 时只有调度主进程执行定时任务）
     from app.core.scheduler.config import init_schedule,destroy_schedule
     init_schedule()
 
-    # 5. CPE 自动监控启动
+    # 5. CPE 自动监控启动（多 worker 时与定时调度一样只在调度主进程运行，主进程切换时随之迁移）
     try:
+        from app.core.cluster import scheduler_lease
         from app.core.db.database import get_engine
         from app.modules.cpe.services import CPEMonitorService
-        CPEMonitorService.auto_start_monitor(get_engine())
+        scheduler_lease.add_listener(
+            on_elected=lambda: CPEMonitorService.auto_start_monitor(get_engine()),
+            on_revoked=CPEMonitorService.stop_monitor,
+        )
+        if scheduler_lease.is_leader:
+            CPEMonitorService.auto_start_monitor(get_engine())
     except Exception as e:
         logger.warning(f"CPE 自动监控启动失败: {e}")
 
-    # 6. 路由配置
+    # 6. 工作流定时唤醒（挂起中的等待节点，包括重启前挂起的）
+    try:
+        from app.core.db.database import get_engine
+        from app.modules.workflow.runtime import workflow_runtime
+        workflow_runtime.start_timers(get_engine())
+    except Exception as e:
+        logger.warning(f"工作流定时唤醒启动失败: {e}")
+
+    # 7. 路由配置
     from app.core.routers import router_manager
     router_manager.register_routers(app)
 
-    # 7. 记录应用启动时间
+    # 8. 记录应用启动时间
     from datetime import datetime
     from app.core.db.database import get_engine
     from app.modules.sys.models import system_config_table
@@ -89,6 +115,23 @@ async def lifespan(app: FastAPI):
     logger.info("应用正在关闭...")
     # 关闭调度器
     destroy_schedule()
+    # 停止定时任务执行器（取消排队中的执行）
+    from app.modules.cron.executor import cron_executor
+    cron_executor.shutdown()
+    # 停止工作流运行时（取消未完成的执行）
+    from app.modules.workflow.runtime import workflow_runtime
+    workflow_runtime.shutdown()
+    # 关闭 SSH 连接池
+    from app.core.sh.ssh_pool import ssh_pool
+    ssh_pool.close_all()
+    from app.core.sh.async_ssh_pool import async_ssh_pool
+    await async_ssh_pool.close_all()
+    # 停止进程间通道（注销本进程）
+    from app.core.cluster import cluster_channel
+    cluster_channel.stop()
+    # 提交写队列中剩余的写入
+    from app.core.db.write_queue import db_writer
+    db_writer.close()
 
 
 app = FastAPI(title="Note App", lifespan=lifespan)
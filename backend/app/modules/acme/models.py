@@ -1,7 +1,7 @@
 # app/modules/acme/models.py
 from datetime import datetime
 
-from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from app.core.db.database import engine, metadata
 
 # ========== 1. DNS授权表 ==========
@@ -73,6 +73,10 @@ ssl_applications_table = Table(
     Column("created_at", DateTime, default=datetime.now),
     Column("updated_at", DateTime, default=datetime.now, onupdate=datetime.now),
 
+    # 索引
+    Index("ix_ssl_applications_status_renew", "status", "next_renew_at"),  # 待续期扫描
+    Index("ix_ssl_applications_dns_auth", "dns_auth_id"),
+
     sqlite_autoincrement=True,
 )
 
@@ -102,6 +106,9 @@ ssl_application_executions_table = Table(
     # 时间戳
     Column("created_at", DateTime, default=datetime.now),
 
+    # 索引
+    Index("ix_ssl_application_executions_app_created", "application_id", "created_at"),
+
     sqlite_autoincrement=True,
 )
 
@@ -137,6 +144,10 @@ ssl_certificates_table = Table(
     # 时间戳
     Column("created_at", DateTime, default=datetime.now),
 
+    # 索引（domains 为 JSON 数组，按域名查找先用有效期缩小范围再过滤）
+    Index("ix_ssl_certificates_active_expiry", "is_active", "not_after"),
+    Index("ix_ssl_certificates_application", "application_id", "created_at"),
+
     sqlite_autoincrement=True,
 )
 
@@ -151,6 +162,8 @@ ssl_download_logs_table = Table(
     Column("downloaded_by", String(100)),  # 下载用户/来源
     Column("downloaded_at", DateTime, default=datetime.now),
 
+    Index("ix_ssl_download_logs_cert", "cert_id", "downloaded_at"),
+
     sqlite_autoincrement=True,
 )
 
@@ -433,13 +433,11 @@ class ApplicationService:
                     from app.modules.node.services import get_node
                     node_dict = get_node(engine, application['node_id'])
                     from app.modules.node.schemas import NodeRead
-                    from app.core.sh.ssh_client import SSHClient
-                    ssh = SSHClient(NodeRead(**node_dict))
-                    ssh.connect()
-                    ssh.upload_file(cert, application['crt_path'])
-                    ssh.upload_file(key, application['key_path'])
+                    from app.core.sh.ssh_pool import ssh_pool
+                    with ssh_pool.session(NodeRead(**node_dict)) as ssh:
+                        ssh.upload_file(cert, application['crt_path'])
+                        ssh.upload_file(key, application['key_path'])
                     logger.info(f"证书上传成功: {application['crt_path']}")
-                    ssh.close()
                 except Exception as e:
                     logger.error(f"证书上传失败: {str(e)}")
 
@@ -543,11 +541,10 @@ class ApplicationService:
                             from app.modules.node.services import get_node
                             node_dict = get_node(engine, application['node_id'])
                             from app.modules.node.schemas import NodeRead
-                            from app.core.sh.ssh_client import SSHClient
-                            ssh = SSHClient(NodeRead(**node_dict))
-                            ssh.connect()
-                            ssh.upload_file(cert, application['crt_path'])
-                            ssh.upload_file(key, application['key_path'])
+                            from app.core.sh.ssh_pool import ssh_pool
+                            with ssh_pool.session(NodeRead(**node_dict)) as ssh:
+                                ssh.upload_file(cert, application['crt_path'])
+                                ssh.upload_file(key, application['key_path'])
                             logger.info(f"证书上传成功: {application['crt_path']}")
                         except Exception as e:
                             logger.error(f"证书上传失败: {str(e)}")
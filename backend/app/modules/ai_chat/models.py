@@ -1,5 +1,5 @@
 # app/modules/ai_chat/models.py
-from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, MetaData, Boolean
+from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, MetaData, Boolean, Index
 from app.core.db.database import metadata, engine
 
 conversations_table = Table(
@@ -21,6 +21,7 @@ messages_table = Table(
     Column("role", String(50), nullable=False, comment="消息角色：user 或 assistant"),
     Column("content", Text, nullable=False, comment="消息内容"),
     Column("created_at", DateTime, nullable=False),
+    Index("ix_ai_messages_conversation_created", "conversation_id", "created_at"),
     sqlite_autoincrement=True,
 )
 
@@ -64,6 +65,7 @@ knowledge_document_table = Table(
     Column("is_active", Boolean, default=True, comment="是否启用"),
     Column("created_at", DateTime, nullable=False),
     Column("updated_at", DateTime, nullable=False),
+    Index("ix_ai_knowledge_document_base", "knowledge_base_id"),
     sqlite_autoincrement=True,
 )
 
@@ -77,6 +79,7 @@ knowledge_chunk_table = Table(
     Column("content", Text, nullable=False, comment="分片内容"),
     Column("metadata", Text, nullable=True, comment="元数据，JSON格式"),
     Column("created_at", DateTime, nullable=False),
+    Index("ix_ai_knowledge_chunk_document", "document_id", "chunk_index"),
     sqlite_autoincrement=True,
 )
 
@@ -2,9 +2,9 @@ from fastapi import APIRouter, HTTPException, WebSocket, Query
 from fastapi.params import Body
 from app.core.ws.ws_manager import ws_manager
 from app.core.db.database import engine, metadata
-from . import services, schemas, models
+from . import services, schemas, models, log_store, fanout
 from app.modules.node.schemas import NodeRequest
-from ...core.exception.exceptions import NotFoundException, ServerException
+from ...core.exception.exceptions import NotFoundException, ServerException, ValidationException
 from ...core.pojo.response import BaseResponse
 
 
@@ -44,10 +44,21 @@ async def execution_logs_websocket(websocket: WebSocket, execution_id: int, toke
 @router.post("/jobs")
 def create_cron_job(job: schemas.CronJobCreate):
     """为多个节点创建相同任务"""
+    _check_staged_command(job.stage_script, job.command)
+    if job.fanout or job.target_tag:
+        # 多节点任务：只创建一个任务，执行时在所有目标节点上并行执行
+        targets = fanout.resolve_targets(engine, job.node_ids, job.target_tag)
+        if not targets:
+            raise NotFoundException(detail="没有匹配的目标节点")
+        job_data = job.model_dump(exclude={'node_ids', 'fanout'})
+        job_data['node_id'] = targets[0]['id']  # 仅作默认显示节点，执行、列表和调度都按解析出的目标节点
+        job_data['target_node_ids'] = None if job.target_tag else job.node_ids
+        return BaseResponse.success([services.create_cron_job(engine, schemas.CronJobCreateSingle(**job_data))])
+
     results = []
     for node_id in job.node_ids:
         # 为每个节点创建独立任务
-        job_data = job.model_dump()
+        job_data = job.model_dump(exclude={'fanout', 'target_tag', 'fanout_width'})
         job_data['node_id'] = node_id  # 单个节点ID
         del job_data['node_ids']       # 移除列表字段
 
@@ -55,6 +66,16 @@ def create_cron_job(job: schemas.CronJobCreate):
         results.append(result)
     return BaseResponse.success(results)
 
+def _check_staged_command(stage_script: bool, command: str):
+    """脚本暂存模式下，命令中的参数占位符需能一一对应到环境变量"""
+    if not stage_script:
+        return
+    from .script_cache import check_placeholders
+    try:
+        check_placeholders(command)
+    except ValueError as e:
+        raise ValidationException(detail=str(e))
+
 @router.post("/jobsList")
 def read_jobs(req: NodeRequest):
     return BaseResponse.success(services.get_cron_jobs(engine, req.node_ids or None))
@@ -68,6 +89,10 @@ def update_cron_job(job_id: int, job_update: schemas.CronJobUpdate):
 
     # 只允许更新 name, schedule, command, description, is_active
     updated_data = job_update.model_dump(exclude_unset=True)
+    _check_staged_command(
+        updated_data.get('stage_script', existing_job.get('stage_script')),
+        updated_data.get('command', existing_job['command']),
+    )
 
     success = services.update_cron_job(engine, job_id, updated_data)
     if not success:
@@ -93,14 +118,69 @@ def sync_jobs():
     return {"message": f"已同步 {count} 个任务"}
 
 @router.get("/executions/{execution_id}")
-def read_execution(execution_id: int):
-    execution = services.get_execution(engine, execution_id)
+def read_execution(execution_id: int, with_logs: bool = True):
+    execution = services.get_execution(engine, execution_id, with_logs)
     if not execution:
         raise NotFoundException(detail=f"执行记录不存在")
     return BaseResponse.success(execution)
 
+@router.get("/executions/{execution_id}/output")
+def read_execution_output(
+        execution_id: int,
+        stream: str = Query("stdout", pattern="^(stdout|stderr)$"),
+        offset: int = Query(0, ge=0),
+        limit: int = Query(64 * 1024, ge=1, le=1024 * 1024),
+):
+    """按字符范围分段读取执行输出"""
+    result = log_store.read_execution_log(engine, execution_id, stream, offset, limit)
+    if result is None:
+        raise NotFoundException(detail=f"执行记录不存在")
+    return BaseResponse.success(result)
+
+@router.get("/jobs/load-profile")
+def read_jobs_load_profile(hours: int = Query(24, ge=1, le=168)):
+    """未来一段时间内每秒、每分钟触发的任务数（所有模块的已启用计划）"""
+    from app.core.scheduler import scheduler_service
+    return BaseResponse.success(scheduler_service.load_profile(hours))
+
+@router.get("/retention/stats")
+def read_retention_stats():
+    """执行记录保留与归档概况"""
+    from .retention import retention_stats
+    return BaseResponse.success(retention_stats(engine))
+
+@router.post("/retention/compact")
+def compact_executions():
+    """立即归档超出保留范围的执行日志（分批处理，单次有批数上限）"""
+    from .retention import compact_executions
+    return BaseResponse.success(compact_executions(engine))
+
+@router.get("/executor/stats")
+def read_executor_stats():
+    """执行器队列深度与并发指标"""
+    from .executor import cron_executor
+    return BaseResponse.success(cron_executor.stats())
+
+@router.get("/overlap/stats")
+def read_overlap_stats():
+    """任务重叠策略：进行中的任务、待执行的触发以及跳过/延后/替换次数"""
+    from .overlap import overlap_guard
+    return BaseResponse.success(overlap_guard.stats())
+
+@router.get("/scripts/stats")
+def read_script_cache_stats():
+    """脚本暂存：各节点已上传的缓存脚本以及本进程的校验/上传次数"""
+    from .script_cache import script_cache
+    return BaseResponse.success(script_cache.stats(engine))
+
+@router.post("/scripts/gc")
+def gc_script_cache():
+    """立即清理不再被任何暂存任务引用的缓存脚本"""
+    from .script_cache import script_cache
+    return BaseResponse.success(script_cache.gc(engine))
+
 @router.post("/executions/{execution_id}/stop")
-async def stop_execution(execution_id: int):
+def stop_execution(execution_id: int):
     from app.core.interrupt.execution_manager import execution_manager
     execution_manager.stop_execution(execution_id)
     return BaseResponse.success({"status": "ok", "message": "中断请求已发送"})
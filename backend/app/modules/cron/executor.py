@@ -0,0 +1,285 @@
+# app/modules/cron/executor.py
+"""
+定时任务执行器
+
+所有后台执行（手动、调度、批量）都提交到这里排队，由固定数量的工作线程执行：
+- 全局并发上限：工作线程数 CRON_MAX_WORKERS
+- 单节点并发上限：CRON_MAX_PER_NODE，超出的任务留在队列中，不占用工作线程
+  （多节点任务占用每个目标节点的名额，另以 fanout:<任务ID> 限制同一任务的并发）
+- 优先级队列：数值越小越先执行，同优先级按提交顺序（FIFO）
+- 队列长度上限：CRON_MAX_QUEUE，超出时拒绝提交，由调用方记录失败
+- 排队中的任务可取消，不会建立 SSH 连接
+- 多节点任务需要所有目标节点同时有名额：被节点名额挡住时预留这些节点，
+  后面的任务不再占用，节点空出后先满足它，不会被源源不断的单节点任务饿死
+
+突发大量任务时只会排队，线程数、SSH 握手数和数据库写入并发都保持有界。
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 优先级（数值越小越优先）
+PRIORITY_HIGH = 0  # 手动触发
+PRIORITY_NORMAL = 10  # 定时调度
+
+# 并发名额：节点ID，或多节点任务的多个名额
+Slots = Union[Hashable, Iterable[Hashable]]
+
+
+def fanout_slot(job_id: int) -> str:
+    """多节点任务自身的并发名额（同一任务同时只执行 max_per_node 次）"""
+    return f"fanout:{job_id}"
+
+
+def _is_fanout_slot(slot: Hashable) -> bool:
+    return isinstance(slot, str) and slot.startswith("fanout:")
+
+
+def _as_slots(node_id: Slots) -> Tuple[Hashable, ...]:
+    if isinstance(node_id, (list, tuple, set, frozenset)):
+        return tuple(dict.fromkeys(node_id))
+    return (node_id,)
+
+
+class _QueuedTask:
+    """队列中的一次执行"""
+
+    __slots__ = ("priority", "seq", "execution_id", "slots", "run", "on_cancel", "enqueued_at", "cancelled")
+
+    def __init__(self, priority: int, seq: int, execution_id: int, slots: Tuple[Hashable, ...],
+                 run: Callable[[], None], on_cancel: Optional[Callable[[], None]]):
+        self.priority = priority
+        self.seq = seq
+        self.execution_id = execution_id
+        self.slots = slots
+        self.run = run
+        self.on_cancel = on_cancel
+        self.enqueued_at = time.monotonic()
+        self.cancelled = False
+
+    def __lt__(self, other: "_QueuedTask") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class CronExecutor:
+    """有界工作线程池 + 全局/单节点并发控制"""
+
+    def __init__(self, max_workers: int = 8, max_per_node: int = 2, max_queue_size: int = 1000):
+        self.max_workers = max_workers
+        self.max_per_node = max_per_node
+        self.max_queue_size = max_queue_size
+
+        self._cond = threading.Condition()
+        self._heap: List[_QueuedTask] = []  # 尚未检查过的任务
+        self._blocked: List[_QueuedTask] = []  # 检查过但名额不足的任务，按 (优先级, 序号) 有序
+        self._queued: Dict[int, _QueuedTask] = {}  # execution_id -> 排队任务
+        self._running: Dict[int, Tuple[Hashable, ...]] = {}  # execution_id -> 占用的名额
+        self._slot_running: Dict[Hashable, int] = {}  # 名额 -> 运行中的执行数
+        self._seq = itertools.count()
+        self._workers: List[threading.Thread] = []
+        self._stopping = False
+
+        # 累计指标
+        self._submitted = 0
+        self._rejected = 0
+        self._cancelled = 0
+        self._completed = 0
+        self._total_wait = 0.0
+
+    # ========== 提交 / 取消 ==========
+
+    def submit(self, execution_id: int, node_id: Slots, run: Callable[[], None],
+               on_cancel: Optional[Callable[[], None]] = None,
+               priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        提交一次执行
+
+        Args:
+            node_id: 占用的并发名额，单节点任务为节点ID；多节点任务为名额元组
+                （(fanout_slot(任务ID), 目标节点ID...)），所有名额都未达上限时才开始执行
+            run: 在工作线程中执行的函数
+            on_cancel: 排队中被取消（或执行器关闭）时调用
+            priority: 优先级，数值越小越优先
+
+        Returns:
+            是否入队成功；队列已满或执行器已关闭时返回 False
+        """
+        self._ensure_workers()
+        with self._cond:
+            if self._stopping or len(self._queued) >= self.max_queue_size:
+                self._rejected += 1
+                return False
+            task = _QueuedTask(priority, next(self._seq), execution_id, _as_slots(node_id), run, on_cancel)
+            heapq.heappush(self._heap, task)
+            self._queued[execution_id] = task
+            self._submitted += 1
+            self._cond.notify_all()
+        return True
+
+    def cancel(self, execution_id: int) -> bool:
+        """取消排队中的执行；已开始或不存在时返回 False"""
+        with self._cond:
+            task = self._queued.pop(execution_id, None)
+            if task is None:
+                return False
+            task.cancelled = True  # 惰性删除，出队时跳过
+            self._cancelled += 1
+        self._run_cancel(task)
+        return True
+
+    def is_queued(self, execution_id: int) -> bool:
+        with self._cond:
+            return execution_id in self._queued
+
+    @staticmethod
+    def _run_cancel(task: _QueuedTask) -> None:
+        if task.on_cancel is None:
+            return
+        try:
+            task.on_cancel()
+        except Exception as e:
+            logger.error(f"取消排队执行 {task.execution_id} 失败: {e}")
+
+    # ========== 工作线程 ==========
+
+    def _ensure_workers(self) -> None:
+        if self._workers:
+            return
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"cron-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            logger.info(f"⚙️ 定时任务执行器已启动: 工作线程 {self.max_workers}，单节点并发 {self.max_per_node}")
+
+    def _take(self) -> Optional[_QueuedTask]:
+        """
+        取出优先级最高且占用的名额都未达上限的任务（调用方持有锁）
+
+        按 (优先级, 序号) 依次检查已阻塞的任务和堆中的任务（两者归并），名额不足的任务移入有序的
+        阻塞列表，不再每次弹出、压回整个堆。多节点任务只被节点名额挡住时预留它的所有名额，
+        排在它后面、需要这些名额的任务不能先执行；被自身的 fanout 名额挡住（同一任务上一次还在执行）时
+        不预留，等待时间不确定，不应挡住这些节点上的其他任务。
+        """
+        reserved = set()
+        i = 0
+        while True:
+            from_blocked = i < len(self._blocked) and (not self._heap or self._blocked[i] < self._heap[0])
+            if from_blocked:
+                candidate = self._blocked[i]
+            elif self._heap:
+                candidate = heapq.heappop(self._heap)
+            else:
+                return None
+
+            if candidate.cancelled:
+                if from_blocked:
+                    del self._blocked[i]
+                continue
+
+            full = [slot for slot in candidate.slots if self._slot_running.get(slot, 0) >= self.max_per_node]
+            if not full and reserved.isdisjoint(candidate.slots):
+                if from_blocked:
+                    del self._blocked[i]
+                return candidate
+
+            if len(candidate.slots) > 1 and not any(_is_fanout_slot(slot) for slot in full):
+                reserved.update(candidate.slots)
+            if not from_blocked:
+                # 堆顶小于 blocked[i]、大于 blocked[i-1]，插入 i 处仍然有序
+                self._blocked.insert(i, candidate)
+            i += 1
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                task = None
+                while not self._stopping:
+                    task = self._take()
+                    if task:
+                        break
+                    self._cond.wait()
+                if task is None:
+                    return
+                del self._queued[task.execution_id]
+                self._running[task.execution_id] = task.slots
+                for slot in task.slots:
+                    self._slot_running[slot] = self._slot_running.get(slot, 0) + 1
+                self._total_wait += time.monotonic() - task.enqueued_at
+
+            try:
+                task.run()
+            except Exception as e:
+                logger.error(f"执行 {task.execution_id} 异常: {e}")
+            finally:
+                with self._cond:
+                    for slot in self._running.pop(task.execution_id, ()):
+                        if self._slot_running[slot] <= 1:
+                            del self._slot_running[slot]
+                        else:
+                            self._slot_running[slot] -= 1
+                    self._completed += 1
+                    # 节点名额释放后，之前被跳过的任务可能可以执行了
+                    self._cond.notify_all()
+
+    def shutdown(self) -> None:
+        """停止接收新任务并取消所有排队中的执行（运行中的执行不等待）"""
+        with self._cond:
+            self._stopping = True
+            pending = list(self._queued.values())
+            self._queued.clear()
+            self._heap.clear()
+            self._blocked.clear()
+            for task in pending:
+                task.cancelled = True
+            self._cancelled += len(pending)
+            self._cond.notify_all()
+        for task in pending:
+            self._run_cancel(task)
+        logger.info(f"⏹️ 定时任务执行器已停止，取消排队执行 {len(pending)} 个")
+
+    # ========== 指标 ==========
+
+    def stats(self) -> dict:
+        """队列深度与并发指标"""
+        now = time.monotonic()
+        with self._cond:
+            nodes: Dict[Hashable, dict] = {}
+            for slots in self._running.values():
+                for slot in slots:
+                    nodes.setdefault(slot, {"running": 0, "queued": 0})["running"] += 1
+            for task in self._queued.values():
+                for slot in task.slots:
+                    nodes.setdefault(slot, {"running": 0, "queued": 0})["queued"] += 1
+            oldest = min((t.enqueued_at for t in self._queued.values()), default=None)
+            started = self._submitted - self._cancelled - len(self._queued)
+            return {
+                "max_workers": self.max_workers,
+                "max_per_node": self.max_per_node,
+                "max_queue_size": self.max_queue_size,
+                "running": len(self._running),
+                "queued": len(self._queued),
+                "oldest_queued_seconds": round(now - oldest, 3) if oldest is not None else 0,
+                "avg_wait_seconds": round(self._total_wait / started, 3) if started > 0 else 0,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+                "completed": self._completed,
+                "nodes": nodes,
+            }
+
+
+# 全局实例
+cron_executor = CronExecutor(
+    max_workers=int(os.getenv("CRON_MAX_WORKERS", "8")),
+    max_per_node=int(os.getenv("CRON_MAX_PER_NODE", "2")),
+    max_queue_size=int(os.getenv("CRON_MAX_QUEUE", "1000")),
+)
@@ -0,0 +1,247 @@
+# app/modules/cron/fanout.py
+"""
+多节点执行（fan-out）
+
+一个任务定义在多个节点上并行执行同一条命令：
+- 目标节点来自任务的 target_node_ids 或 target_tag（匹配节点 tags）
+- 并行宽度由 fanout_width 控制，全部节点复用同一个事件循环与异步 SSH 连接池
+- 每个节点的输出加上 "[节点名] " 前缀，实时推送到 ws_manager 并写入执行日志
+- 执行结束后把汇总（成功/失败数、最慢节点、各节点退出码）写入 job_executions.summary
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Engine, select, update
+
+from app.core.db.write_queue import db_writer
+from app.core.interrupt.execution_manager import ExecutionCancelledError
+from app.core.sh.async_ssh_pool import async_ssh_pool
+from app.core.ws.ws_manager import ws_manager
+from app.modules.node.models import nodes_table
+from app.modules.node.schemas import NodeRead
+from . import models
+from .log_store import ExecutionLogBuffer, ExecutionLogWriter
+from .script_cache import StagedScript, script_cache
+
+logger = logging.getLogger(__name__)
+
+# 汇总中列出的最慢节点数
+SLOWEST_COUNT = 5
+
+
+def parse_target_node_ids(value) -> Optional[List[int]]:
+    """target_node_ids 列存储为 JSON 文本"""
+    if not value:
+        return None
+    if isinstance(value, list):
+        return value
+    try:
+        return [int(i) for i in json.loads(value)]
+    except (ValueError, TypeError):
+        return None
+
+
+def resolve_targets(engine: Engine, node_ids: Optional[List[int]] = None, tag: Optional[str] = None) -> List[dict]:
+    """按节点ID列表或标签解析目标节点（只返回启用的节点）"""
+    stmt = select(nodes_table).where(nodes_table.c.is_active.is_(True)).order_by(nodes_table.c.name)
+    if tag:
+        stmt = stmt.where(nodes_table.c.tags.like(f"%{tag.strip()}%"))
+    elif node_ids:
+        stmt = stmt.where(nodes_table.c.id.in_(node_ids))
+    else:
+        return []
+
+    with engine.connect() as conn:
+        rows = [dict(row) for row in conn.execute(stmt).mappings()]
+    return filter_targets(rows, node_ids, tag)
+
+
+def filter_targets(nodes: List[dict], node_ids: Optional[List[int]] = None, tag: Optional[str] = None) -> List[dict]:
+    """从节点列表中选出目标节点（按标签逗号分隔精确匹配，或按ID列表）"""
+    if tag:
+        tag = tag.strip()
+        return [n for n in nodes if tag in [t.strip() for t in (n.get("tags") or "").split(",")]]
+    if node_ids:
+        wanted = set(node_ids)
+        return [n for n in nodes if n["id"] in wanted]
+    return []
+
+
+def is_fanout(job: dict) -> bool:
+    """是否为多节点任务（目标由 target_node_ids / target_tag 决定，与 node_id 无关）"""
+    return bool(parse_target_node_ids(job.get("target_node_ids")) or job.get("target_tag"))
+
+
+def job_targets(engine: Engine, job: dict) -> Optional[List[dict]]:
+    """多节点任务返回目标节点列表；单节点任务返回 None"""
+    if not is_fanout(job):
+        return None
+    return resolve_targets(engine, parse_target_node_ids(job.get("target_node_ids")), job.get("target_tag"))
+
+
+class _LinePrefixer:
+    """给输出的每一行加上节点前缀（跨分块保持行首状态）"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.at_line_start = True
+
+    def __call__(self, text: str) -> str:
+        lines = text.splitlines(keepends=True)
+        out = []
+        for line in lines:
+            if self.at_line_start:
+                out.append(self.prefix)
+            out.append(line)
+            self.at_line_start = line.endswith("\n")
+        return "".join(out)
+
+
+async def run_fanout(engine: Engine, execution_id: int, command: str, targets: List[dict],
+                     fanout_width: int = 10, script: Optional[StagedScript] = None,
+                     output_limit_kb: Optional[int] = None,
+                     should_stop: Optional[Callable[[], bool]] = None,
+                     out_len: int = 2000, error_len: int = 1000,
+                     log_writer: Optional[ExecutionLogWriter] = None) -> dict:
+    """
+    在目标节点上并行执行命令（暂存脚本的任务先确保各节点上有该脚本）
+
+    log_writer 由调用方传入时，调用方可在异常后继续用它追加日志（序号接着已写入的分块）
+
+    Returns:
+        {"status", "output", "error", "summary"}，output/error 为各节点输出的合并视图
+    """
+    log_writer = log_writer or ExecutionLogWriter(engine, execution_id)
+    # 各节点共用一个执行的输出上限
+    output_buffer = ExecutionLogBuffer(output_limit_kb)
+    error_buffer = ExecutionLogBuffer(output_limit_kb)
+    semaphore = asyncio.Semaphore(max(1, fanout_width))
+    results: List[dict] = []
+    started = time.monotonic()
+
+    # 日志分块按顺序交给线程写入：未启用写队列时 append 是同步提交，不能在事件循环上执行
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    async def write_chunks():
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                return
+            try:
+                await asyncio.to_thread(log_writer.append, *chunk)
+            except Exception as e:
+                logger.error(f"写入执行日志失败: execution_id={execution_id}, error={e}")
+
+    writer = asyncio.get_running_loop().create_task(write_chunks())
+
+    def flush(final: bool = False):
+        """按大小写入日志分块；final=True（全部节点结束）时一并写入超出上限部分的末尾"""
+        if final or output_buffer.size >= out_len or error_buffer.size >= error_len:
+            chunks.put_nowait((output_buffer.take(final), error_buffer.take(final)))
+
+    async def run_one(node: dict):
+        out_prefix = _LinePrefixer(f"[{node['name']}] ")
+        err_prefix = _LinePrefixer(f"[{node['name']}] ")
+
+        def on_stdout(text: str):
+            text = out_prefix(text)
+            live = output_buffer.append(text)
+            if live:
+                ws_manager.send_log_sync(execution_id, {
+                    "status": "running", "output": live, "error": "", "end_time": None,
+                    "node_id": node["id"], "node_name": node["name"],
+                })
+            flush()
+
+        def on_stderr(text: str):
+            text = err_prefix(text)
+            live = error_buffer.append(text)
+            if live:
+                ws_manager.send_log_sync(execution_id, {
+                    "status": "running", "output": "", "error": live, "end_time": None,
+                    "node_id": node["id"], "node_name": node["name"],
+                })
+            flush()
+
+        result = {"node_id": node["id"], "node_name": node["name"], "status": "failed",
+                  "exit_code": None, "duration": 0.0, "error": ""}
+        async with semaphore:
+            begin = time.monotonic()
+            try:
+                if should_stop and should_stop():
+                    raise ExecutionCancelledError("任务已被用户中断")
+                async with async_ssh_pool.session(NodeRead(**node)) as ssh:
+                    if script:
+                        await script_cache.stage_async(ssh, node, script)
+                    exit_code = await ssh.stream_command(command, on_stdout, on_stderr, should_stop=should_stop)
+                if script and exit_code != 0:
+                    script_cache.invalidate(node, script)
+                result["exit_code"] = exit_code
+                result["status"] = "success" if exit_code == 0 else "failed"
+            except ExecutionCancelledError as e:
+                result["status"] = "cancelled"
+                result["error"] = str(e)
+            except Exception as e:
+                result["error"] = str(e)
+                on_stderr(f"{e}\n")
+            result["duration"] = round(time.monotonic() - begin, 3)
+        results.append(result)
+
+    try:
+        await asyncio.gather(*(run_one(node) for node in targets))
+        # 超出输出上限时，补发最后一次推送之后的输出节选
+        rest_output, rest_error = output_buffer.view(force=True), error_buffer.view(force=True)
+        if rest_output or rest_error:
+            ws_manager.send_log_sync(execution_id, {"status": "running", "output": rest_output, "error": rest_error, "end_time": None})
+        flush(final=True)
+    finally:
+        # 等已交出的分块写完，调用方之后用同一个写入器追加时序号不会交错
+        chunks.put_nowait(None)
+        await writer
+
+    summary = build_summary(results, round(time.monotonic() - started, 3))
+    await asyncio.to_thread(
+        db_writer.execute,
+        update(models.job_executions_table)
+        .where(models.job_executions_table.c.id == execution_id)
+        .values(summary=json.dumps(summary, ensure_ascii=False))
+    )
+
+    if summary["cancelled"]:
+        status = "cancelled"
+    elif summary["failed"] == 0 and summary["total"] > 0:
+        status = "success"
+    else:
+        status = "failed"
+    failed_nodes = [r["node_name"] for r in summary["nodes"] if r["status"] == "failed"]
+    error = f"失败节点: {', '.join(failed_nodes)}" if failed_nodes else ""
+    return {"status": status, "output": "", "error": error, "summary": summary}
+
+
+def build_summary(results: List[dict], duration: float) -> dict:
+    """汇总各节点执行结果"""
+    nodes = sorted(results, key=lambda r: r["node_name"])
+    slowest = sorted(results, key=lambda r: r["duration"], reverse=True)[:SLOWEST_COUNT]
+    return {
+        "total": len(results),
+        "success": sum(1 for r in results if r["status"] == "success"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "cancelled": sum(1 for r in results if r["status"] == "cancelled"),
+        "duration": duration,
+        "slowest": [{"node_id": r["node_id"], "node_name": r["node_name"], "duration": r["duration"]}
+                    for r in slowest],
+        "exit_codes": {str(r["node_id"]): r["exit_code"] for r in results},
+        "nodes": nodes,
+    }
+
+
+def parse_summary(value) -> Optional[Dict]:
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (ValueError, TypeError):
+        return None
@@ -3,7 +3,7 @@ from typing import List
 import logging
 from app.core.scheduler.base import JobProvider, JobInfo
 from app.core.db.database import engine
-from . import services, models
+from . import services, models, retention
 
 logger = logging.getLogger(__name__)
 
@@ -63,3 +63,35 @@ class CronJobProvider(JobProvider):
 
 
 cron_job_provider = CronJobProvider()
+
+
+class CronRetentionJobProvider(JobProvider):
+    """定时归档超出保留范围的执行日志"""
+
+    def get_module_name(self) -> str:
+        return "cron_retention"
+
+    def get_enabled_jobs(self) -> List[JobInfo]:
+        return [JobInfo(
+            job_id="compact_executions",
+            name="执行日志归档",
+            schedule=retention.CRON_RETENTION_SCHEDULE,
+            module=self.get_module_name(),
+            params={}
+        )]
+
+    def execute_job(self, job_info: JobInfo) -> any:
+        return retention.compact_executions(engine)
+
+    def on_job_added(self, job_info: JobInfo) -> None:
+        logger.info(f"🆕 任务已添加到调度器: {job_info.name}")
+
+    def on_job_removed(self, job_info: JobInfo) -> None:
+        logger.info(f"🗑️ 任务已从调度器移除: {job_info.name}")
+
+    def on_job_executed(self, job_info: JobInfo, result: any, error: Exception) -> None:
+        if error:
+            logger.error(f"❌ 执行日志归档失败: {error}")
+
+
+cron_retention_job_provider = CronRetentionJobProvider()
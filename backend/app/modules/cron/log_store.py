@@ -0,0 +1,302 @@
+# app/modules/cron/log_store.py
+"""
+任务执行日志存储
+
+执行输出按块追加写入 job_execution_log_chunks（只插入、不改写），
+每块记录执行内序号 seq 与所在流的起始字符偏移 start_offset：
+- 写入总代价 O(n)，不再反复重写 job_executions 中不断增长的 TEXT 字段
+- 读取可整体拼装，也可按流、按字符范围分页读取
+
+job_executions.output/error 仅保留给迁移前的历史记录读取；
+超出保留期的执行日志由 retention.py 压缩归档到 job_executions.archived_log。
+
+输出上限：每个输出流只保留前 CRON_OUTPUT_HEAD_KB 与最后 CRON_OUTPUT_TAIL_KB（按字符计），
+中间部分丢弃，落库时以标记注明丢弃的字符数，单次执行占用的内存与命令输出多少无关。
+超出上限后，实时日志改为每 CRON_OUTPUT_VIEW_INTERVAL 秒推送一次最新的至多 CRON_OUTPUT_VIEW_KB。
+任务可用 output_limit_kb 单独设置上限（前后各一半），为空时使用全局设置；CRON_OUTPUT_HEAD_KB=0 不限制。
+"""
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import Engine, insert, select, func
+
+from app.core.db.write_queue import db_writer
+from . import models
+
+STDOUT = "stdout"
+STDERR = "stderr"
+STREAMS = (STDOUT, STDERR)
+
+CRON_OUTPUT_HEAD_KB = int(os.getenv("CRON_OUTPUT_HEAD_KB", "512"))
+CRON_OUTPUT_TAIL_KB = int(os.getenv("CRON_OUTPUT_TAIL_KB", "512"))
+CRON_OUTPUT_VIEW_INTERVAL = float(os.getenv("CRON_OUTPUT_VIEW_INTERVAL", "1"))
+CRON_OUTPUT_VIEW_KB = int(os.getenv("CRON_OUTPUT_VIEW_KB", "4"))
+
+
+def output_limits(limit_kb: Optional[int] = None) -> tuple:
+    """单个输出流保留的 (前部字符数, 末尾字符数)；limit_kb 为任务的 output_limit_kb"""
+    if limit_kb:
+        return limit_kb * 1024 // 2, limit_kb * 1024 - limit_kb * 1024 // 2
+    return CRON_OUTPUT_HEAD_KB * 1024, CRON_OUTPUT_TAIL_KB * 1024
+
+
+class ExecutionLogBuffer:
+    """
+    单个输出流的内存缓冲，增量维护已缓冲长度
+
+    前 head 个字符照常缓冲（由调用方按大小取出落库）；之后的输出只在环形缓冲中保留最后 tail 个字符，
+    take(final=True) 时连同丢弃标记一起取出。
+    """
+
+    def __init__(self, limit_kb: Optional[int] = None):
+        self._parts: List[str] = []
+        self.size = 0
+        self.head, self.tail = output_limits(limit_kb)
+        self.total = 0  # 收到的字符数
+        self.dropped = 0  # 丢弃的字符数
+        self._ring: Deque[str] = deque()
+        self._ring_size = 0
+        self._view_at = 0.0  # 上一次推送实时视图的时间
+        self._view_pending = 0  # 上一次推送后收到的字符数
+
+    @property
+    def truncated(self) -> bool:
+        return self.head > 0 and self.total > self.head
+
+    def append(self, text: str) -> str:
+        """
+        追加输出
+
+        Returns:
+            应推送给实时日志订阅者的内容：未超出上限时为 text 本身；
+            超出上限后按间隔返回最新输出的节选，其余时候返回空字符串
+        """
+        if self.head <= 0:
+            self._parts.append(text)
+            self.size += len(text)
+            return text
+
+        room = self.head - self.total
+        self.total += len(text)
+        if len(text) <= room:
+            self._parts.append(text)
+            self.size += len(text)
+            return text
+
+        live = ""
+        if room >= 0:
+            # 本次越过上限：前部照常保留，并提示之后改为按间隔显示
+            if room:
+                self._parts.append(text[:room])
+                self.size += room
+            live = text[:room] + f"\n...[输出超过 {self.head} 字符，之后每 {CRON_OUTPUT_VIEW_INTERVAL:g} 秒显示一次最新输出]...\n"
+            text = text[room:]
+            self._view_at = time.monotonic()
+        self._push(text)
+        self._view_pending += len(text)
+        return live or self.view()
+
+    def _push(self, text: str):
+        """放入环形缓冲，超出 tail 的最早内容计入丢弃"""
+        if len(text) >= self.tail:
+            self.dropped += self._ring_size + len(text) - self.tail
+            self._ring.clear()
+            self._ring_size = 0
+            if self.tail <= 0:
+                return
+            text = text[-self.tail:]
+        self._ring.append(text)
+        self._ring_size += len(text)
+        while self._ring_size > self.tail:
+            excess = self._ring_size - self.tail
+            first = self._ring[0]
+            if len(first) <= excess:
+                self._ring.popleft()
+                self._ring_size -= len(first)
+                self.dropped += len(first)
+            else:
+                self._ring[0] = first[excess:]
+                self._ring_size -= excess
+                self.dropped += excess
+
+    def view(self, force: bool = False) -> str:
+        """
+        超出上限后的实时视图：按间隔返回上一次推送后新输出的最后一段
+
+        force=True 时不等间隔（命令结束时补发最后一段）；未超出上限时返回空字符串
+        """
+        now = time.monotonic()
+        if not self._view_pending or (not force and now - self._view_at < CRON_OUTPUT_VIEW_INTERVAL):
+            return ""
+        limit = min(self._view_pending, CRON_OUTPUT_VIEW_KB * 1024, self._ring_size)
+        pieces, size = [], 0
+        for piece in reversed(self._ring):
+            pieces.append(piece[-(limit - size):])
+            size += len(pieces[-1])
+            if size >= limit:
+                break
+        skipped = self._view_pending - size
+        self._view_at = now
+        self._view_pending = 0
+        view = "".join(reversed(pieces))
+        return f"...[跳过 {skipped} 字符]...\n{view}" if skipped > 0 else view
+
+    def _tail_text(self) -> str:
+        if not self.truncated:
+            return ""
+        marker = f"\n...[输出超出上限，已丢弃中间 {self.dropped} 字符]...\n" if self.dropped else ""
+        return marker + "".join(self._ring)
+
+    def getvalue(self) -> str:
+        """当前保留的内容（超出上限时含丢弃标记与末尾）"""
+        return "".join(self._parts) + self._tail_text()
+
+    def take(self, final: bool = False) -> str:
+        """取出已缓冲的内容并清空；final=True（命令已结束）时一并取出丢弃标记与末尾"""
+        text = "".join(self._parts)
+        self._parts.clear()
+        self.size = 0
+        if final:
+            text += self._tail_text()
+            self._ring.clear()
+            self._ring_size = 0
+            self.dropped = 0
+        return text
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __len__(self):
+        return self.size
+
+
+class ExecutionLogWriter:
+    """单次执行的日志追加写入器（每个执行仅由一个线程写入）"""
+
+    def __init__(self, engine: Engine, execution_id: int):
+        self.engine = engine
+        self.execution_id = execution_id
+        self.seq = 0
+        self.offsets: Dict[str, int] = {stream: 0 for stream in STREAMS}
+
+    def append(self, stdout: str = "", stderr: str = ""):
+        """追加输出，同一次调用的 stdout/stderr 在一个事务内写入"""
+        rows = []
+        for stream, content in ((STDOUT, stdout), (STDERR, stderr)):
+            if not content:
+                continue
+            self.seq += 1
+            rows.append({
+                "execution_id": self.execution_id,
+                "seq": self.seq,
+                "stream": stream,
+                "start_offset": self.offsets[stream],
+                "content": content,
+            })
+            self.offsets[stream] += len(content)
+
+        if not rows:
+            return
+        # 启用写队列时只入队不等待；最终状态更新经同一队列提交，保证读到状态时日志已落库
+        db_writer.execute(lambda conn: conn.execute(insert(models.job_execution_log_chunks_table), rows), wait=False)
+
+
+def assemble_execution_log(engine: Engine, execution_id: int) -> Optional[Dict[str, str]]:
+    """
+    拼装执行的完整输出
+
+    Returns:
+        {"output": ..., "error": ...}；没有分块记录（历史数据）时返回 None
+    """
+    table = models.job_execution_log_chunks_table
+    stmt = (
+        select(table.c.stream, table.c.content)
+        .where(table.c.execution_id == execution_id)
+        .order_by(table.c.seq)
+    )
+    parts: Dict[str, List[str]] = {stream: [] for stream in STREAMS}
+    with engine.connect() as conn:
+        for stream, content in conn.execute(stmt):
+            parts[stream].append(content)
+
+    if not parts[STDOUT] and not parts[STDERR]:
+        return None
+    return {"output": "".join(parts[STDOUT]), "error": "".join(parts[STDERR])}
+
+
+def read_execution_log(engine: Engine, execution_id: int, stream: str = STDOUT,
+                       offset: int = 0, limit: int = 64 * 1024) -> Optional[Dict]:
+    """
+    按字符范围读取某个输出流
+
+    Args:
+        execution_id: 执行记录ID
+        stream: stdout/stderr
+        offset: 起始字符偏移
+        limit: 最多返回字符数
+
+    Returns:
+        {"stream", "offset", "next_offset", "total", "content"}；执行记录不存在时返回 None
+    """
+    chunks = models.job_execution_log_chunks_table
+    executions = models.job_executions_table
+    end = offset + limit
+    chunk_end = chunks.c.start_offset + func.length(chunks.c.content)
+
+    with engine.connect() as conn:
+        legacy = conn.execute(
+            select(executions.c.output if stream == STDOUT else executions.c.error, executions.c.archived_log)
+            .where(executions.c.id == execution_id)
+        ).first()
+        if legacy is None:
+            return None
+
+        total = conn.execute(
+            select(func.max(chunk_end))
+            .where(chunks.c.execution_id == execution_id, chunks.c.stream == stream)
+        ).scalar()
+
+        if total is None:
+            # 历史记录：输出仍内联在 job_executions 中，或已压缩归档
+            text = legacy[0] or ""
+            if legacy[1]:
+                from .retention import decompress_log
+                text = decompress_log(legacy[1])["output" if stream == STDOUT else "error"]
+            total = len(text)
+            content = text[offset:end]
+        else:
+            rows = conn.execute(
+                select(chunks.c.start_offset, chunks.c.content)
+                .where(
+                    chunks.c.execution_id == execution_id,
+                    chunks.c.stream == stream,
+                    chunks.c.start_offset < end,
+                    chunk_end > offset,
+                )
+                .order_by(chunks.c.seq)
+            ).all()
+            pieces = []
+            for start_offset, text in rows:
+                lo = max(offset - start_offset, 0)
+                hi = min(end - start_offset, len(text))
+                pieces.append(text[lo:hi])
+            content = "".join(pieces)
+
+    return {
+        "stream": stream,
+        "offset": offset,
+        "next_offset": offset + len(content),
+        "total": total,
+        "content": content,
+    }
+
+
+__all__ = [
+    "ExecutionLogBuffer",
+    "output_limits",
+    "ExecutionLogWriter",
+    "assemble_execution_log",
+    "read_execution_log",
+]
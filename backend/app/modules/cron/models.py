@@ -1,4 +1,6 @@
-from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from datetime import datetime
+
+from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from app.core.db.database import engine,metadata
 
 # 定时任务表
@@ -15,6 +17,17 @@ cron_jobs_table = Table(
     Column("error_times", Integer, default=3),#通知预知
     Column("consecutive_failures", Integer, default=0), # 当前连续失败次数
     Column("is_active", Boolean, default=True),
+    # 多节点执行：目标节点ID列表（JSON）或节点标签，二者都为空时只在 node_id 上执行
+    Column("target_node_ids", Text),
+    Column("target_tag", String(50)),
+    Column("fanout_width", Integer, default=10),  # 多节点执行的并行宽度
+    # 重叠策略：上一次执行未结束时定时触发的处理 allow/forbid/queue/replace（见 overlap.py）
+    Column("overlap_policy", String(20), default="allow"),
+    Column("skipped_runs", Integer, default=0),  # 因重叠被跳过的触发次数
+    Column("last_skipped_at", DateTime),  # 最近一次跳过的时间
+    # 脚本暂存：命令作为脚本上传到节点缓存，按路径执行（见 script_cache.py）
+    Column("stage_script", Boolean, default=False),
+    Column("output_limit_kb", Integer),  # 每个输出流保留的字符上限（KB，前后各一半），为空时使用全局设置
     sqlite_autoincrement=True,
 )
 
@@ -26,11 +39,50 @@ job_executions_table = Table(
     Column("job_id", Integer, ForeignKey("cron_jobs.id"), nullable=False),
     Column("start_time", DateTime, nullable=False),
     Column("end_time", DateTime),
-    Column("status", String(20), default="pending"), # pending/running/success/failed
+    Column("status", String(20), default="pending"), # pending/queued/running/success/failed/cancelled
     Column("output", Text),
     Column("error", Text),
     Column("triggered_by", String(20)), # manual/system
+    Column("owner", String(100)),  # 执行所在的进程标识，启动时据此清理已退出进程遗留的 queued/running 记录
+    Column("summary", Text),  # 多节点执行的汇总结果（JSON）
+    # 保留期外的执行：输出压缩归档，只保留大小等汇总信息（见 retention.py）
+    Column("archived_log", Text),  # zlib 压缩的 {"output","error"} JSON，base64 编码
+    Column("output_size", Integer),  # 归档前的输出字符数
+    Column("error_size", Integer),  # 归档前的错误输出字符数
+    Column("compacted_at", DateTime),  # 归档时间，为空表示保留完整日志
+    Index("ix_job_executions_job_start", "job_id", "start_time"),  # 按任务查执行列表
+    Index("ix_job_executions_job_compacted", "job_id", "compacted_at", "id"),
+    sqlite_autoincrement=True,
+)
+
+# 任务执行输出分块表（只追加）
+job_execution_log_chunks_table = Table(
+    "job_execution_log_chunks",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("execution_id", Integer, ForeignKey("job_executions.id", ondelete="CASCADE"), nullable=False),
+    Column("seq", Integer, nullable=False),  # 执行内写入序号
+    Column("stream", String(10), nullable=False),  # stdout/stderr
+    Column("start_offset", Integer, nullable=False),  # 本块在所属流中的起始字符偏移
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, default=datetime.now),
+    Index("ix_job_execution_log_chunks_execution_seq", "execution_id", "seq", unique=True),
+    sqlite_autoincrement=True,
+)
+
+# 节点上的缓存脚本（脚本暂存模式的上传记录）
+cron_script_cache_table = Table(
+    "cron_script_cache",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("node_id", Integer, nullable=False),
+    Column("digest", String(64), nullable=False),  # 脚本内容 sha256
+    Column("path", String(500), nullable=False),  # 节点上的路径
+    Column("size", Integer),  # 脚本字符数
+    Column("uploaded_at", DateTime),
+    Column("verified_at", DateTime),  # 最近一次校验哈希的时间
+    Index("ix_cron_script_cache_node_digest", "node_id", "digest", unique=True),
     sqlite_autoincrement=True,
 )
 
-__all__ = ["cron_jobs_table","job_executions_table"]
+__all__ = ["cron_jobs_table", "job_executions_table", "job_execution_log_chunks_table", "cron_script_cache_table"]
@@ -0,0 +1,188 @@
+# app/modules/cron/overlap.py
+"""
+任务重叠策略
+
+定时触发时，如果同一任务上一次执行（排队中或运行中）还没结束，按任务的 overlap_policy 处理：
+- allow：照常执行（默认，与原来行为一致）
+- forbid：跳过本次触发
+- queue：保留一次待执行，上一次结束后立即执行；等待期间的其他触发合并为这一次（计为跳过）
+- replace：中断进行中的执行，再执行本次
+
+策略只作用于定时触发；手动执行和工作流调用总是执行，但同样计入“进行中”。
+
+进行中的执行记在内存集合里（本进程提交的执行，开始排队时加入、结束时移除）；
+本进程没有时再查数据库中该任务 queued/running 状态的执行，覆盖其他 worker 进程发起的执行和工作流中的同步执行。
+已退出进程遗留的记录在启动时清理（reconcile_orphaned_executions）；
+运行期间退出的其他进程的遗留记录超过 CRON_OVERLAP_STALE_HOURS 小时后不再计入。
+进行中的执行在其他进程时，queue 策略的待执行等到下一次触发时补上（此时若已结束则直接执行）。
+
+跳过的触发不创建执行记录，只累加 cron_jobs.skipped_runs 并更新 last_skipped_at。
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Set
+
+from sqlalchemy import Engine, func, select, update
+
+from app.core.db.write_queue import db_writer
+from app.core.interrupt.execution_manager import execution_manager
+from . import models
+
+logger = logging.getLogger(__name__)
+
+CRON_OVERLAP_STALE_HOURS = float(os.getenv("CRON_OVERLAP_STALE_HOURS", "6"))
+
+OVERLAP_POLICIES = ("allow", "forbid", "queue", "replace")
+
+# 触发的处理结果
+RUN = "run"  # 执行
+SKIPPED = "skipped"  # 跳过
+DEFERRED = "deferred"  # 等上一次结束后执行
+
+
+class OverlapGuard:
+    """按任务记录进行中的执行，并按重叠策略决定新的触发"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[int, Set[int]] = {}  # job_id -> 进行中的 execution_id
+        self._pending: Dict[int, Callable[[], None]] = {}  # job_id -> 上一次结束后执行
+        self._skipped = 0
+        self._deferred = 0
+        self._replaced = 0
+
+    # ========== 进行中的执行 ==========
+
+    def started(self, job_id: int, execution_id: int) -> None:
+        with self._lock:
+            self._active.setdefault(job_id, set()).add(execution_id)
+
+    def finished(self, job_id: int, execution_id: int) -> None:
+        """执行结束（完成、取消或被拒绝）；该任务已没有进行中的执行时，运行待执行的触发"""
+        with self._lock:
+            executions = self._active.get(job_id)
+            if executions is None:
+                return
+            executions.discard(execution_id)
+            if executions:
+                return
+            del self._active[job_id]
+            rerun = self._pending.pop(job_id, None)
+        if rerun is not None:
+            try:
+                rerun()
+            except Exception as e:
+                logger.error(f"任务 {job_id} 的待执行触发失败: {e}")
+
+    def running(self, engine: Engine, job_id: int) -> List[int]:
+        """任务进行中的执行：本进程的内存集合，没有时查数据库"""
+        with self._lock:
+            local = self._active.get(job_id)
+            if local:
+                return sorted(local)
+        table = models.job_executions_table
+        since = datetime.now() - timedelta(hours=CRON_OVERLAP_STALE_HOURS)
+        with engine.connect() as conn:
+            return list(conn.execute(
+                select(table.c.id)
+                .where(
+                    table.c.job_id == job_id,
+                    table.c.start_time >= since,
+                    table.c.status.in_(("queued", "running")),
+                )
+            ).scalars())
+
+    # ========== 策略 ==========
+
+    def admit(self, engine: Engine, job: dict, rerun: Callable[[], None]) -> str:
+        """
+        按任务的重叠策略处理一次定时触发
+
+        Args:
+            job: 任务记录（含 id、name、overlap_policy）
+            rerun: queue 策略下，上一次结束后执行本次触发
+
+        Returns:
+            RUN 执行 / SKIPPED 跳过 / DEFERRED 上一次结束后执行
+        """
+        policy = job.get("overlap_policy") or "allow"
+        if policy not in OVERLAP_POLICIES or policy == "allow":
+            return RUN
+
+        job_id = job["id"]
+        if policy == "queue":
+            # 与 finished 在同一把锁内判断，避免待执行在上一次刚结束时落空
+            with self._lock:
+                local = bool(self._active.get(job_id))
+                if local:
+                    decision = self._defer(job_id, rerun)
+            if not local:
+                if not self.running(engine, job_id):
+                    # 进行中的执行在其他进程且已结束：本次触发即补上之前的待执行
+                    with self._lock:
+                        self._pending.pop(job_id, None)
+                    return RUN
+                with self._lock:
+                    decision = self._defer(job_id, rerun)
+            if decision == SKIPPED:
+                self._record_skip(job, "已有待执行的触发，本次合并")
+            else:
+                logger.info(f"⏳ 任务（{job['name']}）上一次执行尚未结束，本次触发在其结束后执行")
+            return decision
+
+        active = self.running(engine, job_id)
+        if not active:
+            return RUN
+
+        if policy == "forbid":
+            self._record_skip(job, f"上一次执行（{active[-1]}）尚未结束")
+            return SKIPPED
+
+        # replace：中断进行中的执行（不在本进程时转发），然后执行本次
+        for execution_id in active:
+            execution_manager.stop_execution(execution_id)
+        with self._lock:
+            self._replaced += 1
+        logger.info(f"🔁 任务（{job['name']}）重叠，中断进行中的执行 {active} 后执行本次触发")
+        return RUN
+
+    def _defer(self, job_id: int, rerun: Callable[[], None]) -> str:
+        """登记待执行（调用方持有锁），已有待执行时本次合并"""
+        if job_id in self._pending:
+            return SKIPPED
+        self._pending[job_id] = rerun
+        self._deferred += 1
+        return DEFERRED
+
+    def _record_skip(self, job: dict, reason: str) -> None:
+        with self._lock:
+            self._skipped += 1
+        self._write_skip(job["id"])
+        logger.info(f"⏭️ 任务（{job['name']}）跳过本次触发: {reason}")
+
+    @staticmethod
+    def _write_skip(job_id: int) -> None:
+        """跳过的触发只计数，不创建执行记录"""
+        table = models.cron_jobs_table
+        db_writer.execute(
+            update(table)
+            .where(table.c.id == job_id)
+            .values(skipped_runs=func.coalesce(table.c.skipped_runs, 0) + 1, last_skipped_at=datetime.now())
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active_jobs": len(self._active),
+                "active_executions": sum(len(ids) for ids in self._active.values()),
+                "pending": len(self._pending),
+                "skipped": self._skipped,
+                "deferred": self._deferred,
+                "replaced": self._replaced,
+            }
+
+
+# 全局实例
+overlap_guard = OverlapGuard()
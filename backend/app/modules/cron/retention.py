@@ -0,0 +1,219 @@
+# app/modules/cron/retention.py
+"""
+执行记录保留与归档
+
+每个任务最近 CRON_RETENTION_KEEP_RUNS 次执行，以及 CRON_RETENTION_KEEP_DAYS 天内的执行保留完整日志；
+其余已结束的执行把输出（分块表中的日志或历史内联的 output/error）压缩归档到
+job_executions.archived_log，删除分块、清空内联输出，执行记录本身（状态、时间、汇总、
+输出大小）保留，列表和统计不受影响，查看日志时透明解压。
+
+归档由调度器定时执行（CronRetentionJobProvider），分批处理：
+读取与压缩在写事务之外完成，每批只用一个短事务写回，批与批之间让出写锁，
+单次运行最多处理 CRON_RETENTION_MAX_BATCHES 批，剩余的留给下一次。
+
+配置（环境变量）：
+- CRON_RETENTION_KEEP_RUNS：每个任务保留完整日志的最近执行次数，默认 100
+- CRON_RETENTION_KEEP_DAYS：保留完整日志的天数，默认 7
+- CRON_RETENTION_BATCH：每批归档的执行数，默认 200
+- CRON_RETENTION_MAX_BATCHES：单次运行最多处理的批数，默认 50
+- CRON_RETENTION_SCHEDULE：归档任务的 cron 表达式，默认每 10 分钟
+"""
+import base64
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Engine, delete, func, select, update
+
+from app.core.db.write_queue import db_writer
+from . import models
+from .log_store import STDERR, STDOUT
+
+logger = logging.getLogger(__name__)
+
+CRON_RETENTION_KEEP_RUNS = int(os.getenv("CRON_RETENTION_KEEP_RUNS", "100"))
+CRON_RETENTION_KEEP_DAYS = int(os.getenv("CRON_RETENTION_KEEP_DAYS", "7"))
+CRON_RETENTION_BATCH = int(os.getenv("CRON_RETENTION_BATCH", "200"))
+CRON_RETENTION_MAX_BATCHES = int(os.getenv("CRON_RETENTION_MAX_BATCHES", "50"))
+CRON_RETENTION_SCHEDULE = os.getenv("CRON_RETENTION_SCHEDULE", "*/10 * * * *")
+
+# 批与批之间让出写锁的时间（秒）
+_BATCH_PAUSE = 0.05
+
+FINISHED_STATUSES = ("success", "failed", "cancelled")
+
+
+def compress_log(output: str, error: str) -> str:
+    payload = json.dumps({"output": output, "error": error}, ensure_ascii=False).encode("utf-8")
+    return base64.b64encode(zlib.compress(payload, 6)).decode("ascii")
+
+
+def decompress_log(archived: str) -> Dict[str, str]:
+    """解压归档的输出，返回 {"output": ..., "error": ...}"""
+    return json.loads(zlib.decompress(base64.b64decode(archived)).decode("utf-8"))
+
+
+def load_archived_log(engine: Engine, execution_id: int) -> Optional[Dict[str, str]]:
+    """读取已归档执行的输出；未归档时返回 None"""
+    table = models.job_executions_table
+    with engine.connect() as conn:
+        archived = conn.execute(select(table.c.archived_log).where(table.c.id == execution_id)).scalar()
+    return decompress_log(archived) if archived else None
+
+
+def _candidate_ids(engine: Engine, job_id: int, cutoff: datetime, limit: int) -> List[int]:
+    """某个任务中超出保留范围、尚未归档的已结束执行（从旧到新）"""
+    table = models.job_executions_table
+    with engine.connect() as conn:
+        if CRON_RETENTION_KEEP_RUNS > 0:
+            # 最近 N 次（与执行列表同样按开始时间）中最旧的一次，比它更早的才可能归档
+            boundary = conn.execute(
+                select(table.c.start_time)
+                .where(table.c.job_id == job_id)
+                .order_by(table.c.start_time.desc())
+                .offset(CRON_RETENTION_KEEP_RUNS - 1)
+                .limit(1)
+            ).scalar()
+            if boundary is None:
+                return []
+            cutoff = min(cutoff, boundary)
+        return list(conn.execute(
+            select(table.c.id)
+            .where(
+                table.c.job_id == job_id,
+                table.c.compacted_at.is_(None),
+                table.c.start_time < cutoff,
+                table.c.status.in_(FINISHED_STATUSES),
+            )
+            .order_by(table.c.id)
+            .limit(limit)
+        ).scalars())
+
+
+def _compact_batch(engine: Engine, execution_ids: List[int]) -> Dict[str, int]:
+    """归档一批执行：在事务外读取并压缩，再用一个短事务写回"""
+    executions = models.job_executions_table
+    chunks = models.job_execution_log_chunks_table
+
+    logs = {execution_id: {STDOUT: [], STDERR: []} for execution_id in execution_ids}
+    with engine.connect() as conn:
+        inline = {
+            row.id: row for row in conn.execute(
+                select(executions.c.id, executions.c.output, executions.c.error)
+                .where(executions.c.id.in_(execution_ids))
+            )
+        }
+        for execution_id, stream, content in conn.execute(
+            select(chunks.c.execution_id, chunks.c.stream, chunks.c.content)
+            .where(chunks.c.execution_id.in_(execution_ids))
+            .order_by(chunks.c.execution_id, chunks.c.seq)
+        ):
+            logs[execution_id][stream].append(content)
+
+    now = datetime.now()
+    rows, before, after = [], 0, 0
+    for execution_id in execution_ids:
+        parts = logs[execution_id]
+        if parts[STDOUT] or parts[STDERR]:
+            output, error = "".join(parts[STDOUT]), "".join(parts[STDERR])
+        else:
+            row = inline.get(execution_id)
+            output, error = (row.output or "", row.error or "") if row else ("", "")
+        archived = compress_log(output, error) if output or error else None
+        before += len(output) + len(error)
+        after += len(archived or "")
+        rows.append({
+            "id": execution_id,
+            "archived_log": archived,
+            "output_size": len(output),
+            "error_size": len(error),
+        })
+
+    def write(conn):
+        for row in rows:
+            conn.execute(
+                update(executions)
+                .where(executions.c.id == row["id"], executions.c.compacted_at.is_(None))
+                .values(archived_log=row["archived_log"], output_size=row["output_size"],
+                        error_size=row["error_size"], output=None, error=None, compacted_at=now)
+            )
+        conn.execute(delete(chunks).where(chunks.c.execution_id.in_(execution_ids)))
+
+    db_writer.execute(write)
+    return {"executions": len(rows), "bytes_before": before, "bytes_after": after}
+
+
+def compact_executions(engine: Engine, max_batches: int = CRON_RETENTION_MAX_BATCHES) -> Dict[str, int]:
+    """
+    归档超出保留范围的执行日志
+
+    Returns:
+        {"executions", "batches", "bytes_before", "bytes_after", "pending"}，
+        pending 为 True 表示达到批数上限，还有待归档的执行
+    """
+    table = models.job_executions_table
+    cutoff = datetime.now() - timedelta(days=CRON_RETENTION_KEEP_DAYS)
+    result = {"executions": 0, "batches": 0, "bytes_before": 0, "bytes_after": 0, "pending": False}
+
+    with engine.connect() as conn:
+        job_ids = list(conn.execute(select(table.c.job_id).distinct()).scalars())
+
+    for job_id in job_ids:
+        while True:
+            if result["batches"] >= max_batches:
+                result["pending"] = True
+                break
+            execution_ids = _candidate_ids(engine, job_id, cutoff, CRON_RETENTION_BATCH)
+            if not execution_ids:
+                break
+            stats = _compact_batch(engine, execution_ids)
+            result["batches"] += 1
+            for key in ("executions", "bytes_before", "bytes_after"):
+                result[key] += stats[key]
+            time.sleep(_BATCH_PAUSE)
+        if result["pending"]:
+            break
+
+    if result["executions"]:
+        logger.info(f"🗜️ 执行日志归档: {result['executions']} 条, "
+                    f"{result['bytes_before']} -> {result['bytes_after']} 字符, 批数 {result['batches']}")
+    return result
+
+
+def retention_stats(engine: Engine) -> Dict:
+    """执行记录与日志占用概况"""
+    executions = models.job_executions_table
+    chunks = models.job_execution_log_chunks_table
+    with engine.connect() as conn:
+        total, compacted, archived_bytes = conn.execute(
+            select(
+                func.count(),
+                func.count(executions.c.compacted_at),
+                func.coalesce(func.sum(func.length(executions.c.archived_log)), 0),
+            )
+        ).one()
+        chunk_count, chunk_bytes = conn.execute(
+            select(func.count(), func.coalesce(func.sum(func.length(chunks.c.content)), 0))
+        ).one()
+    return {
+        "executions": total,
+        "compacted": compacted,
+        "archived_bytes": archived_bytes,
+        "log_chunks": chunk_count,
+        "log_chunk_bytes": chunk_bytes,
+        "keep_runs": CRON_RETENTION_KEEP_RUNS,
+        "keep_days": CRON_RETENTION_KEEP_DAYS,
+    }
+
+
+__all__ = [
+    "compact_executions",
+    "compress_log",
+    "decompress_log",
+    "load_archived_log",
+    "retention_stats",
+]
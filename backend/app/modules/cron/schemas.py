@@ -3,6 +3,8 @@ from datetime import datetime
 from typing import Optional, List, Literal
 from croniter import croniter
 
+OverlapPolicy = Literal["allow", "forbid", "queue", "replace"]
+
 # 任务相关
 class CronJobBase(BaseModel):
     node_id: int
@@ -19,7 +21,7 @@ class CronJobUpdateNotice(CronJobBase):
     id: int
 
 class CronJobCreate(BaseModel):
-    node_ids: list[int]  # 👈 改为列表
+    node_ids: list[int] = Field(default_factory=list)  # 👈 改为列表
     name: str
     schedule: str
     command: str
@@ -27,6 +29,16 @@ class CronJobCreate(BaseModel):
     is_active: bool = False
     is_notice: bool = False
     error_times: int = 3
+    # 多节点执行：fanout=True 时只创建一个任务，在 node_ids（或 target_tag 匹配的节点）上并行执行
+    fanout: bool = False
+    target_tag: Optional[str] = None
+    fanout_width: int = Field(default=10, ge=1, le=200)
+    # 上一次执行未结束时定时触发的处理：allow 照常执行 / forbid 跳过 / queue 结束后执行一次 / replace 中断后执行
+    overlap_policy: OverlapPolicy = "allow"
+    # 脚本暂存：命令作为脚本上传到节点缓存，参数以环境变量传入（适合较长的命令）
+    stage_script: bool = False
+    # 每个输出流保留的上限（KB）：超出后只保留前后各一半，中间丢弃；为空时使用全局设置
+    output_limit_kb: Optional[int] = Field(default=None, ge=1, le=1024 * 1024)
     @field_validator('schedule')
     def validate_cron(cls, v):
         try:
@@ -42,9 +54,15 @@ class CronJobUpdate(BaseModel):
     is_active: Optional[bool] = None
     is_notice: Optional[bool] = None
     error_times: Optional[int] = None
+    target_node_ids: Optional[List[int]] = None
+    target_tag: Optional[str] = None
+    fanout_width: Optional[int] = Field(default=None, ge=1, le=200)
+    overlap_policy: Optional[OverlapPolicy] = None
+    stage_script: Optional[bool] = None
+    output_limit_kb: Optional[int] = Field(default=None, ge=1, le=1024 * 1024)
 
 class CronJobCreateSingle(BaseModel):
-    node_id: int  # 单个节点
+    node_id: int  # 单个节点（多节点任务为首个目标节点）
     name: str
     schedule: str
     command: str
@@ -52,9 +70,23 @@ class CronJobCreateSingle(BaseModel):
     is_active: bool = False
     is_notice: bool = False
     error_times: int
+    target_node_ids: Optional[List[int]] = None
+    target_tag: Optional[str] = None
+    fanout_width: int = 10
+    overlap_policy: OverlapPolicy = "allow"
+    stage_script: bool = False
+    output_limit_kb: Optional[int] = None
 class CronJobRead(CronJobBase):
     id: int
     next_run: Optional[datetime] = None
+    target_node_ids: Optional[List[int]] = None
+    target_tag: Optional[str] = None
+    fanout_width: Optional[int] = None
+    overlap_policy: Optional[str] = None
+    skipped_runs: Optional[int] = None
+    last_skipped_at: Optional[datetime] = None
+    stage_script: Optional[bool] = None
+    output_limit_kb: Optional[int] = None
     model_config = {"from_attributes": True}
 
 # 执行日志
@@ -66,6 +98,7 @@ class JobExecutionBase(BaseModel):
     output: Optional[str] = None
     error: Optional[str] = None
     triggered_by: str
+    summary: Optional[dict] = None
 
 class JobExecutionRead(JobExecutionBase):
     id: int
@@ -0,0 +1,341 @@
+# app/modules/cron/script_cache.py
+"""
+远程脚本缓存（脚本暂存模式）
+
+开启 stage_script 的任务不再每次把整段命令通过 exec_command 发送：
+- 命令中的参数占位符改写为环境变量引用：{inputs.key} -> ${CRON_INPUT_key}，
+  {{outputs.node}} / {{outputs.node.field}} -> ${CRON_OUTPUT_node} / ${CRON_OUTPUT_node_field}；
+  改写后的脚本与运行参数无关，按内容 sha256 寻址，也不再每次做模板替换；
+  参数按 shell 变量展开，占位符不能写在单引号内（可写在双引号内），未传入的参数展开为空
+- 脚本经 SFTP 上传到节点的 CRON_SCRIPT_CACHE_DIR/<sha256>.sh（先写临时文件再改名），每个节点只上传一次
+- 执行时只发送一行调用命令：解析后的参数经 env 作为环境变量传入，用 /bin/sh 执行脚本路径，
+  脚本按 POSIX sh 语法执行，与登录 shell 无关
+- 占位符名称中的非字母数字字符改写为下划线，改写后同名的两个占位符（如 {inputs.a-b} 与 {inputs.a_b}）不能同时使用
+- 本进程第一次在某节点使用某脚本时读取远端文件校验哈希，不一致或不存在则重新上传；
+  之后直接执行，执行失败时清除校验标记，下一次重新校验
+- 上传记录在 cron_script_cache 表；任务命令变化、关闭暂存或删除任务后，后台删除不再被引用的远端脚本
+
+配置（环境变量）：
+- CRON_SCRIPT_CACHE_DIR：节点上的缓存目录，相对路径相对于登录用户的主目录，默认 .cache/mytool/scripts
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shlex
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import asyncssh
+from sqlalchemy import Engine, delete, insert, select, update
+
+from app.core.db.write_queue import db_writer
+from app.core.sh.ssh_pool import ssh_pool
+from app.modules.node.models import nodes_table
+from app.modules.node.schemas import NodeRead
+from . import models
+
+logger = logging.getLogger(__name__)
+
+CRON_SCRIPT_CACHE_DIR = os.getenv("CRON_SCRIPT_CACHE_DIR", ".cache/mytool/scripts").rstrip("/")
+
+# 与 _prepare_job 中的占位符一致
+_INPUT_PATTERN = re.compile(r"\{inputs\.([^{}\s]+)\}")
+_OUTPUT_PATTERN = re.compile(r"\{\{outputs\.(\w+)(?:\.(\w+))?\}\}")
+
+
+def _env_name(prefix: str, *parts: Optional[str]) -> str:
+    # shell 变量名只能是 ASCII 字母、数字和下划线
+    return prefix + "_".join(re.sub(r"\W", "_", part, flags=re.ASCII) for part in parts if part)
+
+
+def check_placeholders(command: str) -> None:
+    """
+    检查命令中的参数占位符能否一一对应到环境变量
+
+    变量名中非字母数字的字符都改写为下划线，{inputs.a-b} 与 {inputs.a_b}、
+    {{outputs.a.b}} 与 {{outputs.a_b}} 会对应同一个变量，暂存后无法区分取值。
+
+    Raises:
+        ValueError: 两个不同的占位符对应同一个环境变量
+    """
+    seen = {}
+    placeholders = [
+        (m.group(0), _env_name("CRON_OUTPUT_", m.group(1), m.group(2))) for m in _OUTPUT_PATTERN.finditer(command)
+    ] + [
+        (m.group(0), _env_name("CRON_INPUT_", m.group(1))) for m in _INPUT_PATTERN.finditer(command)
+    ]
+    for placeholder, name in placeholders:
+        other = seen.setdefault(name, placeholder)
+        if other != placeholder:
+            raise ValueError(f"参数占位符 {other} 与 {placeholder} 对应同一个环境变量 {name}，脚本暂存模式下请改用不冲突的名称")
+
+
+def render_body(command: str) -> str:
+    """把命令中的参数占位符改写为环境变量引用"""
+    body = _OUTPUT_PATTERN.sub(
+        lambda m: "${%s}" % _env_name("CRON_OUTPUT_", m.group(1), m.group(2)), command
+    )
+    return _INPUT_PATTERN.sub(lambda m: "${%s}" % _env_name("CRON_INPUT_", m.group(1)), body)
+
+
+def script_digest(command: str) -> str:
+    """任务命令对应的缓存脚本哈希"""
+    return hashlib.sha256(render_body(command).encode("utf-8")).hexdigest()
+
+
+class StagedScript:
+    """一次执行使用的缓存脚本：内容、哈希、远端路径和参数环境变量"""
+
+    __slots__ = ("body", "digest", "path", "env")
+
+    def __init__(self, command: str, inputs: dict = None, outputs: dict = None):
+        check_placeholders(command)
+        self.body = render_body(command)
+        self.digest = hashlib.sha256(self.body.encode("utf-8")).hexdigest()
+        self.path = f"{CRON_SCRIPT_CACHE_DIR}/{self.digest}.sh"
+        self.env = self._resolve_env(command, inputs, outputs)
+
+    @staticmethod
+    def _resolve_env(command: str, inputs: dict = None, outputs: dict = None) -> Dict[str, str]:
+        """解析本次运行的参数（取值规则与 _prepare_job 的模板替换一致）"""
+        env = {}
+        for key, value in (inputs or {}).items():
+            if f"{{inputs.{key}}}" in command:
+                env[_env_name("CRON_INPUT_", key)] = str(value)
+        for node_id, field in _OUTPUT_PATTERN.findall(command):
+            if outputs and node_id in outputs:
+                node_output = outputs[node_id]
+                value = node_output.get(field, "") if field else node_output
+                env[_env_name("CRON_OUTPUT_", node_id, field)] = str(value)
+        return env
+
+    def invocation(self) -> str:
+        """
+        在节点上执行的调用命令
+
+        exec_command 由登录 shell 解析这一行，登录 shell 可能是 fish/csh 等非 POSIX shell，
+        因此不用 VAR=value 前缀语法，而是通过 env 传入参数，并固定用 /bin/sh 执行脚本。
+        """
+        assigns = [shlex.quote(f"{name}={value}") for name, value in sorted(self.env.items())]
+        return " ".join(["env", *assigns, "/bin/sh", shlex.quote(self.path)])
+
+
+class ScriptCache:
+    """记录各节点上已校验的脚本，负责上传、校验和清理"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._verified = set()  # (节点标识, 哈希)
+        self._gc_lock = threading.Lock()
+        self._hits = 0
+        self._verifications = 0
+        self._uploads = 0
+
+    @staticmethod
+    def _node_key(node) -> str:
+        return f"{node['id']}:{node['host']}:{node['port']}"
+
+    def _is_verified(self, node, script: StagedScript) -> bool:
+        with self._lock:
+            if (self._node_key(node), script.digest) in self._verified:
+                self._hits += 1
+                return True
+            return False
+
+    def invalidate(self, node, script: StagedScript) -> None:
+        """执行失败时清除校验标记，下一次执行前重新校验"""
+        with self._lock:
+            self._verified.discard((self._node_key(node), script.digest))
+
+    # ========== 上传 / 校验 ==========
+
+    def stage(self, ssh, node, script: StagedScript) -> None:
+        """确保节点上有该脚本（paramiko 连接，用于线程中的执行）"""
+        if self._is_verified(node, script):
+            return
+        sftp = ssh.get_sftp()
+        try:
+            with sftp.open(script.path, "rb") as f:
+                current = f.read()
+        except IOError:
+            current = None
+
+        uploaded = current is None or hashlib.sha256(current).hexdigest() != script.digest
+        if uploaded:
+            path = ""
+            for part in CRON_SCRIPT_CACHE_DIR.split("/"):
+                path = f"{path}/{part}" if path or CRON_SCRIPT_CACHE_DIR.startswith("/") else part
+                if not part:
+                    continue
+                try:
+                    sftp.stat(path)
+                except IOError:
+                    sftp.mkdir(path, 0o700)
+            tmp = f"{script.path}.{uuid.uuid4().hex[:8]}.tmp"
+            with sftp.open(tmp, "wb") as f:
+                f.write(script.body.encode("utf-8"))
+            sftp.chmod(tmp, 0o700)
+            try:
+                sftp.posix_rename(tmp, script.path)
+            except IOError:
+                # 服务端不支持 posix-rename：普通 rename 不覆盖已有文件
+                try:
+                    sftp.remove(script.path)
+                except IOError:
+                    pass
+                sftp.rename(tmp, script.path)
+        self._mark(node, script, uploaded)
+
+    async def stage_async(self, ssh, node, script: StagedScript) -> None:
+        """确保节点上有该脚本（asyncssh 连接，用于事件循环中的执行）"""
+        if self._is_verified(node, script):
+            return
+        sftp = await ssh.get_sftp()
+        try:
+            async with sftp.open(script.path, "rb") as f:
+                current = await f.read()
+        except asyncssh.SFTPError:
+            current = None
+
+        uploaded = current is None or hashlib.sha256(current).hexdigest() != script.digest
+        if uploaded:
+            await sftp.makedirs(CRON_SCRIPT_CACHE_DIR, exist_ok=True)
+            tmp = f"{script.path}.{uuid.uuid4().hex[:8]}.tmp"
+            async with sftp.open(tmp, "wb") as f:
+                await f.write(script.body.encode("utf-8"))
+            await sftp.chmod(tmp, 0o700)
+            try:
+                await sftp.posix_rename(tmp, script.path)
+            except asyncssh.SFTPError:
+                try:
+                    await sftp.remove(script.path)
+                except asyncssh.SFTPError:
+                    pass
+                await sftp.rename(tmp, script.path)
+        # 上传记录是同步的数据库写入，放到线程中执行，不阻塞事件循环
+        await asyncio.to_thread(self._mark, node, script, uploaded)
+
+    def _mark(self, node, script: StagedScript, uploaded: bool) -> None:
+        """记为已校验，并更新上传记录（每个进程每个节点每个脚本一次）"""
+        with self._lock:
+            self._verified.add((self._node_key(node), script.digest))
+            self._verifications += 1
+            if uploaded:
+                self._uploads += 1
+        if uploaded:
+            logger.info(f"📤 脚本已上传到节点 {node['name']}: {script.path}（{len(script.body)} 字符）")
+
+        table = models.cron_script_cache_table
+        now = datetime.now()
+
+        def write(conn):
+            values = {"path": script.path, "size": len(script.body), "verified_at": now}
+            if uploaded:
+                values["uploaded_at"] = now
+            updated = conn.execute(
+                update(table)
+                .where(table.c.node_id == node["id"], table.c.digest == script.digest)
+                .values(**values)
+            ).rowcount
+            if not updated:
+                conn.execute(insert(table).values(node_id=node["id"], digest=script.digest, **values))
+
+        # 上传记录只用于清理：写入失败不影响已完成的暂存
+        try:
+            db_writer.execute(write)
+        except Exception as e:
+            logger.warning(f"记录缓存脚本失败: 节点 {node['name']}, {script.digest[:12]}: {e}")
+
+    # ========== 清理 ==========
+
+    def schedule_gc(self, engine: Engine) -> None:
+        """在后台线程中清理（任务变化后调用，不阻塞请求）"""
+        threading.Thread(target=self.gc, args=(engine,), name="script-cache-gc", daemon=True).start()
+
+    def gc(self, engine: Engine) -> Dict[str, int]:
+        """
+        删除不再被任何暂存任务引用的远端脚本
+
+        节点连接失败时保留记录，下一次清理再试；节点已删除时只删除记录。
+
+        Returns:
+            {"referenced", "removed", "failed"}
+        """
+        if not self._gc_lock.acquire(blocking=False):
+            return {"referenced": 0, "removed": 0, "failed": 0, "running": True}
+        try:
+            return self._gc(engine)
+        finally:
+            self._gc_lock.release()
+
+    def _gc(self, engine: Engine) -> Dict[str, int]:
+        jobs = models.cron_jobs_table
+        cache = models.cron_script_cache_table
+        with engine.connect() as conn:
+            referenced = {
+                script_digest(command) for command in conn.execute(
+                    select(jobs.c.command).where(jobs.c.stage_script.is_(True))
+                ).scalars()
+            }
+            stale: Dict[int, List[dict]] = {}
+            for row in conn.execute(select(cache)).mappings():
+                if row["digest"] not in referenced:
+                    stale.setdefault(row["node_id"], []).append(dict(row))
+            nodes = {
+                row["id"]: dict(row) for row in conn.execute(
+                    select(nodes_table).where(nodes_table.c.id.in_(list(stale)))
+                ).mappings()
+            } if stale else {}
+
+        removed_ids, failed = [], 0
+        for node_id, rows in stale.items():
+            node = nodes.get(node_id)
+            if node is not None:
+                try:
+                    with ssh_pool.session(NodeRead(**node)) as ssh:
+                        sftp = ssh.get_sftp()
+                        for row in rows:
+                            try:
+                                sftp.remove(row["path"])
+                            except IOError:
+                                pass  # 已不存在
+                except Exception as e:
+                    logger.warning(f"清理节点 {node['name']} 的缓存脚本失败: {e}")
+                    failed += len(rows)
+                    continue
+            removed_ids.extend(row["id"] for row in rows)
+            with self._lock:
+                digests = {row["digest"] for row in rows}
+                self._verified = {
+                    (key, digest) for key, digest in self._verified
+                    if not (digest in digests and key.split(":", 1)[0] == str(node_id))
+                }
+
+        if removed_ids:
+            db_writer.execute(delete(cache).where(cache.c.id.in_(removed_ids)))
+            logger.info(f"🧹 已清理不再引用的缓存脚本 {len(removed_ids)} 个")
+        return {"referenced": len(referenced), "removed": len(removed_ids), "failed": failed}
+
+    def stats(self, engine: Engine) -> dict:
+        cache = models.cron_script_cache_table
+        with engine.connect() as conn:
+            rows = conn.execute(select(cache.c.node_id, cache.c.size)).all()
+        with self._lock:
+            return {
+                "cache_dir": CRON_SCRIPT_CACHE_DIR,
+                "scripts": len(rows),
+                "nodes": len({row.node_id for row in rows}),
+                "bytes": sum(row.size or 0 for row in rows),
+                "verified": len(self._verified),
+                "hits": self._hits,
+                "verifications": self._verifications,
+                "uploads": self._uploads,
+            }
+
+
+# 全局实例
+script_cache = ScriptCache()
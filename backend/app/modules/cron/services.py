@@ -1,17 +1,28 @@
 from croniter import croniter
-from sqlalchemy import select, insert, update, delete, desc, Engine
+from sqlalchemy import select, insert, update, delete, desc, or_, Engine
 from datetime import datetime
-import threading
+import asyncio
+import json
 import logging
 from typing import List, Optional
 
-from app.core.sh.ssh_client import SSHClient
+from app.core.sh.ssh_client import ChannelReader, read_channel
+from app.core.sh.ssh_pool import ssh_pool
+from app.core.sh.async_ssh_pool import async_ssh_pool
 from app.core.ws.ws_manager import ws_manager
 from app.core.interrupt.execution_manager import execution_manager, ExecutionCancelledError
+from app.core.cluster import PROCESS_ID
 from app.core.scheduler import scheduler_service  # 导入新的调度器服务
+from app.core.db.write_queue import db_writer
 
 from app.modules.node.models import nodes_table
 from . import models, schemas
+from .executor import cron_executor, fanout_slot, PRIORITY_HIGH, PRIORITY_NORMAL, Slots
+from .fanout import filter_targets, is_fanout, job_targets, parse_summary, parse_target_node_ids, run_fanout
+from .log_store import ExecutionLogBuffer, ExecutionLogWriter, assemble_execution_log
+from .overlap import RUN, overlap_guard
+from .retention import load_archived_log
+from .script_cache import StagedScript, script_cache
 
 logger = logging.getLogger(__name__)
 
@@ -21,38 +32,53 @@ logger = logging.getLogger(__name__)
 def create_cron_job(engine: Engine, job: schemas.CronJobCreate) -> dict:
     """创建定时任务"""
     data = job.model_dump()
-    stmt = insert(models.cron_jobs_table).values(**data)
+    stmt = insert(models.cron_jobs_table).values(**_encode_job_values(data))
     with engine.begin() as conn:
         result = conn.execute(stmt)
         job_id = result.inserted_primary_key[0]
 
-        # 创建成功后，如果是启用状态，添加到调度器
-        if job.is_active:
-            _add_job_to_scheduler(engine, job_id)
+    # 提交后再添加到调度器（调度前要按新任务的目标节点检查）
+    if job.is_active:
+        _add_job_to_scheduler(engine, job_id)
 
-        return {"id": job_id, **data}
+    return {"id": job_id, **data}
 
 
 def get_cron_jobs(engine: Engine, node_ids: list[int] = None) -> list[dict]:
-    """获取所有定时任务"""
+    """
+    获取所有定时任务
+
+    单节点任务按 node_id 所在节点过滤（节点需启用）；多节点任务按解析出的目标节点过滤：
+    至少有一个启用的目标节点，指定 node_ids 时目标节点与之有交集。
+    """
     stmt = (
         select(models.cron_jobs_table)
-        .join(
+        .outerjoin(
             nodes_table,
             models.cron_jobs_table.c.node_id == nodes_table.c.id
         )
-        .where(nodes_table.c.is_active.is_(True))
         .order_by(models.cron_jobs_table.c.name, nodes_table.c.name)
     )
 
-    if node_ids and len(node_ids) > 0:
-        stmt = stmt.where(models.cron_jobs_table.c.node_id.in_(node_ids))
-
     with engine.connect() as conn:
+        active_nodes = [dict(row) for row in conn.execute(
+            select(nodes_table.c.id, nodes_table.c.tags).where(nodes_table.c.is_active.is_(True))
+        ).mappings()]
+        active_ids = {node["id"] for node in active_nodes}
+        wanted = set(node_ids) if node_ids else None
+
         result = conn.execute(stmt)
         jobs = []
         for row in result.mappings():
-            job_dict = dict(row)
+            job_dict = _decode_job(dict(row))
+            if is_fanout(job_dict):
+                node_set = {node["id"] for node in filter_targets(
+                    active_nodes, job_dict['target_node_ids'], job_dict.get('target_tag')
+                )}
+            else:
+                node_set = {job_dict['node_id']} & active_ids
+            if not node_set or (wanted is not None and not node_set & wanted):
+                continue
 
             # 计算下次执行时间
             try:
@@ -74,7 +100,29 @@ def get_cron_job(engine: Engine, job_id: int) -> Optional[dict]:
     with engine.connect() as conn:
         query = models.cron_jobs_table.select().where(models.cron_jobs_table.c.id == job_id)
         result = conn.execute(query).fetchone()
-        return result._asdict() if result else None
+        return _decode_job(result._asdict()) if result else None
+
+
+def _encode_job_values(data: dict) -> dict:
+    """目标节点列表以 JSON 文本存储"""
+    if data.get('target_node_ids') is not None:
+        data = {**data, 'target_node_ids': json.dumps(data['target_node_ids'])}
+    return data
+
+
+def _decode_job(job: dict) -> dict:
+    job['target_node_ids'] = parse_target_node_ids(job.get('target_node_ids'))
+    return job
+
+
+def has_active_targets(engine: Engine, job: dict) -> bool:
+    """任务是否有可执行的节点：单节点任务看 node_id 所在节点，多节点任务看解析出的目标节点"""
+    if is_fanout(job):
+        return bool(job_targets(engine, job))
+    with engine.connect() as conn:
+        return bool(conn.execute(
+            select(nodes_table.c.is_active).where(nodes_table.c.id == job['node_id'])
+        ).scalar())
 
 
 def update_cron_job(engine: Engine, job_id: int, update_data: dict) -> bool:
@@ -85,10 +133,19 @@ def update_cron_job(engine: Engine, job_id: int, update_data: dict) -> bool:
         if not old_job:
             return False
 
+        # 多节点任务的目标变化时，node_id 改为新的首个目标节点（仅作为默认显示节点）
+        targets_changed = any(
+            key in update_data and update_data[key] != old_job[key] for key in ('target_node_ids', 'target_tag')
+        )
+        if targets_changed:
+            targets = job_targets(engine, {**old_job, **update_data})
+            if targets:
+                update_data = {**update_data, 'node_id': targets[0]['id']}
+
         stmt = (
             update(models.cron_jobs_table)
             .where(models.cron_jobs_table.c.id == job_id)
-            .values(**update_data)
+            .values(**_encode_job_values(update_data))
         )
         result = conn.execute(stmt)
         conn.commit()
@@ -101,16 +158,21 @@ def update_cron_job(engine: Engine, job_id: int, update_data: dict) -> bool:
             is_active_changed = 'is_active' in update_data and update_data['is_active'] != old_job['is_active']
             schedule_changed = 'schedule' in update_data and update_data['schedule'] != old_job['schedule']
 
-            if is_active_changed or schedule_changed:
+            if is_active_changed or schedule_changed or targets_changed:
                 # 先移除旧任务
-                if full_job_id in scheduler_service.job_ids:
-                    scheduler_service.remove_job(full_job_id)
+                scheduler_service.remove_job(full_job_id)
 
                 # 如果新状态是启用，添加新任务
                 new_is_active = update_data.get('is_active', old_job['is_active'])
                 if new_is_active:
                     _add_job_to_scheduler(engine, job_id)
 
+            # 暂存脚本的内容变化或关闭暂存后，清理不再引用的缓存脚本
+            if old_job.get('stage_script') and any(
+                key in update_data and update_data[key] != old_job[key] for key in ('command', 'stage_script')
+            ):
+                script_cache.schedule_gc(engine)
+
             return True
         return False
 
@@ -134,8 +196,7 @@ def toggle_job_status(engine: Engine, job_id: int, is_active: bool) -> bool:
             _add_job_to_scheduler(engine, job_id)
         else:
             # 禁用任务
-            if full_job_id in scheduler_service.job_ids:
-                scheduler_service.remove_job(full_job_id)
+            scheduler_service.remove_job(full_job_id)
 
         return True
 
@@ -153,10 +214,11 @@ def remove_job(engine: Engine, job_id: int) -> bool:
 
         # 从调度器移除
         full_job_id = f"cron_jobs:{job_id}"
-        if full_job_id in scheduler_service.job_ids:
-            scheduler_service.remove_job(full_job_id)
+        scheduler_service.remove_job(full_job_id)
 
-        return result.rowcount > 0
+    if job['stage_script']:
+        script_cache.schedule_gc(engine)
+    return result.rowcount > 0
 
 
 def _add_job_to_scheduler(engine: Engine, job_id: int) -> bool:
@@ -165,13 +227,10 @@ def _add_job_to_scheduler(engine: Engine, job_id: int) -> bool:
 
     job = get_cron_job(engine, job_id)
 
-    # 检查节点是否活跃
-    with engine.connect() as conn:
-        node_stmt = select(nodes_table.c.is_active).where(nodes_table.c.id == job['node_id'])
-        node_active = conn.execute(node_stmt).scalar()
-        if not node_active:
-            logger.warning(f"任务 {job_id} 的节点不活跃，跳过添加到调度器")
-            return False
+    # 检查节点是否活跃（多节点任务检查是否还有启用的目标节点）
+    if not has_active_targets(engine, job):
+        logger.warning(f"任务 {job_id} 的节点不活跃，跳过添加到调度器")
+        return False
 
     job_info = JobInfo(
         job_id=str(job_id),
@@ -188,8 +247,13 @@ def _add_job_to_scheduler(engine: Engine, job_id: int) -> bool:
 
 # ========== 任务执行相关函数 ==========
 
-def execute_job(engine: Engine, job_id: int, triggered_by: str = "manual", inputs: dict = None, outputs: dict = None) -> dict:
-    """执行任务并实时保存日志"""
+def _prepare_job(engine: Engine, job_id: int, inputs: dict = None, outputs: dict = None):
+    """
+    获取任务和节点并替换命令参数，返回 (job, node, command, script)
+
+    开启脚本暂存的任务不做模板替换：command 为执行缓存脚本的调用命令，script 为对应的 StagedScript，
+    执行前需先 script_cache.stage 确保脚本已在节点上；其他任务 script 为 None。
+    """
     # 获取任务和节点（提前验证）
     with engine.connect() as conn:
         job_stmt = select(models.cron_jobs_table).where(models.cron_jobs_table.c.id == job_id)
@@ -197,18 +261,22 @@ def execute_job(engine: Engine, job_id: int, triggered_by: str = "manual", input
         if not job:
             # 从调度器移除
             full_job_id = f"cron_jobs:{job_id}"
-            if full_job_id in scheduler_service.job_ids:
-                scheduler_service.remove_job(full_job_id)
+            scheduler_service.remove_job(full_job_id)
             raise ValueError(f"任务 {job_id} 不存在，已移除计划")
 
         node_stmt = select(nodes_table).where(nodes_table.c.id == job['node_id'])
         node = conn.execute(node_stmt).mappings().first()
-        if not node:
+        # 多节点任务在解析出的目标节点上执行，不依赖 node_id 所在节点
+        if not node and not is_fanout(job):
             full_job_id = f"cron_jobs:{job_id}"
-            if full_job_id in scheduler_service.job_ids:
-                scheduler_service.remove_job(full_job_id)
+            scheduler_service.remove_job(full_job_id)
             raise ValueError(f"任务 {job_id} 的节点{job['node_id']}不存在，已移除计划")
 
+    if job.get('stage_script'):
+        script = StagedScript(job['command'], inputs, outputs)
+        logger.debug(f"暂存脚本: {script.path}, 参数: {sorted(script.env)}")
+        return job, node, script.invocation(), script
+
     # 替换命令中的输入参数和输出参数
     command = job['command']
     logger.debug(f"原始命令: {command}")
@@ -246,25 +314,57 @@ def execute_job(engine: Engine, job_id: int, triggered_by: str = "manual", input
                     logger.info(f"替换输出参数: {placeholder} -> {value}")
 
     logger.debug(f"最终命令: {command}")
+    return job, node, command, None
+
+
+def execute_job(engine: Engine, job_id: int, triggered_by: str = "manual", inputs: dict = None, outputs: dict = None,
+                check_overlap: bool = True) -> dict:
+    """执行任务并实时保存日志（定时触发时先按任务的重叠策略处理）"""
+    job, node, command, script = _prepare_job(engine, job_id, inputs, outputs)
+
+    if triggered_by == "system" and check_overlap:
+        decision = overlap_guard.admit(
+            engine, job,
+            rerun=lambda: execute_job(engine, job_id, "system", inputs, outputs, check_overlap=False)
+        )
+        if decision != RUN:
+            return {"job_id": job_id, "status": decision}
+
+    targets = job_targets(engine, job)
+    if targets is not None:
+        # 多节点任务：在所有目标节点上并行执行
+        if not targets:
+            raise ValueError(f"任务 {job_id} 没有可用的目标节点")
+        if triggered_by == "workflow":
+            async def run():
+                try:
+                    return await execute_job_async(engine, job_id, inputs, outputs)
+                finally:
+                    await async_ssh_pool.close_all()
+            return asyncio.run(run())
+        return _execute_fanout_job(engine, job_id, command, job, targets, triggered_by, script)
 
     # 工作流调用时，同步执行任务；否则后台执行
     if triggered_by == "workflow":
         # 同步执行模式：直接执行并等待完成
-        return _execute_job_sync(engine, job_id, command, node, job, inputs, outputs)
+        return _execute_job_sync(engine, job_id, command, node, job, script)
     else:
-        # 后台执行模式：在后台线程中执行
-        return _execute_job_async(engine, job_id, command, node, job, triggered_by)
+        # 后台执行模式：提交到执行器排队执行
+        return _execute_job_async(engine, job_id, command, node, job, triggered_by, script)
 
 
-def _execute_job_sync(engine: Engine, job_id: int, command: str, node: dict, job: dict, inputs: dict = None, outputs: dict = None) -> dict:
+def _execute_job_sync(engine: Engine, job_id: int, command: str, node: dict, job: dict,
+                      script: Optional[StagedScript] = None) -> dict:
     """同步执行任务（用于工作流）"""
     ssh = None
-    output_buffer = []
-    error_buffer = []
+    channel = None
+    output_buffer = ExecutionLogBuffer(job.get('output_limit_kb'))
+    error_buffer = ExecutionLogBuffer(job.get('output_limit_kb'))
 
     # 创建执行记录
     stmt = insert(models.job_executions_table).values(
         job_id=job_id,
+        owner=PROCESS_ID,
         start_time=datetime.now(),
         status="running",
         triggered_by="workflow"
@@ -273,50 +373,30 @@ def _execute_job_sync(engine: Engine, job_id: int, command: str, node: dict, job
         result = conn.execute(stmt)
         execution_id = result.inserted_primary_key[0]
         logger.info(f"✅ 工作流任务调度：时间（{datetime.now().replace(second=0, microsecond=0)}），设备（{node['name']}），任务（{job['name']}）")
+    log_writer = ExecutionLogWriter(engine, execution_id)
 
     try:
         # 初始化执行日志
         _init_execution_log(engine, execution_id)
 
         from app.modules.node.schemas import NodeRead
-        ssh = SSHClient(NodeRead(**node))
-        ssh.connect()
-
-        _, stdout, stderr = ssh.client.exec_command(command, timeout=60)
+        ssh = ssh_pool.acquire(NodeRead(**node))
+        if script:
+            script_cache.stage(ssh, node, script)
 
-        while True:
-            if stdout.channel.recv_ready():
-                line = stdout.channel.recv(1024).decode('utf-8', errors='replace')
-                if line:
-                    output_buffer.append(line)
+        _, stdout, _ = ssh.client.exec_command(command, timeout=60)
+        channel = stdout.channel
 
-            if stderr.channel.recv_stderr_ready():
-                line = stderr.channel.recv_stderr(1024).decode('utf-8', errors='replace')
-                if line:
-                    error_buffer.append(line)
-
-            if stdout.channel.exit_status_ready():
-                while stdout.channel.recv_ready():
-                    line = stdout.channel.recv(4096).decode("utf-8", errors="replace")
-                    if line:
-                        output_buffer.append(line)
-
-                while stderr.channel.recv_stderr_ready():
-                    line = stderr.channel.recv_stderr(4096).decode("utf-8", errors="replace")
-                    if line:
-                        error_buffer.append(line)
-
-                break
-
-        exit_code = stdout.channel.recv_exit_status()
+        exit_code = read_channel(channel, output_buffer.append, error_buffer.append)
         status = "success" if exit_code == 0 else "failed"
+        if script and exit_code != 0:
+            script_cache.invalidate(node, script)
 
-        final_output = "".join(output_buffer)
-        final_error = "".join(error_buffer)
+        final_output = output_buffer.getvalue()
+        final_error = error_buffer.getvalue()
 
         # 保存输出和错误日志
-        if output_buffer or error_buffer:
-            _save_and_clear_buffer(engine, execution_id, output_buffer, error_buffer, status)
+        _save_and_clear_buffer(log_writer, output_buffer, error_buffer, final=True)
 
         # 更新最终状态
         _update_execution_final_status(engine, execution_id, status, job, final_error)
@@ -333,9 +413,8 @@ def _execute_job_sync(engine: Engine, job_id: int, command: str, node: dict, job
         error_msg = str(e)
         logger.error(f"任务执行异常: job_id={job_id}, error={error_msg}")
 
-        # 保存错误日志
-        if error_buffer:
-            _save_and_clear_buffer(engine, execution_id, [], error_buffer, "failed")
+        # 保存已读取的输出和错误日志
+        _save_and_clear_buffer(log_writer, output_buffer, error_buffer, final=True)
 
         # 更新最终状态
         _update_execution_final_status(engine, execution_id, "failed", job, error_msg)
@@ -347,18 +426,91 @@ def _execute_job_sync(engine: Engine, job_id: int, command: str, node: dict, job
         }
 
     finally:
-        if ssh:
-            ssh.close()
+        if channel:
+            channel.close()
+        ssh_pool.release(ssh)
 
 
-def _execute_job_async(engine: Engine, job_id: int, command: str, node: dict, job: dict, triggered_by: str) -> dict:
-    """异步执行任务（用于手动执行和调度）"""
+async def execute_job_async(engine: Engine, job_id: int, inputs: dict = None, outputs: dict = None) -> dict:
+    """
+    在当前事件循环上执行任务（用于工作流），不占用线程
+
+    与 _execute_job_sync 行为一致：等待执行完成，返回 {"status", "output", "error"}；
+    数据库读写都放到线程中执行，不阻塞共用事件循环的其他工作流
+    """
+    job, node, command, script, targets, execution_id = await asyncio.to_thread(
+        _start_workflow_execution, engine, job_id, inputs, outputs
+    )
+
+    if targets is not None:
+        # 多节点任务：输出为各节点带前缀输出的合并
+        result = await _run_fanout_execution(engine, execution_id, command, job, targets, script=script)
+        logs = await asyncio.to_thread(assemble_execution_log, engine, execution_id) or {}
+        return {"status": result["status"], "output": logs.get("output", ""), "error": result["error"]}
+
+    log_writer = ExecutionLogWriter(engine, execution_id)
+    output_buffer = ExecutionLogBuffer(job.get('output_limit_kb'))
+    error_buffer = ExecutionLogBuffer(job.get('output_limit_kb'))
+
+    try:
+        await asyncio.to_thread(_init_execution_log, engine, execution_id)
+
+        from app.modules.node.schemas import NodeRead
+        async with async_ssh_pool.session(NodeRead(**node)) as ssh:
+            if script:
+                await script_cache.stage_async(ssh, node, script)
+            exit_code = await ssh.stream_command(command, output_buffer.append, error_buffer.append)
+        status = "success" if exit_code == 0 else "failed"
+        if script and exit_code != 0:
+            script_cache.invalidate(node, script)
+        final_output = output_buffer.getvalue()
+        final_error = error_buffer.getvalue()
+        await asyncio.to_thread(_save_and_clear_buffer, log_writer, output_buffer, error_buffer, True)
+
+        # 失败通知内部使用 asyncio.run，放到线程中执行
+        await asyncio.to_thread(_update_execution_final_status, engine, execution_id, status, job, final_error)
+
+        logger.info(f"任务执行完成: job_id={job_id}, status={status}, output={final_output[:100] if final_output else ''}, error={final_error[:100] if final_error else ''}")
+        return {"status": status, "output": final_output, "error": final_error}
+
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"任务执行异常: job_id={job_id}, error={error_msg}")
+        await asyncio.to_thread(_save_and_clear_buffer, log_writer, output_buffer, error_buffer, True)
+        await asyncio.to_thread(_update_execution_final_status, engine, execution_id, "failed", job, error_msg)
+        return {"status": "failed", "output": "", "error": error_msg}
+
+
+def _start_workflow_execution(engine: Engine, job_id: int, inputs: dict = None, outputs: dict = None):
+    """工作流调用任务：准备命令并创建 running 状态的执行记录，返回 (job, node, command, script, targets, execution_id)"""
+    job, node, command, script = _prepare_job(engine, job_id, inputs, outputs)
+    targets = job_targets(engine, job)
 
-    # 创建执行记录
     stmt = insert(models.job_executions_table).values(
         job_id=job_id,
+        owner=PROCESS_ID,
         start_time=datetime.now(),
         status="running",
+        triggered_by="workflow"
+    )
+    with engine.begin() as conn:
+        result = conn.execute(stmt)
+        execution_id = result.inserted_primary_key[0]
+        device = f"{len(targets)} 个节点" if targets is not None else node['name']
+        logger.info(f"✅ 工作流任务调度：时间（{datetime.now().replace(second=0, microsecond=0)}），设备（{device}），任务（{job['name']}）")
+    return job, node, command, script, targets, execution_id
+
+
+def _execute_job_async(engine: Engine, job_id: int, command: str, node: dict, job: dict, triggered_by: str,
+                       script: Optional[StagedScript] = None) -> dict:
+    """异步执行任务（用于手动执行和调度），执行记录先以 queued 状态入队"""
+
+    # 创建执行记录
+    stmt = insert(models.job_executions_table).values(
+        job_id=job_id,
+        owner=PROCESS_ID,
+        start_time=datetime.now(),
+        status="queued",
         triggered_by=triggered_by
     )
     with engine.begin() as conn:
@@ -368,85 +520,59 @@ def _execute_job_async(engine: Engine, job_id: int, command: str, node: dict, jo
 
     def run_task():
         ssh = None
-        output_buffer = []
-        error_buffer = []
+        channel = None
+        output_buffer = ExecutionLogBuffer(job.get('output_limit_kb'))
+        error_buffer = ExecutionLogBuffer(job.get('output_limit_kb'))
+        log_writer = ExecutionLogWriter(engine, execution_id)
         out_len = 2000
         error_len = 1000
 
         try:
-            execution_manager.create_execution(execution_id)
             _init_execution_log(engine, execution_id)
 
             from app.modules.node.schemas import NodeRead
-            ssh = SSHClient(NodeRead(**node))
-            ssh.connect()
+            ssh = ssh_pool.acquire(NodeRead(**node))
+            if script:
+                script_cache.stage(ssh, node, script)
 
             initial_log = {"status": "running", "output": "正在连接...\n", "error": "", "end_time": None}
             ws_manager.send_log_sync(execution_id, initial_log)
 
-            _, stdout, stderr = ssh.client.exec_command(command, timeout=60)
-
-            while True:
-                if execution_manager.should_stop(execution_id):
-                    raise ExecutionCancelledError("任务已被用户中断")
-
-                if stdout.channel.recv_ready():
-                    line = stdout.channel.recv(1024).decode('utf-8', errors='replace')
-                    if line:
-                        output_buffer.append(line)
-                        log_data = {
-                            "status": "running",
-                            "output": line,
-                            "error": "",
-                            "end_time": None
-                        }
-                        ws_manager.send_log_sync(execution_id, log_data)
-
-                        if len("".join(output_buffer)) >= out_len:
-                            _save_and_clear_buffer(engine, execution_id, output_buffer, [], "running")
-
-                if stderr.channel.recv_stderr_ready():
-                    line = stderr.channel.recv_stderr(1024).decode('utf-8', errors='replace')
-                    if line:
-                        error_buffer.append(line)
-                        log_data = {
-                            "status": "running",
-                            "output": "",
-                            "error": line,
-                            "end_time": None
-                        }
-                        ws_manager.send_log_sync(execution_id, log_data)
-
-                        if len("".join(error_buffer)) >= error_len:
-                            _save_and_clear_buffer(engine, execution_id, [], error_buffer, "running")
-
-                if stdout.channel.exit_status_ready():
-                    while stdout.channel.recv_ready():
-                        line = stdout.channel.recv(4096).decode("utf-8", errors="replace")
-                        if line:
-                            output_buffer.append(line)
-                            log_data = {"status": "running", "output": line, "error": "", "end_time": None}
-                            ws_manager.send_log_sync(execution_id, log_data)
-
-                    while stderr.channel.recv_stderr_ready():
-                        line = stderr.channel.recv_stderr(4096).decode("utf-8", errors="replace")
-                        if line:
-                            error_buffer.append(line)
-                            log_data = {"status": "running", "output": "", "error": line, "end_time": None}
-                            ws_manager.send_log_sync(execution_id, log_data)
-
-                    break
-
-            if output_buffer:
-                _save_and_clear_buffer(engine, execution_id, output_buffer, [], "running")
-            if error_buffer:
-                _save_and_clear_buffer(engine, execution_id, [], error_buffer, "running")
-
-            exit_code = stdout.channel.recv_exit_status()
+            _, stdout, _ = ssh.client.exec_command(command, timeout=60)
+            channel = stdout.channel
+
+            # 超出输出上限后，append 只按间隔返回最新输出的节选
+            def on_stdout(text: str):
+                live = output_buffer.append(text)
+                if live:
+                    ws_manager.send_log_sync(execution_id, {"status": "running", "output": live, "error": "", "end_time": None})
+                if output_buffer.size >= out_len:
+                    _save_and_clear_buffer(log_writer, output_buffer)
+
+            def on_stderr(text: str):
+                live = error_buffer.append(text)
+                if live:
+                    ws_manager.send_log_sync(execution_id, {"status": "running", "output": "", "error": live, "end_time": None})
+                if error_buffer.size >= error_len:
+                    _save_and_clear_buffer(log_writer, error_buffer=error_buffer)
+
+            reader = ChannelReader(
+                channel, on_stdout, on_stderr,
+                should_stop=lambda: execution_manager.should_stop(execution_id)
+            )
+            # 中断时立即唤醒阻塞中的读取
+            execution_manager.on_stop(execution_id, reader.wakeup)
+            exit_code = reader.read()
+
+            _send_rest_view(execution_id, output_buffer, error_buffer)
+            _save_and_clear_buffer(log_writer, output_buffer, error_buffer, final=True)
+
             status = "success" if exit_code == 0 else "failed"
+            if script and exit_code != 0:
+                script_cache.invalidate(node, script)
 
-            final_output = "".join(output_buffer)
-            final_error = "".join(error_buffer)
+            final_output = output_buffer.getvalue()
+            final_error = error_buffer.getvalue()
 
             _update_execution_final_status(engine, execution_id, status, job, final_error)
 
@@ -460,14 +586,12 @@ def _execute_job_async(engine: Engine, job_id: int, command: str, node: dict, jo
 
         except ExecutionCancelledError as e:
             error_msg = str(e)
-            if output_buffer:
-                _save_and_clear_buffer(engine, execution_id, output_buffer, [], "cancelled")
-            if error_msg:
-                _save_and_clear_buffer(engine, execution_id, [], [error_msg], "cancelled")
+            error_buffer.append(error_msg)
+            _save_and_clear_buffer(log_writer, output_buffer, error_buffer, final=True)
 
             _update_execution_final_status(engine, execution_id, "cancelled", job, error_msg)
 
-            final_output = "".join(output_buffer) if 'output_buffer' in locals() else ""
+            final_output = output_buffer.getvalue()
             final_error = error_msg
 
             final_log = {
@@ -480,7 +604,8 @@ def _execute_job_async(engine: Engine, job_id: int, command: str, node: dict, jo
 
         except Exception as e:
             error_msg = str(e)
-            _save_and_clear_buffer(engine, execution_id, [], [error_msg], "failed")
+            error_buffer.append(error_msg)
+            _save_and_clear_buffer(log_writer, output_buffer, error_buffer, final=True)
             _update_execution_final_status(engine, execution_id, "failed", job, error_msg)
 
             final_log = {
@@ -492,12 +617,111 @@ def _execute_job_async(engine: Engine, job_id: int, command: str, node: dict, jo
             ws_manager.send_log_sync(execution_id, final_log)
 
         finally:
-            if ssh:
-                ssh.close()
+            # 关闭会话通道（中断时远端命令随通道关闭），连接归还连接池
+            if channel:
+                channel.close()
+            ssh_pool.release(ssh)
             execution_manager.cleanup(execution_id)
             ws_manager.cleanup(execution_id)
 
-    threading.Thread(target=run_task, daemon=True).start()
+    return _submit_execution(engine, execution_id, node['id'], job, run_task, triggered_by)
+
+
+def _execute_fanout_job(engine: Engine, job_id: int, command: str, job: dict, targets: List[dict], triggered_by: str,
+                        script: Optional[StagedScript] = None) -> dict:
+    """后台执行多节点任务：占用一个工作线程，在线程内的事件循环上并行执行所有节点"""
+    stmt = insert(models.job_executions_table).values(
+        job_id=job_id,
+        owner=PROCESS_ID,
+        start_time=datetime.now(),
+        status="queued",
+        triggered_by=triggered_by
+    )
+    with engine.begin() as conn:
+        result = conn.execute(stmt)
+        execution_id = result.inserted_primary_key[0]
+        logger.info(f"✅ 任务调度：时间（{datetime.now().replace(second=0, microsecond=0)}），设备（{len(targets)} 个节点），任务（{job['name']}），触发方式（{triggered_by}）")
+
+    def run_task():
+        async def run():
+            try:
+                await _run_fanout_execution(
+                    engine, execution_id, command, job, targets, script=script,
+                    should_stop=lambda: execution_manager.should_stop(execution_id)
+                )
+            finally:
+                await async_ssh_pool.close_all()
+
+        try:
+            _init_execution_log(engine, execution_id)
+            ws_manager.send_log_sync(execution_id, {
+                "status": "running", "output": f"正在连接 {len(targets)} 个节点...\n", "error": "", "end_time": None
+            })
+            asyncio.run(run())
+        finally:
+            execution_manager.cleanup(execution_id)
+            ws_manager.cleanup(execution_id)
+
+    # 多节点任务占用每个目标节点的名额，另以 fanout:<任务ID> 限制同一任务的并发
+    slots = (fanout_slot(job_id), *(target['id'] for target in targets))
+    return _submit_execution(engine, execution_id, slots, job, run_task, triggered_by)
+
+
+async def _run_fanout_execution(engine: Engine, execution_id: int, command: str, job: dict, targets: List[dict],
+                                script: Optional[StagedScript] = None, should_stop=None) -> dict:
+    """执行多节点任务并更新最终状态，返回 {"status", "output", "error", "summary"}"""
+    # 异常时沿用同一个写入器，错误信息的分块序号接在已写入的节点输出之后
+    log_writer = ExecutionLogWriter(engine, execution_id)
+    try:
+        result = await run_fanout(engine, execution_id, command, targets,
+                                  fanout_width=job.get('fanout_width') or 10, script=script,
+                                  output_limit_kb=job.get('output_limit_kb'), should_stop=should_stop,
+                                  log_writer=log_writer)
+    except Exception as e:
+        logger.error(f"多节点任务执行异常: execution_id={execution_id}, error={e}")
+        await asyncio.to_thread(log_writer.append, stderr=str(e))
+        result = {"status": "failed", "output": "", "error": str(e), "summary": None}
+
+    # 失败通知内部使用 asyncio.run，放到线程中执行
+    await asyncio.to_thread(_update_execution_final_status, engine, execution_id, result["status"], job, result["error"])
+    ws_manager.send_log_sync(execution_id, {
+        "status": result["status"],
+        "output": "",
+        "error": result["error"],
+        "end_time": datetime.now().isoformat(),
+        "summary": result["summary"]
+    })
+    return result
+
+
+def _submit_execution(engine: Engine, execution_id: int, node_id: Slots, job: dict, run_task, triggered_by: str) -> dict:
+    """将 queued 状态的执行提交到执行器，返回执行记录（排队到结束期间计入任务的进行中执行）"""
+    job_id = job['id']
+
+    def run():
+        try:
+            run_task()
+        finally:
+            overlap_guard.finished(job_id, execution_id)
+
+    def cancel_queued():
+        try:
+            _finish_unstarted_execution(engine, execution_id, "cancelled", job, "任务在排队中被取消")
+        finally:
+            overlap_guard.finished(job_id, execution_id)
+
+    execution_manager.create_execution(execution_id)
+    overlap_guard.started(job_id, execution_id)
+    priority = PRIORITY_HIGH if triggered_by == "manual" else PRIORITY_NORMAL
+    if cron_executor.submit(execution_id, node_id, run, on_cancel=cancel_queued, priority=priority):
+        # 排队中收到中断请求时直接出队
+        execution_manager.on_stop(execution_id, lambda: cron_executor.cancel(execution_id))
+    else:
+        logger.warning(f"执行队列已满，拒绝执行: job_id={job_id}, execution_id={execution_id}")
+        try:
+            _finish_unstarted_execution(engine, execution_id, "failed", job, "执行队列已满，任务被拒绝")
+        finally:
+            overlap_guard.finished(job_id, execution_id)
     return get_execution(engine, execution_id)
 
 
@@ -512,31 +736,61 @@ def execute_jobs(engine: Engine, request: schemas.ManualExecutionRequest) -> lis
 
 # ========== 执行记录相关函数 ==========
 
+def _execution_summary_columns():
+    """执行记录摘要列（不含输出）"""
+    table = models.job_executions_table
+    return [c for c in table.c if c.name not in ("output", "error", "archived_log")]
+
+
 def get_executions(engine: Engine, job_id: int, limit: int = 10) -> list[dict]:
-    """获取执行记录"""
+    """获取执行记录（列表不返回输出，输出通过 get_execution / read_execution_log 读取）"""
     stmt = (
-        select(models.job_executions_table)
+        select(*_execution_summary_columns())
         .where(models.job_executions_table.c.job_id == job_id)
         .order_by(models.job_executions_table.c.start_time.desc())
         .limit(limit)
     )
     with engine.connect() as conn:
         result = conn.execute(stmt)
-        return [dict(row) for row in result.mappings()]
+        return [_decode_execution(dict(row)) for row in result.mappings()]
 
 
-def get_execution(engine: Engine, execution_id: int) -> dict:
-    """获取单个执行记录"""
-    stmt = select(models.job_executions_table).where(models.job_executions_table.c.id == execution_id)
+def get_execution(engine: Engine, execution_id: int, with_logs: bool = True) -> dict:
+    """
+    获取单个执行记录
+
+    Args:
+        with_logs: 是否拼装完整输出；为 False 时只返回摘要，
+                   大输出请使用 read_execution_log 分段读取
+    """
+    table = models.job_executions_table
+    columns = [c for c in table.c if c.name != "archived_log"] if with_logs else _execution_summary_columns()
+    stmt = select(*columns).where(table.c.id == execution_id)
     with engine.connect() as conn:
         result = conn.execute(stmt).mappings().first()
-        return dict(result) if result else None
+    if not result:
+        return None
+
+    execution = _decode_execution(dict(result))
+    if with_logs:
+        logs = assemble_execution_log(engine, execution_id)
+        if logs is None and execution.get('compacted_at'):
+            logs = load_archived_log(engine, execution_id)
+        if logs is not None:
+            execution.update(logs)
+    return execution
 
 
 # ========== 内部辅助函数 ==========
 
+def _decode_execution(execution: dict) -> dict:
+    """多节点执行汇总以 JSON 文本存储"""
+    execution['summary'] = parse_summary(execution.get('summary'))
+    return execution
+
+
 def _init_execution_log(engine: Engine, execution_id: int):
-    """初始化执行日志记录"""
+    """初始化执行日志记录（开始执行时调用，开始时间以出队时间为准）"""
     stmt = (
         update(models.job_executions_table)
         .where(models.job_executions_table.c.id == execution_id)
@@ -544,36 +798,48 @@ def _init_execution_log(engine: Engine, execution_id: int):
             output="",
             error="",
             status="running",
+            start_time=datetime.now(),
             end_time=None
         )
     )
-    with engine.begin() as conn:
-        conn.execute(stmt)
+    db_writer.execute(stmt)
 
 
-def _save_and_clear_buffer(engine: Engine, execution_id: int, output_buffer: list, error_buffer: list, status: str):
-    """保存缓冲区内容并清空"""
-    if not output_buffer and not error_buffer:
-        return
+def _finish_unstarted_execution(engine: Engine, execution_id: int, status: str, job: dict, error_msg: str):
+    """结束未开始执行的记录（排队中取消或被拒绝）"""
+    try:
+        ExecutionLogWriter(engine, execution_id).append(stderr=error_msg)
+        _update_execution_final_status(engine, execution_id, status, job, error_msg)
+        ws_manager.send_log_sync(execution_id, {
+            "status": status,
+            "output": "",
+            "error": error_msg,
+            "end_time": datetime.now().isoformat()
+        })
+    finally:
+        execution_manager.cleanup(execution_id)
+        ws_manager.cleanup(execution_id)
 
-    output_str = "".join(output_buffer)
-    error_str = "".join(error_buffer)
 
-    stmt = (
-        update(models.job_executions_table)
-        .where(models.job_executions_table.c.id == execution_id)
-        .values(
-            output=models.job_executions_table.c.output + output_str,
-            error=models.job_executions_table.c.error + error_str,
-            status=status,
-            end_time=datetime.now() if status in ["success", "failed", "cancelled"] else None
-        )
-    )
-    with engine.begin() as conn:
-        conn.execute(stmt)
+def _save_and_clear_buffer(log_writer: ExecutionLogWriter,
+                           output_buffer: ExecutionLogBuffer = None,
+                           error_buffer: ExecutionLogBuffer = None,
+                           final: bool = False):
+    """
+    将缓冲区内容追加为日志分块并清空（状态由 _update_execution_final_status 更新）
+
+    final=True 表示命令已结束，超出输出上限的流一并写入丢弃标记和保留的末尾
+    """
+    output_str = output_buffer.take(final) if output_buffer is not None else ""
+    error_str = error_buffer.take(final) if error_buffer is not None else ""
+    log_writer.append(output_str, error_str)
 
-    output_buffer.clear()
-    error_buffer.clear()
+
+def _send_rest_view(execution_id: int, output_buffer: ExecutionLogBuffer, error_buffer: ExecutionLogBuffer):
+    """超出输出上限的流：命令结束时补发最后一次推送之后的输出节选"""
+    rest_output, rest_error = output_buffer.view(force=True), error_buffer.view(force=True)
+    if rest_output or rest_error:
+        ws_manager.send_log_sync(execution_id, {"status": "running", "output": rest_output, "error": rest_error, "end_time": None})
 
 
 def _update_execution_final_status(engine: Engine, execution_id: int, status: str, job: dict, error: str = ''):
@@ -586,13 +852,14 @@ def _update_execution_final_status(engine: Engine, execution_id: int, status: st
             end_time=datetime.now()
         )
     )
+    # 经写队列提交（未启用时直接执行），排在此前入队的日志分块之后
+    db_writer.execute(stmt)
 
     with engine.begin() as conn:
-        conn.execute(stmt)
-
         from app.modules.cron.schemas import CronJobUpdateNotice
         job = CronJobUpdateNotice(**job)
 
+        stmt1 = None  # 取消执行不影响连续失败计数
         if status == 'success':
             stmt1 = (
                 update(models.cron_jobs_table)
@@ -621,7 +888,43 @@ def _update_execution_final_status(engine: Engine, execution_id: int, status: st
                     .where(models.cron_jobs_table.c.id == job.id)
                     .values(consecutive_failures=new_failures)
                 )
-        conn.execute(stmt1)
+        if stmt1 is not None:
+            conn.execute(stmt1)
+
+
+def reconcile_orphaned_executions(engine: Engine) -> int:
+    """
+    启动时清理已退出进程遗留的执行记录
+
+    进程关闭或崩溃时，排队中和运行中的执行记录会一直停在 queued/running，
+    被重叠策略当作进行中。不属于任何存活进程的记录：排队中的标记为取消，运行中的标记为失败。
+    升级前的记录没有进程标识，只有本进程存活时才处理。
+
+    Returns:
+        处理的记录数
+    """
+    from app.core.cluster import cluster_channel
+
+    table = models.job_executions_table
+    live = cluster_channel.live_members()
+    owner_gone = table.c.owner.notin_(live)
+    if len(live) == 1:
+        owner_gone = or_(owner_gone, table.c.owner.is_(None))
+    now = datetime.now()
+    with engine.begin() as conn:
+        cancelled = conn.execute(
+            update(table)
+            .where(table.c.status == "queued", owner_gone)
+            .values(status="cancelled", end_time=now, error="进程退出，排队中的执行已取消")
+        ).rowcount
+        failed = conn.execute(
+            update(table)
+            .where(table.c.status == "running", owner_gone)
+            .values(status="failed", end_time=now, error="进程退出，执行中断")
+        ).rowcount
+    if cancelled or failed:
+        logger.warning(f"已处理中断的任务执行: 取消排队 {cancelled} 个，标记失败 {failed} 个")
+    return cancelled + failed
 
 
 def get_next_crons(cron: schemas.CronReq) -> list[dict]:
@@ -655,15 +958,6 @@ def sync_all_jobs_to_scheduler(engine: Engine) -> int:
 
 
 def reload_all_jobs(engine: Engine) -> int:
-    """重新加载所有任务（先清空再添加）"""
-    # 移除当前模块的所有任务
-    to_remove = []
-    for job_id in scheduler_service.job_ids:
-        if job_id.startswith("cron_jobs:"):
-            to_remove.append(job_id)
-
-    for job_id in to_remove:
-        scheduler_service.remove_job(job_id)
-
-    # 重新添加
-    return sync_all_jobs_to_scheduler(engine)
+    """重新加载所有任务（只处理与调度器中不一致的任务），返回变化的任务数"""
+    counts = scheduler_service.reconcile("cron_jobs")
+    return counts['added'] + counts['replaced'] + counts['updated'] + counts['removed']
@@ -3,7 +3,8 @@ import json
 import os
 from datetime import datetime
 from sqlalchemy import MetaData, Table, select, delete
-from app.core.db.database import engine, metadata, DATABASE_URL, logger
+from app.core.db.database import engine, metadata, DATABASE_URL, logger, checkpoint
+from app.core.db.write_queue import db_writer
 import shutil
 from typing import List, Optional
 
@@ -18,9 +19,9 @@ MODULE_TABLES = {
     "notes": {"label":"便签管理","tables":["notes"]},
     "notifications": {"label":"消息通知","tables":["notification_services", "notification_settings"]},
     "workflow": {"label":"工作流","tables":["workflows","workflow_executions","workflow_node_executions","workflow_versions"]},
-    "nodes": {"label":"节点管理","tables":["nodes"]},
+    "nodes": {"label":"节点管理","tables":["nodes", "cron_script_cache"]},
     "credentials": {"label":"凭据管理","tables":["credential_templates"]},
-    "jobs": {"label":"任务管理","tables":["cron_jobs", "job_executions"]},
+    "jobs": {"label":"任务管理","tables":["cron_jobs", "job_executions", "job_execution_log_chunks", "cron_script_cache"]},
     "ssl": {"label":"证书管理","tables":["ssl_dns_auth","ssl_applications","ssl_application_executions","ssl_certificates","ssl_download_logs"]},
     "asset": {"label":"固定资产","tables":["asset"]},
     "ai": {"label":"AI助手 ","tables":["ai_conversations","ai_messages","ai_config","ai_knowledge_base","ai_knowledge_document","ai_knowledge_chunk"]},
@@ -32,10 +33,17 @@ WHITELIST_TABLES = [
     "system_config"
 ]
 
+# 运行时状态表（调度器任务存储、进程间租约与消息），不导出、不导入、不清空
+RUNTIME_TABLES = [
+    "apscheduler_jobs",
+    "cluster_leases",
+    "cluster_messages"
+]
+
 # 新增：排除表的判断函数
 def should_exclude_table(table_name: str) -> bool:
-    """判断是否应该排除该表（以 _ 开头或 sqlite_ 开头的表）"""
-    return table_name.startswith('_') or table_name.startswith('sqlite_')
+    """判断是否应该排除该表（以 _ 开头或 sqlite_ 开头的表、运行时状态表）"""
+    return table_name.startswith('_') or table_name.startswith('sqlite_') or table_name in RUNTIME_TABLES
 
 def get_tables_by_modules(modules: List[str]) -> List[str]:
     """根据模块名获取对应的表名列表"""
@@ -260,6 +268,9 @@ def create_backup():
 
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     backup_path = f"{db_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # WAL 模式下最新数据可能还在 -wal 文件中，复制前先合并到主库
+    db_writer.flush()
+    checkpoint()
     shutil.copy2(db_path, backup_path)
     return backup_path
 
@@ -274,6 +285,9 @@ def restore_backup(backup_path):
             db_path = path_part.replace("/", "\\")
 
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        if os.path.exists(db_path):
-            os.remove(db_path)
+        # 关闭连接池中的连接，并删除旧库的 WAL/共享内存文件，避免被回放到恢复后的库上
+        engine.dispose()
+        for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
         shutil.copy2(backup_path, db_path)
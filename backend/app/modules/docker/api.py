@@ -7,6 +7,7 @@ import logging
 
 from . import schemas
 from .services import DockerService
+from ...core.sh.async_ssh_pool import async_ssh_pool
 from ...core.exception.exceptions import ServerException, NotFoundException
 from ...core.pojo.response import BaseResponse
 from ...core.db.database import get_engine
@@ -36,7 +37,7 @@ async def list_containers(
     docker = None
     try:
         docker = DockerService(node_id)
-        containers = docker.list_containers(all=all)
+        containers = await docker.list_containers(all=all)
         return BaseResponse.success(containers)
     except ValueError as e:
         raise NotFoundException(str(e))
@@ -47,7 +48,7 @@ async def list_containers(
         raise ServerException(f"获取容器列表失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.get("/nodes/{node_id}/containers/fast")
@@ -64,7 +65,7 @@ async def list_containers_fast(node_id: int):
     docker = None
     try:
         docker = DockerService(node_id)
-        containers = docker.list_containers_fast()
+        containers = await docker.list_containers_fast()
         return BaseResponse.success(containers)
     except ValueError as e:
         raise NotFoundException(str(e))
@@ -73,7 +74,7 @@ async def list_containers_fast(node_id: int):
         raise ServerException(f"获取容器列表失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.post("/nodes/{node_id}/containers/action")
@@ -94,7 +95,7 @@ async def container_action(
     docker = None
     try:
         docker = DockerService(node_id)
-        success, message = docker.container_action(req.container_id, req.action)
+        success, message = await docker.container_action(req.container_id, req.action)
         if success:
             return BaseResponse.success(message=message)
         else:
@@ -106,7 +107,7 @@ async def container_action(
         raise ServerException(f"操作失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.post("/nodes/{node_id}/containers/action/async")
@@ -127,7 +128,7 @@ async def container_action_async(
     docker = None
     try:
         docker = DockerService(node_id)
-        success, message = docker.container_action_async(req.container_id, req.action)
+        success, message = await docker.container_action_async(req.container_id, req.action)
         return BaseResponse.success(message=message, data={"async": True})
     except ValueError as e:
         raise NotFoundException(str(e))
@@ -136,7 +137,7 @@ async def container_action_async(
         raise ServerException(f"操作失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.get("/nodes/{node_id}/containers/{container_id}/logs")
@@ -159,7 +160,7 @@ async def get_container_logs(
     docker = None
     try:
         docker = DockerService(node_id)
-        logs = docker.get_container_logs(container_id, tail)
+        logs = await docker.get_container_logs(container_id, tail)
         return BaseResponse.success({"logs": logs})
     except ValueError as e:
         raise NotFoundException(str(e))
@@ -168,7 +169,7 @@ async def get_container_logs(
         raise ServerException(f"获取日志失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 # ========== Compose 项目管理 ==========
@@ -187,7 +188,7 @@ async def list_compose_projects(node_id: int):
     docker = None
     try:
         docker = DockerService(node_id)
-        projects = docker.list_compose_projects()
+        projects = await docker.list_compose_projects()
         return BaseResponse.success(projects)
     except ValueError as e:
         raise NotFoundException(str(e))
@@ -196,7 +197,7 @@ async def list_compose_projects(node_id: int):
         raise ServerException(f"获取项目列表失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.get("/nodes/{node_id}/compose/search")
@@ -213,7 +214,7 @@ async def list_compose_projects_with_search(node_id: int):
     docker = None
     try:
         docker = DockerService(node_id)
-        projects = docker.list_compose_projects_with_search()
+        projects = await docker.list_compose_projects_with_search()
         return BaseResponse.success(projects)
     except ValueError as e:
         raise NotFoundException(str(e))
@@ -222,7 +223,7 @@ async def list_compose_projects_with_search(node_id: int):
         raise ServerException(f"搜索项目失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.get("/nodes/{node_id}/compose/file")
@@ -243,7 +244,7 @@ async def get_compose_file(
     docker = None
     try:
         docker = DockerService(node_id)
-        content = docker.get_compose_file(path)
+        content = await docker.get_compose_file(path)
         return BaseResponse.success({"path": path, "content": content})
     except FileNotFoundError as e:
         raise NotFoundException(str(e))
@@ -254,7 +255,7 @@ async def get_compose_file(
         raise ServerException(f"读取文件失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.post("/nodes/{node_id}/compose/file")
@@ -275,7 +276,7 @@ async def save_compose_file(
     docker = None
     try:
         docker = DockerService(node_id)
-        success, message = docker.save_compose_file(req.path, req.content)
+        success, message = await docker.save_compose_file(req.path, req.content)
         if success:
             return BaseResponse.success(message=message)
         else:
@@ -287,7 +288,7 @@ async def save_compose_file(
         raise ServerException(f"保存文件失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 @router.post("/nodes/{node_id}/compose/action")
@@ -308,7 +309,7 @@ async def compose_action(
     docker = None
     try:
         docker = DockerService(node_id)
-        success, message = docker.compose_action(req.path, req.action, req.services)
+        success, message = await docker.compose_action(req.path, req.action, req.services)
         if success:
             return BaseResponse.success(message=message, data={"output": message})
         else:
@@ -320,7 +321,7 @@ async def compose_action(
         raise ServerException(f"操作失败: {str(e)}")
     finally:
         if docker:
-            docker.close()
+            await docker.close()
 
 
 # ========== 操作日志 ==========
@@ -382,15 +383,12 @@ async def container_logs_stream(
     """
     await websocket.accept()
     
-    docker = None
-    channel = None
+    ssh = None
     
     try:
-        from app.core.sh.ssh_client import SSHClient
         from app.modules.node import services as node_services
         from app.modules.node.schemas import NodeRead
         from app.core.db.database import engine as db_engine
-        import paramiko
         
         node_data = node_services.get_node(db_engine, node_id)
         if not node_data:
@@ -398,30 +396,16 @@ async def container_logs_stream(
             return
         
         node = NodeRead(**node_data)
-        ssh = SSHClient(node)
-        ssh.connect()
-        
-        transport = ssh.client.get_transport()
-        channel = transport.open_session()
+        ssh = await async_ssh_pool.acquire(node)
         
         follow_flag = "-f" if follow else ""
         cmd = f"docker logs {follow_flag} --tail {tail} {container_id} 2>&1"
-        channel.exec_command(cmd)
         
-        while True:
-            if channel.recv_ready():
-                data = channel.recv(4096)
-                if data:
-                    try:
-                        text = data.decode('utf-8', errors='replace')
-                        await websocket.send_text(json.dumps({"log": text}))
-                    except Exception:
-                        pass
-                else:
-                    break
-            elif channel.exit_status_ready():
-                break
-            await asyncio.sleep(0.05)
+        async def send_log(text: str):
+            await websocket.send_text(json.dumps({"log": text}))
+        
+        # 有输出才推送，空闲时不轮询
+        await ssh.stream_command(cmd, send_log, send_log)
         
         await websocket.send_text(json.dumps({"done": True}))
         
@@ -434,10 +418,8 @@ async def container_logs_stream(
         except:
             pass
     finally:
-        if channel:
-            channel.close()
-        if docker:
-            docker.close()
+        if ssh:
+            await async_ssh_pool.release(ssh)
         try:
             await websocket.close()
         except:
@@ -464,15 +446,13 @@ async def container_terminal(
     """
     await websocket.accept()
     
-    docker = None
-    channel = None
+    ssh = None
+    process = None
     
     try:
-        from app.core.sh.ssh_client import SSHClient
         from app.modules.node import services as node_services
         from app.modules.node.schemas import NodeRead
         from app.core.db.database import engine as db_engine
-        import paramiko
         
         node_data = node_services.get_node(db_engine, node_id)
         if not node_data:
@@ -480,32 +460,18 @@ async def container_terminal(
             return
         
         node = NodeRead(**node_data)
-        ssh = SSHClient(node)
-        ssh.connect()
-        
-        transport = ssh.client.get_transport()
-        channel = transport.open_session()
-        
-        channel.get_pty(term="xterm", width=120, height=40)
+        ssh = await async_ssh_pool.acquire(node)
         
-        channel.exec_command(f"docker exec -it {container_id} {shell}")
-        
-        await asyncio.sleep(0.2)
+        process = await ssh.open_terminal(f"docker exec -it {container_id} {shell}", width=120, height=40)
         
         async def recv_from_container():
             """从容器接收数据并发送到 WebSocket"""
             while True:
                 try:
-                    if channel.recv_ready():
-                        data = channel.recv(1024)
-                        if data:
-                            text = data.decode('utf-8', errors='replace')
-                            await websocket.send_text(json.dumps({"output": text}))
-                        else:
-                            break
-                    elif channel.exit_status_ready():
+                    text = await process.stdout.read(1024)
+                    if not text:
                         break
-                    await asyncio.sleep(0.01)
+                    await websocket.send_text(json.dumps({"output": text}))
                 except Exception as e:
                     logger.error(f"终端接收错误: {e}")
                     break
@@ -518,13 +484,10 @@ async def container_terminal(
                     msg = json.loads(data)
                     
                     if "input" in msg:
-                        channel.send(msg["input"])
+                        process.stdin.write(msg["input"])
                     elif "resize" in msg:
                         resize = msg["resize"]
-                        channel.resize_pty(
-                            width=resize.get("cols", 120),
-                            height=resize.get("rows", 40)
-                        )
+                        process.change_terminal_size(resize.get("cols", 120), resize.get("rows", 40))
                 except asyncio.TimeoutError:
                     continue
                 except WebSocketDisconnect:
@@ -547,10 +510,10 @@ async def container_terminal(
         except:
             pass
     finally:
-        if channel:
-            channel.close()
-        if docker:
-            docker.close()
+        if process:
+            process.close()
+        if ssh:
+            await async_ssh_pool.release(ssh)
         try:
             await websocket.close()
         except:
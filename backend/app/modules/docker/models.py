@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Table, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
 from app.core.db.database import metadata
 
 
@@ -16,6 +16,8 @@ docker_operation_logs_table = Table(
 
     Column("created_at", DateTime, nullable=False, comment="创建时间"),
 
+    Index("ix_docker_operation_logs_node_created", "node_id", "created_at"),
+
     sqlite_autoincrement=True,
 )
 
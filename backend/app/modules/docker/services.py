@@ -1,8 +1,10 @@
-from app.core.sh.ssh_client import SSHClient
+from app.core.sh.async_ssh_client import AsyncSSHClient
+from app.core.sh.async_ssh_pool import async_ssh_pool
 from app.modules.node.schemas import NodeRead
 from app.modules.node import services as node_services
 from app.core.db.database import engine
 from . import models
+import asyncio
 import json
 import re
 from typing import List, Optional, Tuple
@@ -14,35 +16,37 @@ logger = logging.getLogger(__name__)
 
 
 class DockerService:
-    """Docker 操作服务类"""
+    """Docker 操作服务类（异步 SSH，不阻塞事件循环）"""
     
     def __init__(self, node_id: int):
         self.node_id = node_id
-        self._ssh: Optional[SSHClient] = None
+        self._ssh: Optional[AsyncSSHClient] = None
     
-    def _get_ssh(self) -> SSHClient:
-        """获取 SSH 连接（懒加载模式）"""
+    async def _get_ssh(self) -> AsyncSSHClient:
+        """获取 SSH 连接（懒加载模式，从连接池借出）"""
         if not self._ssh:
-            node_data = node_services.get_node(engine, self.node_id)
+            node_data = await asyncio.to_thread(node_services.get_node, engine, self.node_id)
             if not node_data:
                 raise ValueError(f"节点 {self.node_id} 不存在")
             node = NodeRead(**node_data)
-            self._ssh = SSHClient(node)
-            self._ssh.connect()
+            self._ssh = await async_ssh_pool.acquire(node)
         return self._ssh
     
-    def close(self):
-        """关闭 SSH 连接"""
+    async def close(self):
+        """归还 SSH 连接到连接池"""
         if self._ssh:
             try:
-                self._ssh.close()
+                await async_ssh_pool.release(self._ssh)
             except Exception as e:
-                logger.warning(f"关闭 SSH 连接失败: {e}")
+                logger.warning(f"归还 SSH 连接失败: {e}")
             finally:
                 self._ssh = None
     
-    def _log_operation(self, operation_type: str, action: str, target: str, status: str, message: str = ""):
-        """记录 Docker 操作日志"""
+    async def _log_operation(self, operation_type: str, action: str, target: str, status: str, message: str = ""):
+        """记录 Docker 操作日志（数据库写入放到线程中，不阻塞事件循环）"""
+        await asyncio.to_thread(self._write_operation_log, operation_type, action, target, status, message)
+
+    def _write_operation_log(self, operation_type: str, action: str, target: str, status: str, message: str = ""):
         try:
             with engine.begin() as conn:
                 conn.execute(
@@ -59,7 +63,7 @@ class DockerService:
         except Exception as e:
             logger.error(f"记录操作日志失败: {e}")
     
-    def list_containers(self, all: bool = True) -> List[dict]:
+    async def list_containers(self, all: bool = True) -> List[dict]:
         """
         获取容器列表
         
@@ -69,12 +73,12 @@ class DockerService:
         Returns:
             容器信息列表
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         flag = "-a" if all else ""
         cmd = f"docker ps {flag} --format '{{{{json .}}}}'"
         
         try:
-            _, output, error = ssh.execute_command(cmd, timeout=10)
+            _, output, error = await ssh.execute_command(cmd, timeout=10)
             
             if error and "command not found" in error.lower():
                 raise RuntimeError("Docker 未安装或不在 PATH 中")
@@ -102,18 +106,18 @@ class DockerService:
             logger.error(f"获取容器列表失败: {e}")
             raise
     
-    def list_containers_fast(self) -> List[dict]:
+    async def list_containers_fast(self) -> List[dict]:
         """
         快速获取容器列表（仅运行中的）
         
         Returns:
             运行中的容器列表
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         cmd = "docker ps --format '{{json .}}'"
         
         try:
-            _, output, _ = ssh.execute_command(cmd, timeout=5)
+            _, output, _ = await ssh.execute_command(cmd, timeout=5)
             
             containers = []
             for line in output.strip().split('\n'):
@@ -137,7 +141,7 @@ class DockerService:
             logger.error(f"快速获取容器列表失败: {e}")
             raise
     
-    def container_action(self, container_id: str, action: str) -> Tuple[bool, str]:
+    async def container_action(self, container_id: str, action: str) -> Tuple[bool, str]:
         """
         容器操作（同步模式）
         
@@ -148,7 +152,7 @@ class DockerService:
         Returns:
             (是否成功, 消息)
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         
         valid_actions = ["start", "stop", "restart", "remove"]
         if action not in valid_actions:
@@ -160,22 +164,23 @@ class DockerService:
             cmd = f"docker {action} {container_id}"
         
         try:
-            exit_code, output, error = ssh.execute_command(cmd, timeout=30)
+            # 不设整体超时：docker stop/restart 会等待容器优雅退出（与原来 paramiko 执行时一致）
+            exit_code, output, error = await ssh.execute_command(cmd, timeout=None)
             
             if exit_code == 0:
                 message = f"容器 {container_id} 已{action}"
-                self._log_operation("container", action, container_id, "success", message)
+                await self._log_operation("container", action, container_id, "success", message)
                 return True, message
             else:
                 error_msg = error or output or "操作失败"
-                self._log_operation("container", action, container_id, "failed", error_msg)
+                await self._log_operation("container", action, container_id, "failed", error_msg)
                 return False, error_msg
         except Exception as e:
             error_msg = str(e)
-            self._log_operation("container", action, container_id, "failed", error_msg)
+            await self._log_operation("container", action, container_id, "failed", error_msg)
             return False, error_msg
     
-    def container_action_async(self, container_id: str, action: str) -> Tuple[bool, str]:
+    async def container_action_async(self, container_id: str, action: str) -> Tuple[bool, str]:
         """
         容器操作（异步模式，后台执行）
         
@@ -186,7 +191,7 @@ class DockerService:
         Returns:
             (是否成功, 消息)
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         
         valid_actions = ["start", "stop", "restart", "remove"]
         if action not in valid_actions:
@@ -198,16 +203,16 @@ class DockerService:
             cmd = f"nohup docker {action} {container_id} > /dev/null 2>&1 &"
         
         try:
-            _, _, _ = ssh.execute_command(cmd, timeout=5)
+            _, _, _ = await ssh.execute_command(cmd, timeout=5)
             message = f"容器 {container_id} 正在{action}..."
-            self._log_operation("container", f"{action}_async", container_id, "success", message)
+            await self._log_operation("container", f"{action}_async", container_id, "success", message)
             return True, message
         except Exception as e:
             error_msg = str(e)
-            self._log_operation("container", f"{action}_async", container_id, "failed", error_msg)
+            await self._log_operation("container", f"{action}_async", container_id, "failed", error_msg)
             return False, error_msg
     
-    def get_container_logs(self, container_id: str, tail: int = 100) -> str:
+    async def get_container_logs(self, container_id: str, tail: int = 100) -> str:
         """
         获取容器日志
         
@@ -218,30 +223,30 @@ class DockerService:
         Returns:
             日志内容
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         cmd = f"docker logs --tail {tail} {container_id} 2>&1"
         
         try:
-            _, output, _ = ssh.execute_command(cmd, timeout=30)
+            _, output, _ = await ssh.execute_command(cmd, timeout=30)
             return output
         except Exception as e:
             logger.error(f"获取容器日志失败: {e}")
             raise
     
-    def list_compose_projects(self) -> List[dict]:
+    async def list_compose_projects(self) -> List[dict]:
         """
         列出 Docker Compose 项目（快速版，仅使用 docker compose ls）
         
         Returns:
             Compose 项目列表
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         projects = []
         
         cmd = "docker compose ls --format json 2>/dev/null || docker-compose ls --format json 2>/dev/null"
         
         try:
-            exit_code, output, _ = ssh.execute_command(cmd, timeout=5)
+            exit_code, output, _ = await ssh.execute_command(cmd, timeout=5)
             
             if output.strip():
                 try:
@@ -262,7 +267,7 @@ class DockerService:
             logger.error(f"获取 Compose 项目列表失败: {e}")
             raise
     
-    def list_compose_projects_with_search(self, search_paths: List[str] = None) -> List[dict]:
+    async def list_compose_projects_with_search(self, search_paths: List[str] = None) -> List[dict]:
         """
         列出 Docker Compose 项目（包含目录搜索）
         
@@ -272,12 +277,12 @@ class DockerService:
         Returns:
             Compose 项目列表
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         projects = []
         
         try:
             cmd = "docker compose ls --format json 2>/dev/null || docker-compose ls --format json 2>/dev/null"
-            _, output, _ = ssh.execute_command(cmd, timeout=5)
+            _, output, _ = await ssh.execute_command(cmd, timeout=5)
             
             if output.strip():
                 try:
@@ -297,7 +302,7 @@ class DockerService:
                 search_paths = ["/opt/docker-compose", "/opt/compose", "/root/compose"]
             
             find_cmd = "find " + " ".join(search_paths) + " -name 'docker-compose.yml' -o -name 'docker-compose.yaml' 2>/dev/null"
-            _, output, _ = ssh.execute_command(find_cmd, timeout=10)
+            _, output, _ = await ssh.execute_command(find_cmd, timeout=10)
             
             for filepath in output.strip().split('\n'):
                 if filepath:
@@ -317,7 +322,7 @@ class DockerService:
             logger.error(f"搜索 Compose 项目失败: {e}")
             raise
     
-    def get_compose_file(self, path: str) -> str:
+    async def get_compose_file(self, path: str) -> str:
         """
         读取 Compose 文件内容
         
@@ -330,18 +335,18 @@ class DockerService:
         Raises:
             FileNotFoundError: 未找到 Compose 文件
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         
         for filename in ["docker-compose.yml", "docker-compose.yaml"]:
             filepath = f"{path}/{filename}"
             cmd = f"cat {filepath} 2>/dev/null"
-            _, output, _ = ssh.execute_command(cmd, timeout=10)
+            _, output, _ = await ssh.execute_command(cmd, timeout=10)
             if output.strip():
                 return output
         
         raise FileNotFoundError(f"未找到 compose 文件: {path}")
     
-    def save_compose_file(self, path: str, content: str) -> Tuple[bool, str]:
+    async def save_compose_file(self, path: str, content: str) -> Tuple[bool, str]:
         """
         保存 Compose 文件
         
@@ -352,28 +357,28 @@ class DockerService:
         Returns:
             (是否成功, 消息)
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         
         try:
-            ssh.execute_command(f"mkdir -p {path}")
+            await ssh.execute_command(f"mkdir -p {path}")
             
             cmd = f"cat > {path}/docker-compose.yml << 'EOFCOMPOSE'\n{content}\nEOFCOMPOSE"
-            exit_code, output, error = ssh.execute_command(cmd, timeout=10)
+            exit_code, output, error = await ssh.execute_command(cmd, timeout=10)
             
             if exit_code == 0:
                 message = "保存成功"
-                self._log_operation("compose", "save_file", path, "success", message)
+                await self._log_operation("compose", "save_file", path, "success", message)
                 return True, message
             else:
                 error_msg = error or "保存失败"
-                self._log_operation("compose", "save_file", path, "failed", error_msg)
+                await self._log_operation("compose", "save_file", path, "failed", error_msg)
                 return False, error_msg
         except Exception as e:
             error_msg = str(e)
-            self._log_operation("compose", "save_file", path, "failed", error_msg)
+            await self._log_operation("compose", "save_file", path, "failed", error_msg)
             return False, error_msg
     
-    def compose_action(self, path: str, action: str, services: List[str] = None) -> Tuple[bool, str]:
+    async def compose_action(self, path: str, action: str, services: List[str] = None) -> Tuple[bool, str]:
         """
         Compose 项目操作
         
@@ -385,11 +390,11 @@ class DockerService:
         Returns:
             (是否成功, 消息)
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         
         try:
             cmd_check = "docker compose version &>/dev/null && echo 'docker compose' || echo 'docker-compose'"
-            _, compose_cmd, _ = ssh.execute_command(cmd_check, timeout=5)
+            _, compose_cmd, _ = await ssh.execute_command(cmd_check, timeout=5)
             compose_cmd = compose_cmd.strip()
             
             service_str = " ".join(services) if services else ""
@@ -405,22 +410,23 @@ class DockerService:
             else:
                 return False, f"无效操作: {action}"
             
-            exit_code, output, error = ssh.execute_command(cmd, timeout=120)
+            # 不设整体超时：compose pull/up 可能持续很久（与原来 paramiko 执行时一致）
+            exit_code, output, error = await ssh.execute_command(cmd, timeout=None)
             
             if exit_code == 0:
                 message = output or "操作成功"
-                self._log_operation("compose", action, path, "success", message)
+                await self._log_operation("compose", action, path, "success", message)
                 return True, message
             else:
                 error_msg = error or output or "操作失败"
-                self._log_operation("compose", action, path, "failed", error_msg)
+                await self._log_operation("compose", action, path, "failed", error_msg)
                 return False, error_msg
         except Exception as e:
             error_msg = str(e)
-            self._log_operation("compose", action, path, "failed", error_msg)
+            await self._log_operation("compose", action, path, "failed", error_msg)
             return False, error_msg
     
-    def exec_container(self, container_id: str, command: str) -> Tuple[bool, str]:
+    async def exec_container(self, container_id: str, command: str) -> Tuple[bool, str]:
         """
         在容器中执行命令
         
@@ -431,23 +437,24 @@ class DockerService:
         Returns:
             (是否成功, 输出内容)
         """
-        ssh = self._get_ssh()
+        ssh = await self._get_ssh()
         cmd = f"docker exec {container_id} {command}"
         
         try:
-            exit_code, output, error = ssh.execute_command(cmd, timeout=30)
+            # 用户命令的耗时未知，不设整体超时
+            exit_code, output, error = await ssh.execute_command(cmd, timeout=None)
             if exit_code == 0:
-                self._log_operation("container", "exec", container_id, "success", output)
+                await self._log_operation("container", "exec", container_id, "success", output)
                 return True, output or ""
             else:
                 error_msg = error or "执行失败"
-                self._log_operation("container", "exec", container_id, "failed", error_msg)
+                await self._log_operation("container", "exec", container_id, "failed", error_msg)
                 return False, error_msg
         except Exception as e:
             error_msg = str(e)
-            self._log_operation("container", "exec", container_id, "failed", error_msg)
+            await self._log_operation("container", "exec", container_id, "failed", error_msg)
             return False, error_msg
     
-    def get_ssh_client(self) -> SSHClient:
+    async def get_ssh_client(self) -> AsyncSSHClient:
         """获取 SSH 客户端（用于 WebSocket）"""
-        return self._get_ssh()
+        return await self._get_ssh()
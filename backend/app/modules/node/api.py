@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException,WebSocket
 from fastapi.params import Body
-from app.core.sh.ssh_client import SSHClient
+from app.core.sh.ssh_pool import ssh_pool
 from app.core.db.database import engine, metadata, logger
 from . import services, schemas, models
 from .schemas import NodeRequest
@@ -21,9 +21,8 @@ def test_node_connection(node_id: int):
     if not node:
         raise NotFoundException(detail="节点不存在")
     try:
-        ssh_client = SSHClient(schemas.NodeRead(**node))
-        ssh_client.connect()
-        ssh_client.close()
+        with ssh_pool.session(schemas.NodeRead(**node)) as ssh:
+            ssh.execute_command("true", timeout=10)
         return BaseResponse.success(message="连接成功")
     except Exception as e:
         raise ServerException(str(e))
@@ -14,6 +14,7 @@ nodes_table = Table(
     Column("password", Text),
     Column("private_key", Text),
     Column("is_active", Boolean, default=True),
+    Column("tags", String(255)),  # 逗号分隔的标签，用于批量选择节点
     sqlite_autoincrement=True,
 
 )
@@ -11,6 +11,7 @@ class NodeBase(BaseModel):
     password: Optional[str] = None
     private_key: Optional[str] = None
     is_active: bool = True
+    tags: Optional[str] = None  # 逗号分隔
 
 
     # def decrypt_sensitive_fields(self):
@@ -1,6 +1,6 @@
 from typing import Dict
 
-from sqlalchemy import select, insert, update, delete, desc
+from sqlalchemy import select, insert, update, delete, desc, or_
 from sqlalchemy.engine import Engine
 
 from sqlalchemy.exc import IntegrityError
@@ -12,6 +12,8 @@ from .schemas import NodeCreate, CredentialTemplateCreate
 from ..cron.models import cron_jobs_table
 from ...core.exception.exceptions import ExistedException, ValidationException
 from ...core.scheduler import scheduler_service
+from ...core.sh.ssh_pool import ssh_pool
+from ...core.sh.async_ssh_pool import async_ssh_pool
 
 
 def create_node(engine: Engine, node: schemas.NodeCreate) -> dict:
@@ -46,11 +48,19 @@ def get_node(engine: Engine, node_id: int) -> dict:
         # node_read = schemas.NodeRead(**dict(result))
         # return node_read.decrypt_sensitive_fields().model_dump()
 
+
+def _invalidate_connections(node_id: int):
+    """使节点在同步/异步连接池中的连接失效"""
+    ssh_pool.invalidate(node_id)
+    async_ssh_pool.invalidate(node_id)
+
+
 def delete_node(engine: Engine, node_id: int) -> bool:
     stmt = delete(models.nodes_table).where(models.nodes_table.c.id == node_id)
     with engine.begin() as conn:
         result = conn.execute(stmt)
-        return result.rowcount > 0
+    _invalidate_connections(node_id)
+    return result.rowcount > 0
 
 def toggle_node_status(engine: Engine, node_id: int, is_active: bool) -> bool:
     with engine.begin() as conn:
@@ -63,17 +73,33 @@ def toggle_node_status(engine: Engine, node_id: int, is_active: bool) -> bool:
         if result.rowcount == 0:
             return False
 
-        # 2️⃣ 查询该节点下所有任务
+        # 2️⃣ 查询该节点下所有任务（多节点任务的目标可能包含该节点，一并检查）
         jobs = conn.execute(
             select(cron_jobs_table)
-            .where(cron_jobs_table.c.node_id == node_id)
+            .where(or_(
+                cron_jobs_table.c.node_id == node_id,
+                cron_jobs_table.c.target_node_ids.isnot(None),
+                cron_jobs_table.c.target_tag.isnot(None),
+            ))
         ).mappings().all()
 
+    # 节点停用：关闭已缓存的 SSH 连接
+    if not is_active:
+        _invalidate_connections(node_id)
+
     # 3️⃣ 同步调度器（事务外）
+    from ..cron.fanout import is_fanout, job_targets
     for job in jobs:
         full_job_id = f"cron_jobs:{job['id']}"
 
-        if is_active:
+        if is_fanout(job):
+            # 多节点任务：还有启用的目标节点就保持调度，与 node_id 无关
+            if job["is_active"] and job_targets(engine, job):
+                if full_job_id not in scheduler_service.job_ids:
+                    _add_job_to_scheduler(job)
+            else:
+                scheduler_service.remove_job(full_job_id)
+        elif is_active:
             # 节点恢复：只恢复原本启用的任务
             if job["is_active"]:
                 # 检查任务是否已在调度器中
@@ -81,8 +107,7 @@ def toggle_node_status(engine: Engine, node_id: int, is_active: bool) -> bool:
                     _add_job_to_scheduler(job)
         else:
             # 节点停用：全部从调度器移除
-            if full_job_id in scheduler_service.job_ids:
-                scheduler_service.remove_job(full_job_id)
+            scheduler_service.remove_job(full_job_id)
 
     return True
 def _add_job_to_scheduler(job:Dict) -> bool:
@@ -118,7 +143,10 @@ def update_node(engine: Engine, node_id: int, node: NodeCreate) -> dict:
         # 返回更新后的数据
         select_stmt = select(nodes_table).where(nodes_table.c.id == node_id)
         row = conn.execute(select_stmt).mappings().first()
-        return dict(row)
+
+    # 凭据可能已变更，旧连接全部失效
+    _invalidate_connections(node_id)
+    return dict(row)
 
 def batch_delete_nodes(engine: Engine, node_ids: list[int]) -> int:
     """批量删除节点，返回成功删除的数量"""
@@ -146,6 +174,9 @@ def batch_delete_nodes(engine: Engine, node_ids: list[int]) -> int:
                 print(f"删除节点 {node_id} 失败: {e}")
                 # 继续处理其他节点
 
+    for node_id in node_ids:
+        _invalidate_connections(node_id)
+
     return deleted_count
 
 def create_credential_template(engine, template_data):
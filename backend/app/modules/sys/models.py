@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, String, Boolean, DateTime, func
+from sqlalchemy import Table, Column, Integer, String, Boolean, DateTime, Index, func
 from app.core.db.database import metadata
 
 # 系统配置表
@@ -20,6 +20,7 @@ login_failed_records_table = Table(
     Column("ip_address", String(45), nullable=False, comment="IP地址"),
     Column("failed_time", DateTime, nullable=False, server_default=func.now(), comment="失败时间"),
     Column("user_agent", String(500), comment="用户代理"),
+    Index("ix_login_failed_records_ip_time", "ip_address", "failed_time"),  # 每次登录按 IP + 时间窗口统计
     sqlite_autoincrement=True
 )
 
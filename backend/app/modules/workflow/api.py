@@ -97,6 +97,28 @@ async def get_execution(
     return BaseResponse.success(result)
 
 
+@router.post("/executions/{execution_id}/resume")
+async def resume_execution(
+    execution_id: int,
+    engine=Depends(get_engine)
+):
+    """从失败处恢复执行（已成功的节点沿用原结果）"""
+    try:
+        service = WorkflowService(engine)
+        if not service.get_execution(execution_id):
+            return BaseResponse.error(404, f"执行记录不存在: {execution_id}")
+        
+        new_execution_id = service.resume(execution_id)
+        return BaseResponse.success(
+            {"execution_id": new_execution_id},
+            message="工作流已从失败处恢复执行"
+        )
+    except ValueError as e:
+        return BaseResponse.error(400, str(e))
+    except Exception as e:
+        return BaseResponse.error(500, str(e))
+
+
 @router.get("/executions/{execution_id}/nodes")
 async def get_node_executions(
     execution_id: int,
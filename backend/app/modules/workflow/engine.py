@@ -6,12 +6,19 @@
 """
 import logging
 import asyncio
-import re
+import os
+import hashlib
 import json
+from collections import deque
 from typing import Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import select, update, func
 
+from app.core.cluster import PROCESS_ID
+from app.core.db.write_queue import db_writer
+from app.modules.workflow.expression import ExpressionCache, default_expression_cache
+from app.modules.workflow.graph import WorkflowGraph, graph_cache
+from app.modules.workflow.limits import WORKFLOW_MAX_PARALLEL, WORKFLOW_PARK_AFTER, task_slots
 from app.modules.workflow.models import (
     workflows_table,
     workflow_executions_table,
@@ -21,21 +28,16 @@ from app.modules.workflow.models import (
 logger = logging.getLogger(__name__)
 
 
-class AttrDict(dict):
-    """支持属性访问的字典类（支持嵌套访问）"""
-    def __getattr__(self, key):
-        try:
-            value = self[key]
-            # 如果值是字典，自动包装成 AttrDict 以支持嵌套访问
-            if isinstance(value, dict) and not isinstance(value, AttrDict):
-                return AttrDict(value)
-            return value
-        except KeyError:
-            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{key}'")
+class WorkflowVariableResolver:
+    """工作流变量解析器
 
+    模板和条件表达式按文本编译一次后缓存：执行中的工作流使用其编译图上的缓存
+    （state["expressions"]，随工作流版本更新），其余调用使用全局缓存。
+    """
 
-class WorkflowVariableResolver:
-    """工作流变量解析器"""
+    @staticmethod
+    def _cache(state: Dict[str, Any]) -> ExpressionCache:
+        return state.get("expressions") or default_expression_cache
 
     @staticmethod
     def resolve(value: str, state: Dict[str, Any]) -> Any:
@@ -52,32 +54,15 @@ class WorkflowVariableResolver:
         if not isinstance(value, str):
             return value
 
-        pattern = r'\{\{\s*([a-zA-Z0-9_.]+)\s*\}\}'
-
-        def replace_var(match):
-            var_path = match.group(1)
-            parts = var_path.split('.')
-
-            current = state
-            for part in parts:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                else:
-                    return match.group(0)  # 找不到则保留原样
-
-            return str(current) if current is not None else ''
-
-        result = re.sub(pattern, replace_var, value)
+        return WorkflowVariableResolver._cache(state).template(value).render(state)
 
-        # 如果没有变化，直接返回
-        if result == value:
+    @staticmethod
+    def resolve_value(value: str, state: Dict[str, Any]) -> Any:
+        """与 resolve 相同，但整个字符串只是一个变量时返回变量原值（如列表）"""
+        if not isinstance(value, str):
             return value
 
-        # 尝试解析为 JSON
-        try:
-            return json.loads(result)
-        except (json.JSONDecodeError, TypeError):
-            return result
+        return WorkflowVariableResolver._cache(state).template(value).value(state)
 
     @staticmethod
     def evaluate_condition(expression: str, state: Dict[str, Any]) -> bool:
@@ -92,30 +77,151 @@ class WorkflowVariableResolver:
             条件结果
         """
         try:
-            resolved_expr = WorkflowVariableResolver.resolve(expression, state)
-
-            # 安全的全局变量
-            safe_globals = {
-                '__builtins__': {},
-                'True': True,
-                'False': False,
-                'None': None,
-                'inputs': AttrDict(state.get('inputs', {})),
-                'outputs': AttrDict(state.get('outputs', {}))
-            }
-
-            result = eval(str(resolved_expr), safe_globals, {})
-            return bool(result)
+            return WorkflowVariableResolver._cache(state).condition(str(expression)).evaluate(state)
         except Exception as e:
             logger.error(f"条件表达式评估失败: {expression}, error: {e}")
             return False
 
 
+class NodeLogBuffer:
+    """
+    节点日志内存缓冲
+
+    每个节点执行记录的完整日志保存在内存中，新增日志只标记为待写入；
+    定时（flush_interval 秒）或节点结束时把待写入节点的日志整体写回，
+    一次写入（一个事务）覆盖所有待写入节点，不再逐条 SELECT + UPDATE。
+    进程崩溃时最多丢失一个写入周期内的日志。
+    """
+
+    def __init__(self, engine, flush_interval: float = 1.0):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.logs: Dict[int, list] = {}  # node_execution_id -> 完整日志
+        self.dirty: set = set()
+        self._lock: Optional[asyncio.Lock] = None  # 串行化写入，避免旧快照覆盖新快照
+        self._timer: Optional[asyncio.Task] = None
+
+    def add(self, node_execution_id: int, entry: dict):
+        self.logs.setdefault(node_execution_id, []).append(entry)
+        self.dirty.add(node_execution_id)
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_loop())
+
+    def load(self, node_execution_id: int, logs: list):
+        """载入已写入数据库的日志（挂起的节点被唤醒后继续追加）"""
+        self.logs[node_execution_id] = list(logs or [])
+
+    def take(self, node_execution_id: int) -> Optional[list]:
+        """取出单个节点的日志快照（由调用方随状态更新一起写入）"""
+        if node_execution_id not in self.dirty:
+            return None
+        self.dirty.discard(node_execution_id)
+        return list(self.logs[node_execution_id])
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def flush(self):
+        """写入所有待写入节点的日志"""
+        async with self.lock:
+            if not self.dirty:
+                return
+            snapshot = {node_execution_id: list(self.logs[node_execution_id]) for node_execution_id in self.dirty}
+            self.dirty.clear()
+
+            def write(conn):
+                for node_execution_id, logs in snapshot.items():
+                    conn.execute(
+                        update(workflow_node_executions_table)
+                        .where(workflow_node_executions_table.c.id == node_execution_id)
+                        .values(logs=logs)
+                    )
+
+            try:
+                await asyncio.to_thread(db_writer.execute, write)
+            except Exception as e:
+                logger.error(f"写入节点日志失败: {e}")
+
+    async def _flush_loop(self):
+        while self.dirty:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        """停止定时写入并写入剩余日志"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+
+class DagScheduler:
+    """
+    入度计数的就绪判定
+
+    每个节点完成（或被跳过）时调用 resolve，对每个后置节点：
+    - 普通 / OR 节点：第一次被路由到即就绪
+    - AND 节点：所有前置节点都已决（完成或跳过）后，被路由到且前置全部成功才就绪
+    - 所有前置都已决但不满足执行条件的节点标记为跳过，并继续向下传播
+    """
+
+    def __init__(self, graph: WorkflowGraph):
+        self.graph = graph
+        self.pending = dict(graph.join_counts)  # 未决的前置节点数
+        self.activated: set = set()  # 至少被一个前置节点路由到
+        self.blocked: set = set()  # 存在未成功的前置节点（AND 节点不会执行）
+        self.finished: set = set()  # 已派发或已跳过
+        self.skipped: list = []
+
+    def mark_dispatched(self, node_ids) -> None:
+        self.finished.update(node_ids)
+
+    def resolve(self, node_id: str, status: str, routed: list) -> list:
+        """节点完成，返回新就绪的节点ID"""
+        ready = []
+        stack = [(node_id, status, set(routed))]
+        while stack:
+            source, source_status, source_routed = stack.pop()
+            for target in dict.fromkeys(self.graph.next_ids(source)):
+                node = self.graph.node(target)
+                if node is None or target in self.finished:
+                    continue
+                self.pending[target] -= 1
+                if target in source_routed:
+                    self.activated.add(target)
+                if source_status != "success":
+                    self.blocked.add(target)
+
+                if node.get("type", "task") == "and":
+                    if self.pending[target] > 0:
+                        continue
+                    run = target in self.activated and target not in self.blocked
+                else:
+                    if target in self.activated:
+                        run = True
+                    elif self.pending[target] > 0:
+                        continue
+                    else:
+                        run = False
+
+                self.finished.add(target)
+                if run:
+                    ready.append(target)
+                else:
+                    self.skipped.append(target)
+                    stack.append((target, "skipped", set()))
+        return ready
+
+
 class WorkflowEngine:
     """工作流执行引擎"""
 
     def __init__(self, engine):
         self.engine = engine
+        self.node_logs = NodeLogBuffer(engine, float(os.getenv("WORKFLOW_LOG_FLUSH_INTERVAL", "1.0")))
 
     async def execute_workflow(self, execution_id: int):
         """
@@ -144,24 +250,48 @@ class WorkflowEngine:
             "inputs": execution.get("inputs", {}),
             "outputs": {},
             "executed_nodes": set(),  # 跟踪已执行的节点
-            "workflow": workflow
+            "workflow": workflow,
+            "parked": {},  # 本次挂起的等待节点: node_id -> 唤醒时间
         }
 
+        if execution.get("wake_at"):
+            # 挂起后被唤醒：重放本执行已完成节点的结果，从等待节点继续
+            await self._load_parked_state(execution_id, state)
+            logger.info(f"唤醒执行: execution_id={execution_id}, 等待节点: {list(state['waiting'])}")
+        elif execution.get("resume_from"):
+            # 从失败处恢复：原执行中已成功节点的结果直接沿用
+            resume_from = execution["resume_from"]
+            rows = await self._load_node_rows(resume_from)
+            state["resume_from"] = resume_from
+            state["replayed"] = {
+                row["node_id"]: self._row_result(row) for row in rows if row["status"] == "success"
+            }
+            state["outputs"].update(state["replayed"])
+            logger.info(f"恢复执行: execution_id={execution_id}, resume_from={resume_from}, "
+                        f"沿用节点: {list(state['replayed'])}")
+
         logger.info(f"工作流执行开始: {workflow_id}, execution_id={execution_id}, inputs={state['inputs']}")
 
         # 更新执行状态为运行中
         await self._update_execution(execution_id, "running")
 
         try:
-            # 获取起始节点（没有入边的节点）
-            nodes = workflow.get("nodes", [])
-            edges = workflow.get("edges", [])
-
-            start_nodes = self._find_start_nodes(nodes, edges)
-
-            # 执行起始节点
-            for node in start_nodes:
-                await self._execute_node(execution_id, node, state, nodes, edges)
+            # 编译（或取缓存的）工作流图，起始节点为没有入边的节点
+            graph = graph_cache.get(workflow)
+            state["expressions"] = graph.expressions
+
+            # 按就绪队列调度执行所有节点
+            await self._run_graph(execution_id, graph, state,
+                                  workflow.get("max_parallel") or WORKFLOW_MAX_PARALLEL)
+
+            if state["parked"]:
+                # 有挂起的等待节点：执行暂停，到最早的唤醒时间由运行时定时器唤醒
+                wake_at = min(state["parked"].values())
+                await self._update_execution(execution_id, "waiting", wake_at=wake_at)
+                from .runtime import workflow_runtime
+                workflow_runtime.start_timers(self.engine)
+                logger.info(f"工作流挂起: {workflow_id}, execution_id={execution_id}, 唤醒时间: {wake_at}")
+                return
 
             # 更新执行状态为成功
             await self._update_execution(execution_id, "success")
@@ -170,9 +300,51 @@ class WorkflowEngine:
         except Exception as e:
             logger.error(f"工作流执行失败: {workflow_id}, error: {e}")
             await self._update_execution(execution_id, "failed", error=str(e))
+        finally:
+            await self.node_logs.close()
 
-    async def _execute_node(self, execution_id: int, node: Dict, state: Dict,
-                            all_nodes: list, all_edges: list):
+    async def _run_graph(self, execution_id: int, graph: WorkflowGraph, state: Dict, max_parallel: int):
+        """
+        就绪队列调度
+
+        节点完成后由 DagScheduler 按入度计数算出新就绪的节点，放入就绪队列；
+        同时运行的节点数不超过 max_parallel。不再逐层递归创建任务，
+        深层或很宽的图都只占用 max_parallel 个协程。
+        """
+        scheduler = DagScheduler(graph)
+        ready = deque(node.get("id") for node in graph.start_nodes)
+        scheduler.mark_dispatched(ready)
+        running: Dict[asyncio.Task, str] = {}
+
+        try:
+            while ready or running:
+                while ready and len(running) < max_parallel:
+                    node_id = ready.popleft()
+                    task = asyncio.ensure_future(self._execute_node(execution_id, graph.node(node_id), state, graph))
+                    running[task] = node_id
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = running.pop(task)
+                    try:
+                        status, routed = task.result()
+                    except Exception as e:
+                        logger.error(f"节点执行失败: {node_id}, error: {e}")
+                        status, routed = "failed", []
+                    if status == "waiting":
+                        # 等待节点已挂起，后续节点在唤醒后再调度
+                        continue
+                    ready.extend(scheduler.resolve(node_id, status, routed))
+        finally:
+            for task in running:
+                task.cancel()
+
+        # 未被路由到的分支记录为跳过（唤醒时已记录过的不重复记录）
+        skipped = [node_id for node_id in scheduler.skipped if node_id not in state.get("recorded_skipped", ())]
+        if skipped:
+            await self._record_skipped_nodes(execution_id, graph, skipped)
+
+    async def _execute_node(self, execution_id: int, node: Dict, state: Dict, graph: WorkflowGraph):
         """
         执行单个节点
 
@@ -180,8 +352,10 @@ class WorkflowEngine:
             execution_id: 执行记录ID
             node: 节点定义
             state: 当前状态
-            all_nodes: 所有节点
-            all_edges: 所有边
+            graph: 编译后的工作流图
+
+        Returns:
+            (节点状态, 路由到的后置节点ID列表)
         """
         node_id = node.get("id")
         node_type = node.get("type", "task")
@@ -191,11 +365,19 @@ class WorkflowEngine:
         # 检查节点是否已经执行过
         if node_id in state["executed_nodes"]:
             logger.info(f"节点 {node_id} 已经执行过，跳过")
-            return
+            return "success", []
 
         # 标记节点为已执行
         state["executed_nodes"].add(node_id)
 
+        # 恢复或唤醒时已有结果的节点
+        if node_id in state.get("replayed", {}):
+            return await self._replay_node(execution_id, node, state, graph)
+
+        # 唤醒时挂起中的等待节点
+        if node_id in state.get("waiting", {}):
+            return await self._wake_wait_node(node, state, graph)
+
         # 开始节点
         if node_type == "start":
             logger.info(f"开始节点: {node_name}")
@@ -206,10 +388,7 @@ class WorkflowEngine:
             )
 
             # 获取后置节点
-            next_nodes = []
-            for edge in all_edges:
-                if edge.get("source") == node_id:
-                    next_nodes.append(edge.get("target"))
+            next_nodes = graph.next_ids(node_id)
 
             # 记录节点开始执行
             await self._add_node_log(node_execution_id, f"节点开始执行: {node_name} ({node_type})", "info")
@@ -219,9 +398,8 @@ class WorkflowEngine:
             # 更新节点状态为成功
             await self._update_node_execution(node_execution_id, "success", output="开始节点")
 
-            # 执行后续节点
-            await self._execute_next_nodes(execution_id, node_id, "success", state, all_nodes, all_edges, node_execution_id)
-            return
+            # 路由到后续节点
+            return "success", await self._route(node_id, "success", state, graph, node_execution_id)
 
         # 结束节点
         if node_type == "end":
@@ -233,10 +411,7 @@ class WorkflowEngine:
             )
 
             # 获取前置节点
-            prev_nodes = []
-            for edge in all_edges:
-                if edge.get("target") == node_id:
-                    prev_nodes.append(edge.get("source"))
+            prev_nodes = graph.prev_ids(node_id)
 
             # 记录节点开始执行
             await self._add_node_log(node_execution_id, f"节点开始执行: {node_name} ({node_type})", "info")
@@ -245,7 +420,7 @@ class WorkflowEngine:
 
             # 更新节点状态为成功
             await self._update_node_execution(node_execution_id, "success", output="结束节点")
-            return
+            return "success", []
 
         # AND 和 OR 节点需要创建执行记录来记录日志
         if node_type in ["and", "or"]:
@@ -255,13 +430,8 @@ class WorkflowEngine:
             )
 
             # 获取前置节点和后置节点
-            prev_nodes = []
-            next_nodes = []
-            for edge in all_edges:
-                if edge.get("target") == node_id:
-                    prev_nodes.append(edge.get("source"))
-                elif edge.get("source") == node_id:
-                    next_nodes.append(edge.get("target"))
+            prev_nodes = graph.prev_ids(node_id)
+            next_nodes = graph.next_ids(node_id)
 
             # 记录节点开始执行
             await self._add_node_log(node_execution_id, f"节点开始执行: {node_name} ({node_type})", "info")
@@ -273,9 +443,9 @@ class WorkflowEngine:
 
             # 根据节点类型执行
             if node_type == "and":
-                result = await self._execute_and_node(node, config, state, node_execution_id, all_edges)
+                result = await self._execute_and_node(node, config, state, node_execution_id)
             elif node_type == "or":
-                result = await self._execute_or_node(node, config, state, node_execution_id, all_edges)
+                result = await self._execute_or_node(node, config, state, node_execution_id)
 
             # 更新节点状态
             await self._update_node_execution(
@@ -291,10 +461,9 @@ class WorkflowEngine:
             state["outputs"][node_id] = result
             logger.info(f"节点执行完成: {node_id}, 状态: {result.get('status')}, 结果: {result}")
 
-            # 执行后续节点
-            await self._execute_next_nodes(execution_id, node_id, result.get("status", "success"),
-                                           state, all_nodes, all_edges, node_execution_id)
-            return
+            # 路由到后续节点
+            status = result.get("status", "success")
+            return status, await self._route(node_id, status, state, graph, node_execution_id)
 
         # 创建节点执行记录
         node_execution_id = await self._create_node_execution(
@@ -302,13 +471,8 @@ class WorkflowEngine:
         )
 
         # 获取前置节点和后置节点
-        prev_nodes = []
-        next_nodes = []
-        for edge in all_edges:
-            if edge.get("target") == node_id:
-                prev_nodes.append(edge.get("source"))
-            elif edge.get("source") == node_id:
-                next_nodes.append(edge.get("target"))
+        prev_nodes = graph.prev_ids(node_id)
+        next_nodes = graph.next_ids(node_id)
 
         # 记录节点开始执行
         await self._add_node_log(node_execution_id, f"节点开始执行: {node_name} ({node_type})", "info")
@@ -321,7 +485,9 @@ class WorkflowEngine:
         try:
             # 根据节点类型执行
             if node_type == "task":
-                result = await self._execute_task_node(node, config, state)
+                result = await self._execute_cached_task_node(node_execution_id, node, config, state)
+            elif node_type == "map":
+                result = await self._execute_map_node(node_execution_id, node, config, state)
             elif node_type == "condition":
                 result = await self._execute_condition_node(node, config, state)
             elif node_type == "wait":
@@ -331,12 +497,22 @@ class WorkflowEngine:
             else:
                 result = {"status": "success", "output": f"未知节点类型: {node_type}"}
 
+            # 长时间等待：节点挂起，执行暂停后由定时器唤醒
+            if result.get("status") == "waiting":
+                await self._add_node_log(node_execution_id, f"挂起等待，唤醒时间: {result['wake_at']}", "info")
+                await self._update_node_execution(
+                    node_execution_id, "waiting", output=result.get("output"), wake_at=result["wake_at"]
+                )
+                state["parked"][node_id] = result["wake_at"]
+                return "waiting", []
+
             # 更新节点状态
             await self._update_node_execution(
                 node_execution_id,
                 result.get("status", "success"),
                 output=result.get("output"),
-                error=result.get("error")
+                error=result.get("error"),
+                cache_key=result.pop("cache_key", None)
             )
 
             # 记录节点完成
@@ -349,9 +525,9 @@ class WorkflowEngine:
             state["outputs"][node_id] = result
             logger.info(f"节点执行完成: {node_id}, 状态: {result.get('status')}, 结果: {result}")
 
-            # 执行后续节点
-            await self._execute_next_nodes(execution_id, node_id, result.get("status", "success"),
-                                           state, all_nodes, all_edges)
+            # 路由到后续节点
+            status = result.get("status", "success")
+            return status, await self._route(node_id, status, state, graph)
 
         except Exception as e:
             logger.error(f"节点执行失败: {node_name}, error: {e}")
@@ -359,6 +535,104 @@ class WorkflowEngine:
             await self._add_node_log(node_execution_id, f"节点执行异常: {str(e)}", "error")
             state["outputs"][node_id] = {"status": "failed", "error": str(e)}
             logger.info(f"节点执行异常: {node_id}, 状态: failed, 错误: {str(e)}")
+            return "failed", []
+
+    async def _replay_node(self, execution_id: int, node: Dict, state: Dict, graph: WorkflowGraph):
+        """重放已有结果并路由到后续节点
+
+        从失败处恢复时把沿用的结果记录为本次执行的节点；
+        唤醒挂起的执行时节点记录已存在，只做路由。
+        """
+        node_id = node.get("id")
+        result = state["replayed"][node_id]
+        status = result.get("status", "success")
+
+        node_execution_id = None
+        if state.get("resume_from"):
+            node_execution_id = await self._create_node_execution(
+                execution_id, node_id, node.get("name", node_id), node.get("type", "task")
+            )
+            await self._add_node_log(node_execution_id, f"沿用执行 #{state['resume_from']} 的结果，跳过执行", "info")
+            await self._update_node_execution(node_execution_id, status, output=result.get("output"))
+            logger.info(f"节点沿用原结果: {node_id}, resume_from={state['resume_from']}")
+
+        return status, await self._route(node_id, status, state, graph, node_execution_id)
+
+    async def _wake_wait_node(self, node: Dict, state: Dict, graph: WorkflowGraph):
+        """唤醒挂起的等待节点：到时间则完成并路由，否则继续挂起"""
+        node_id = node.get("id")
+        row = state["waiting"][node_id]
+        remaining = (row["wake_at"] - datetime.now()).total_seconds()
+        if remaining >= WORKFLOW_PARK_AFTER:
+            state["parked"][node_id] = row["wake_at"]
+            return "waiting", []
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+        node_execution_id = row["id"]
+        self.node_logs.load(node_execution_id, row["logs"])
+        result = {"status": "success", "output": f"等待至 {row['wake_at']} 完成"}
+        await self._add_node_log(node_execution_id, "等待结束，继续执行", "success")
+        await self._update_node_execution(node_execution_id, "success", output=result["output"])
+
+        state["outputs"][node_id] = result
+        logger.info(f"等待节点唤醒: {node_id}")
+        return "success", await self._route(node_id, "success", state, graph, node_execution_id)
+
+    async def _execute_cached_task_node(self, node_execution_id: int, node: Dict, config: Dict, state: Dict) -> Dict:
+        """
+        执行任务节点（可选结果缓存）
+
+        节点配置 cache_ttl（秒）大于 0 时开启：节点配置和解析后的输入相同、
+        且 cache_ttl 秒内有成功结果时直接沿用，不再执行任务。
+        """
+        try:
+            ttl = int(config.get("cache_ttl") or 0)
+        except (TypeError, ValueError):
+            ttl = 0
+        if ttl <= 0:
+            return await self._execute_task_node(node, config, state)
+
+        try:
+            cache_key = await self._task_cache_key(node, config, state)
+        except Exception as e:
+            logger.warning(f"计算结果缓存键失败，直接执行: {node.get('id')}, error: {e}")
+            return await self._execute_task_node(node, config, state)
+
+        cached = await self._find_cached_result(cache_key, ttl)
+        if cached:
+            await self._add_node_log(
+                node_execution_id,
+                f"命中结果缓存: 沿用执行 #{cached['execution_id']} 的结果（缓存 {ttl} 秒）",
+                "info"
+            )
+            # 命中的记录不写缓存键，缓存从首次执行起计时
+            return {"status": "success", "output": cached["output"] or "", "error": ""}
+
+        result = await self._execute_task_node(node, config, state)
+        result["cache_key"] = cache_key
+        return result
+
+    async def _task_cache_key(self, node: Dict, config: Dict, state: Dict) -> str:
+        """结果缓存键：节点配置 + 解析后的输入（cron 任务为替换参数后的命令和目标节点）"""
+        material = {
+            "workflow_id": state["workflow"].get("workflow_id"),
+            "node_id": node.get("id"),
+            "config": config,
+        }
+        if config.get("job_type", "cron") == "cron":
+            from app.modules.cron.services import _prepare_job
+            job, _, command, _ = await asyncio.to_thread(
+                _prepare_job, self.engine, int(config.get("job_id")),
+                state.get("inputs", {}), state.get("outputs", {})
+            )
+            material["command"] = command
+            material["target"] = [job["node_id"], job.get("target_node_ids"), job.get("target_tag")]
+        else:
+            material["inputs"] = state.get("inputs", {})
+
+        raw = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
     async def _execute_task_node(self, node: Dict, config: Dict, state: Dict) -> Dict:
         """执行任务节点"""
@@ -377,26 +651,25 @@ class WorkflowEngine:
             logger.info(f"任务节点输入参数: {inputs}")
             logger.info(f"任务节点输出参数: {outputs}")
 
-            if job_type == "cron":
-                # 执行 cron 任务
-                from app.modules.cron.services import execute_job
-                loop = asyncio.get_running_loop()
-                result = await loop.run_in_executor(
-                    None,
-                    lambda: execute_job(self.engine, int(job_id), "workflow", inputs, outputs)
-                )
-            elif job_type == "acme":
-                # 执行 acme 证书申请任务
-                from app.modules.acme.services import ApplicationService
-                acme_service = ApplicationService(self.engine)
-                loop = asyncio.get_running_loop()
-                result = await loop.run_in_executor(
-                    None,
-                    lambda: acme_service.execute(int(job_id), "workflow")
-                )
-            else:
+            if job_type not in ("cron", "acme"):
                 return {"status": "failed", "error": f"不支持的任务类型: {job_type}"}
 
+            # 占用全局任务名额，所有工作流同时运行的任务节点数受 WORKFLOW_MAX_CONCURRENT_TASKS 限制
+            async with task_slots.slot():
+                if job_type == "cron":
+                    # 执行 cron 任务（异步 SSH，直接在当前事件循环上执行）
+                    from app.modules.cron.services import execute_job_async
+                    result = await execute_job_async(self.engine, int(job_id), inputs, outputs)
+                else:
+                    # 执行 acme 证书申请任务
+                    from app.modules.acme.services import ApplicationService
+                    acme_service = ApplicationService(self.engine)
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(
+                        None,
+                        lambda: acme_service.execute(int(job_id), "workflow")
+                    )
+
             logger.info(f"任务节点执行结果: {node_id}, 结果: {result}")
 
             return {
@@ -408,6 +681,108 @@ class WorkflowEngine:
             logger.error(f"任务节点执行异常: {node_id}, 错误: {e}")
             return {"status": "failed", "error": str(e)}
 
+    async def _execute_map_node(self, node_execution_id: int, node: Dict, config: Dict, state: Dict) -> Dict:
+        """
+        执行 Map 节点：对列表中的每个元素执行一次任务
+
+        配置：
+        - items: 列表，或 {{inputs.xxx}} / {{outputs.node.output}} 模板
+          （解析结果为 JSON 列表时按列表处理，否则按行拆分）
+        - job_id / job_type: 对每个元素执行的任务，元素通过 {inputs.<item_var>} 和 {inputs.index} 传给任务
+        - item_var: 元素变量名，默认 item
+        - concurrency: 同时执行的元素数，默认 5
+        - on_error: fail_fast（有元素失败后不再启动新元素，默认）或 continue（全部执行完）
+
+        各元素的结果按输入顺序收集到 state["outputs"][node_id]["results"]，
+        节点执行记录只保存一条紧凑的汇总，不为每个元素单独建记录。
+        """
+        node_id = node.get("id")
+        items = self._resolve_map_items(config.get("items"), state)
+        if items is None:
+            return {"status": "failed", "error": f"无法解析列表: {config.get('items')}"}
+
+        item_var = config.get("item_var") or "item"
+        on_error = config.get("on_error") or "fail_fast"
+        try:
+            concurrency = max(1, int(config.get("concurrency") or 5))
+        except (TypeError, ValueError):
+            concurrency = 5
+
+        await self._add_node_log(
+            node_execution_id,
+            f"Map 节点: 共 {len(items)} 个元素，并发 {concurrency}，失败策略 {on_error}",
+            "info"
+        )
+
+        semaphore = asyncio.Semaphore(concurrency)
+        results = [None] * len(items)
+        stop = False
+
+        async def run_item(index: int, item: Any):
+            nonlocal stop
+            async with semaphore:
+                if stop:
+                    results[index] = {"index": index, "item": item, "status": "cancelled", "output": "", "error": ""}
+                    return
+                child_state = dict(state, inputs={**state.get("inputs", {}), item_var: item, "index": index})
+                result = await self._execute_task_node(node, config, child_state)
+                results[index] = {
+                    "index": index,
+                    "item": item,
+                    "status": result.get("status", "failed"),
+                    "output": result.get("output", ""),
+                    "error": result.get("error", ""),
+                }
+                if results[index]["status"] != "success":
+                    await self._add_node_log(
+                        node_execution_id, f"元素 #{index} ({item}) 执行失败: {result.get('error', '')}", "failed"
+                    )
+                    if on_error == "fail_fast":
+                        stop = True
+
+        await asyncio.gather(*(run_item(index, item) for index, item in enumerate(items)))
+
+        counts = {"success": 0, "failed": 0, "cancelled": 0}
+        for result in results:
+            counts[result["status"] if result["status"] in counts else "failed"] += 1
+        summary = f"成功 {counts['success']}，失败 {counts['failed']}，取消 {counts['cancelled']}"
+        logger.info(f"Map 节点执行完成: {node_id}, {summary}")
+
+        status = "success" if counts["failed"] == 0 and counts["cancelled"] == 0 else "failed"
+        return {
+            "status": status,
+            "output": json.dumps(self._compact_map_results(results), ensure_ascii=False),
+            "error": "" if status == "success" else summary,
+            "results": results,
+            "outputs": [result["output"] for result in results],
+        }
+
+    @staticmethod
+    def _resolve_map_items(items: Any, state: Dict) -> Optional[list]:
+        """解析 Map 节点的列表"""
+        items = WorkflowVariableResolver.resolve_value(items, state)
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except (TypeError, ValueError):
+                items = [line.strip() for line in items.splitlines() if line.strip()]
+        if isinstance(items, (list, tuple)):
+            return list(items)
+        return None
+
+    @staticmethod
+    def _compact_map_results(results: list, output_len: int = 500) -> list:
+        """节点执行记录中保存的元素结果（截断输出）"""
+        compact = []
+        for result in results:
+            entry = {"index": result["index"], "item": result["item"], "status": result["status"]}
+            if result["output"]:
+                entry["output"] = result["output"][-output_len:]
+            if result["error"]:
+                entry["error"] = result["error"][-output_len:]
+            compact.append(entry)
+        return compact
+
     async def _execute_condition_node(self, node: Dict, config: Dict, state: Dict) -> Dict:
         """执行条件节点"""
         expression = config.get("expression", "True")
@@ -422,7 +797,7 @@ class WorkflowEngine:
             "condition_result": result
         }
 
-    async def _execute_and_node(self, node: Dict, config: Dict, state: Dict, node_execution_id: int = None, all_edges: list = None) -> Dict:
+    async def _execute_and_node(self, node: Dict, config: Dict, state: Dict, node_execution_id: int = None) -> Dict:
         """执行 AND 节点"""
         node_id = node.get("id")
 
@@ -439,7 +814,7 @@ class WorkflowEngine:
             "output": "AND 节点执行完成"
         }
 
-    async def _execute_or_node(self, node: Dict, config: Dict, state: Dict, node_execution_id: int = None, all_edges: list = None) -> Dict:
+    async def _execute_or_node(self, node: Dict, config: Dict, state: Dict, node_execution_id: int = None) -> Dict:
         """执行 OR 节点"""
         node_id = node.get("id")
 
@@ -468,6 +843,11 @@ class WorkflowEngine:
             except (ValueError, TypeError):
                 seconds = 5
 
+        # 长时间等待不占用协程：挂起执行，记录唤醒时间
+        if seconds >= WORKFLOW_PARK_AFTER:
+            wake_at = datetime.now() + timedelta(seconds=seconds)
+            return {"status": "waiting", "wake_at": wake_at, "output": f"等待 {seconds} 秒"}
+
         await asyncio.sleep(seconds)
 
         return {"status": "success", "output": f"等待 {seconds} 秒完成"}
@@ -492,179 +872,194 @@ class WorkflowEngine:
         except Exception as e:
             return {"status": "failed", "error": str(e)}
 
-    async def _execute_next_nodes(self, execution_id: int, current_node_id: str,
-                                   status: str, state: Dict,
-                                   all_nodes: list, all_edges: list,
-                                   current_node_execution_id: int = None):
-        """执行后续节点
+    async def _route(self, current_node_id: str, status: str, state: Dict, graph: WorkflowGraph,
+                     current_node_execution_id: int = None) -> list:
+        """按连线条件找出要路由到的后续节点
 
         Args:
-            execution_id: 执行记录ID
             current_node_id: 当前节点ID
             status: 当前节点状态
             state: 当前状态
-            all_nodes: 所有节点
-            all_edges: 所有边
+            graph: 编译后的工作流图
             current_node_execution_id: 当前节点执行记录ID（用于记录日志）
         """
         # 找到匹配条件的出边
         next_node_ids = []
-        for edge in all_edges:
-            if edge.get("source") == current_node_id:
-                edge_condition = edge.get("condition", "always")
-
-                # 获取当前节点的输出
-                current_output = state["outputs"].get(current_node_id, {})
-
-                # 判断是否匹配
-                match = False
-                if edge_condition == "always":
-                    # 总是执行（适用于非条件节点）
-                    match = True
-                    logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=always, match={match}")
-                elif edge_condition == "true":
-                    # 条件为真时执行
-                    condition_result = current_output.get("condition_result") if isinstance(current_output, dict) else None
-                    match = condition_result is True
-                    logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=true, condition_result={condition_result}, match={match}")
-                elif edge_condition == "false":
-                    # 条件为假时执行
-                    condition_result = current_output.get("condition_result") if isinstance(current_output, dict) else None
-                    match = condition_result is False
-                    logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=false, condition_result={condition_result}, match={match}")
-                elif edge_condition == "success":
-                    # 节点成功时执行（适用于任务节点）
-                    match = status == "success"
-                    logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=success, status={status}, match={match}")
-                elif edge_condition == "failed":
-                    # 节点失败时执行
-                    match = status == "failed"
-                    logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=failed, status={status}, match={match}")
-
-                if match:
-                    target = edge.get("target")
-                    if target and target not in next_node_ids:
-                        next_node_ids.append(target)
-                        logger.info(f"执行后续节点: {target}")
-
-                        # 记录路由日志
-                        if current_node_execution_id:
-                            # 获取目标节点的后置节点
-                            target_next_nodes = []
-                            for e in all_edges:
-                                if e.get("source") == target:
-                                    target_next_nodes.append(e.get("target"))
-
-                            await self._add_node_log(
-                                current_node_execution_id,
-                                f"路由到节点: {target} (条件: {edge_condition})",
-                                "route"
-                            )
-                            await self._add_node_log(
-                                current_node_execution_id,
-                                f"目标节点后置节点: {', '.join(target_next_nodes) if target_next_nodes else '无'}",
-                                "route"
-                            )
-
-        # 检查所有前置节点是否都已完成
-        node_map = {n.get("id"): n for n in all_nodes}
-        for next_node_id in next_node_ids[:]:
-            next_node = node_map.get(next_node_id)
-            if next_node:
-                node_type = next_node.get("type", "task")
-
-                # AND 节点：等待所有前置节点完成
-                if node_type == "and":
-                    if not await self._check_prerequisites_completed(next_node_id, state, all_edges):
-                        logger.info(f"AND 节点 {next_node_id} 的前置节点未完成，跳过执行")
-                        next_node_ids.remove(next_node_id)
-                # OR 节点：任一前置节点完成即执行
-                elif node_type == "or":
-                    logger.info(f"OR 节点 {next_node_id} 任一前置节点完成即执行")
-                # 其他节点：任一前置节点完成即执行（默认行为）
-                else:
-                    logger.info(f"节点 {next_node_id} 任一前置节点完成即执行")
-
-        # 执行后续节点（并行执行）
-        tasks = []
-        for next_node_id in next_node_ids:
-            next_node = node_map.get(next_node_id)
-            if next_node:
-                # 创建异步任务，不立即 await
-                task = asyncio.create_task(
-                    self._execute_node(execution_id, next_node, state, all_nodes, all_edges)
-                )
-                tasks.append(task)
-
-        # 等待所有任务完成
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-    async def _check_prerequisites_completed(self, node_id: str, state: Dict, all_edges: list) -> bool:
-        """检查节点的前置节点是否都已完成"""
-        # 找到所有入边（前置节点）
-        prerequisite_ids = []
-        for edge in all_edges:
-            if edge.get("target") == node_id:
-                prerequisite_ids.append(edge.get("source"))
-
-        # 检查所有前置节点是否都已完成
-        for prereq_id in prerequisite_ids:
-            if prereq_id not in state["outputs"]:
-                logger.info(f"前置节点 {prereq_id} 还未完成")
-                return False
-
-            # 检查前置节点的执行状态是否为 success
-            prereq_output = state["outputs"].get(prereq_id, {})
-            prereq_status = prereq_output.get("status") if isinstance(prereq_output, dict) else None
-            if prereq_status != "success":
-                logger.info(f"前置节点 {prereq_id} 状态为 {prereq_status}，不是 success，等待完成")
-                return False
-
-        logger.info(f"节点 {node_id} 的所有前置节点都已完成: {prerequisite_ids}")
-        return True
-
-    def _find_start_nodes(self, nodes: list, edges: list) -> list:
-        """找到起始节点（没有入边的节点）"""
-        target_ids = {e.get("target") for e in edges}
-        start_nodes = [n for n in nodes if n.get("id") not in target_ids]
-        return start_nodes if start_nodes else (nodes[:1] if nodes else [])
+        for edge in graph.out_edges.get(current_node_id, []):
+            edge_condition = edge.get("condition", "always")
+
+            # 获取当前节点的输出
+            current_output = state["outputs"].get(current_node_id, {})
+
+            # 判断是否匹配
+            match = False
+            if edge_condition == "always":
+                # 总是执行（适用于非条件节点）
+                match = True
+                logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=always, match={match}")
+            elif edge_condition == "true":
+                # 条件为真时执行
+                condition_result = current_output.get("condition_result") if isinstance(current_output, dict) else None
+                match = condition_result is True
+                logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=true, condition_result={condition_result}, match={match}")
+            elif edge_condition == "false":
+                # 条件为假时执行
+                condition_result = current_output.get("condition_result") if isinstance(current_output, dict) else None
+                match = condition_result is False
+                logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=false, condition_result={condition_result}, match={match}")
+            elif edge_condition == "success":
+                # 节点成功时执行（适用于任务节点）
+                match = status == "success"
+                logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=success, status={status}, match={match}")
+            elif edge_condition == "failed":
+                # 节点失败时执行
+                match = status == "failed"
+                logger.info(f"连线条件: {current_node_id} -> {edge.get('target')}, condition=failed, status={status}, match={match}")
+
+            if match:
+                target = edge.get("target")
+                if target and target not in next_node_ids:
+                    next_node_ids.append(target)
+                    logger.info(f"执行后续节点: {target}")
+
+                    # 记录路由日志
+                    if current_node_execution_id:
+                        # 获取目标节点的后置节点
+                        target_next_nodes = graph.next_ids(target)
+
+                        await self._add_node_log(
+                            current_node_execution_id,
+                            f"路由到节点: {target} (条件: {edge_condition})",
+                            "route"
+                        )
+                        await self._add_node_log(
+                            current_node_execution_id,
+                            f"目标节点后置节点: {', '.join(target_next_nodes) if target_next_nodes else '无'}",
+                            "route"
+                        )
+
+        return next_node_ids
 
     # ========== 数据库操作 ==========
 
     async def _get_workflow(self, workflow_id: str) -> Optional[Dict]:
         """获取工作流"""
         query = select(workflows_table).where(workflows_table.c.workflow_id == workflow_id)
-        with self.engine.connect() as conn:
-            result = conn.execute(query)
-            row = result.first()
-            return dict(row._mapping) if row else None
+        return await asyncio.to_thread(self._fetch_one, query)
 
     async def _get_execution(self, execution_id: int) -> Optional[Dict]:
         """获取执行记录"""
         query = select(workflow_executions_table).where(
             workflow_executions_table.c.id == execution_id
         )
+        return await asyncio.to_thread(self._fetch_one, query)
+
+    def _fetch_one(self, query) -> Optional[Dict]:
+        """执行查询并返回第一行（同步，由 asyncio.to_thread 调用，不阻塞运行时事件循环）"""
         with self.engine.connect() as conn:
-            result = conn.execute(query)
-            row = result.first()
+            row = conn.execute(query).first()
             return dict(row._mapping) if row else None
 
-    async def _update_execution(self, execution_id: int, status: str, error: str = None):
+    async def _update_execution(self, execution_id: int, status: str, error: str = None, wake_at: datetime = None):
         """更新执行记录"""
         now = datetime.now()
+        values = {
+            "status": status,
+            "end_time": now if status in ["success", "failed", "cancelled"] else None,
+            "error": error,
+            "wake_at": wake_at,
+        }
+        if status == "running":
+            values["owner"] = PROCESS_ID
         query = (
             update(workflow_executions_table)
             .where(workflow_executions_table.c.id == execution_id)
-            .values(
-                status=status,
-                end_time=now if status in ["success", "failed", "cancelled"] else None,
-                error=error
+            .values(**values)
+        )
+        await asyncio.to_thread(db_writer.execute, query)
+
+    async def _load_node_rows(self, execution_id: int) -> list:
+        """读取执行的全部节点记录"""
+        query = (
+            select(workflow_node_executions_table)
+            .where(workflow_node_executions_table.c.execution_id == execution_id)
+            .order_by(workflow_node_executions_table.c.id)
+        )
+
+        def load():
+            with self.engine.connect() as conn:
+                return [dict(row) for row in conn.execute(query).mappings()]
+        return await asyncio.to_thread(load)
+
+    @staticmethod
+    def _row_result(row: Dict) -> Dict:
+        """由节点记录重建节点结果（state["outputs"] 中的格式）"""
+        result = {"status": row["status"], "output": row["output"] or "", "error": row["error"] or ""}
+        if row["node_type"] == "condition":
+            try:
+                result["condition_result"] = json.loads(row["output"]).get("result")
+            except (TypeError, ValueError, AttributeError):
+                pass
+        elif row["node_type"] == "map":
+            try:
+                result["results"] = json.loads(row["output"])
+                result["outputs"] = [item.get("output", "") for item in result["results"]]
+            except (TypeError, ValueError, AttributeError):
+                pass
+        return result
+
+    async def _load_parked_state(self, execution_id: int, state: Dict):
+        """唤醒时重建状态：已完成节点重放，等待节点待唤醒，已跳过节点不再记录"""
+        state["replayed"], state["waiting"], state["recorded_skipped"] = {}, {}, set()
+        for row in await self._load_node_rows(execution_id):
+            if row["status"] in ("success", "failed"):
+                state["replayed"][row["node_id"]] = self._row_result(row)
+            elif row["status"] == "waiting":
+                state["waiting"][row["node_id"]] = row
+            elif row["status"] == "skipped":
+                state["recorded_skipped"].add(row["node_id"])
+        state["outputs"].update(state["replayed"])
+
+    async def _find_cached_result(self, cache_key: str, ttl: int) -> Optional[Dict]:
+        """查找 ttl 秒内相同缓存键的成功结果"""
+        since = datetime.now() - timedelta(seconds=ttl)
+        query = (
+            select(
+                workflow_node_executions_table.c.execution_id,
+                workflow_node_executions_table.c.output
             )
+            .where(
+                workflow_node_executions_table.c.cache_key == cache_key,
+                workflow_node_executions_table.c.status == "success",
+                workflow_node_executions_table.c.end_time >= since
+            )
+            .order_by(workflow_node_executions_table.c.id.desc())
+            .limit(1)
         )
-        with self.engine.connect() as conn:
-            conn.execute(query)
-            conn.commit()
+        return await asyncio.to_thread(self._fetch_one, query)
+
+    async def _record_skipped_nodes(self, execution_id: int, graph: WorkflowGraph, node_ids: list):
+        """批量写入被跳过节点的执行记录（一次写入）"""
+        now = datetime.now()
+        rows = []
+        for node_id in node_ids:
+            node = graph.node(node_id) or {}
+            rows.append({
+                "execution_id": execution_id,
+                "node_id": node_id,
+                "node_name": node.get("name", node_id),
+                "node_type": node.get("type", "task"),
+                "status": "skipped",
+                "start_time": now,
+                "end_time": now,
+                "created_at": now,
+            })
+        try:
+            await asyncio.to_thread(
+                db_writer.execute, lambda conn: conn.execute(workflow_node_executions_table.insert(), rows)
+            )
+        except Exception as e:
+            logger.error(f"记录跳过节点失败: {e}")
 
     async def _create_node_execution(self, execution_id: int, node_id: str,
                                       node_name: str, node_type: str) -> int:
@@ -679,28 +1074,35 @@ class WorkflowEngine:
             start_time=now,
             created_at=now
         )
-        with self.engine.connect() as conn:
-            result = conn.execute(query)
-            conn.commit()
-            return result.inserted_primary_key[0]
+        result = await asyncio.to_thread(db_writer.execute, query)
+        return result.inserted_primary_key[0]
 
     async def _update_node_execution(self, node_execution_id: int, status: str,
-                                      output: str = None, error: str = None):
-        """更新节点执行记录"""
+                                      output: str = None, error: str = None, cache_key: str = None,
+                                      wake_at: datetime = None):
+        """更新节点执行记录（节点结束时，待写入的日志随状态一起写入）"""
         now = datetime.now()
-        query = (
-            update(workflow_node_executions_table)
-            .where(workflow_node_executions_table.c.id == node_execution_id)
-            .values(
-                status=status,
-                end_time=now if status in ["success", "failed"] else None,
-                output=output,
-                error=error
-            )
+        values = dict(
+            status=status,
+            end_time=now if status in ["success", "failed"] else None,
+            output=output,
+            error=error
         )
-        with self.engine.connect() as conn:
-            conn.execute(query)
-            conn.commit()
+        if cache_key:
+            values["cache_key"] = cache_key
+        if wake_at:
+            values["wake_at"] = wake_at
+        async with self.node_logs.lock:
+            if status in ["success", "failed", "waiting"]:
+                logs = self.node_logs.take(node_execution_id)
+                if logs is not None:
+                    values["logs"] = logs
+            query = (
+                update(workflow_node_executions_table)
+                .where(workflow_node_executions_table.c.id == node_execution_id)
+                .values(**values)
+            )
+            await asyncio.to_thread(db_writer.execute, query)
 
     async def _add_node_log(self, node_execution_id: int, message: str, log_type: str = "info"):
         """添加节点执行日志
@@ -716,53 +1118,24 @@ class WorkflowEngine:
             "message": message,
             "type": log_type
         }
-
-        # 先获取现有的日志
-        query = select(workflow_node_executions_table.c.logs).where(
-            workflow_node_executions_table.c.id == node_execution_id
-        )
-
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(query)
-                row = result.first()
-                existing_logs = list(row._mapping.get("logs", [])) if row else []
-
-                # 添加新日志
-                existing_logs.append(log_entry)
-
-                # 更新日志
-                update_query = (
-                    update(workflow_node_executions_table)
-                    .where(workflow_node_executions_table.c.id == node_execution_id)
-                    .values(logs=existing_logs)
-                )
-                conn.execute(update_query)
-                conn.commit()
-        except Exception as e:
-            logger.error(f"添加节点日志失败: {e}")
-
+        # 只写入内存，由 NodeLogBuffer 批量写回
+        self.node_logs.add(node_execution_id, log_entry)
 
 
 # ========== 同步执行入口 ==========
 
 def execute_workflow_sync(engine, execution_id: int):
     """
-    同步执行工作流（用于后台任务）
+    同步执行工作流（阻塞到执行结束）
+
+    执行本身在常驻的工作流运行时上进行，这里只等待结果。
 
     Args:
         engine: 数据库引擎
         execution_id: 执行记录ID
     """
-    import asyncio
-
-    engine_obj = WorkflowEngine(engine)
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(engine_obj.execute_workflow(execution_id))
-    finally:
-        loop.close()
+    from .runtime import workflow_runtime
+    workflow_runtime.submit(engine, execution_id).result()
 
 
 __all__ = ["WorkflowEngine", "WorkflowVariableResolver", "execute_workflow_sync"]
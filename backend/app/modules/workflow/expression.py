@@ -0,0 +1,359 @@
+# app/modules/workflow/expression.py
+"""
+工作流模板与条件表达式编译
+
+节点配置里的模板（{{inputs.xxx}} / {{outputs.node1.xxx}}）和条件表达式
+只在第一次使用时编译一次，之后每次求值都是遍历预先生成的结构：
+- Template：拆分为字面量片段和变量路径，渲染时按路径取值拼接
+- Condition：用 ast 解析为受限的表达式树并编译为闭包，
+  只支持常量、inputs/outputs 取值（属性和下标）、比较、布尔、算术、
+  条件表达式和列表/元组/字典字面量，不支持函数调用
+
+条件中的 {{变量}} 直接绑定为变量值；字符串值与原来“文本替换后求值”的写法保持一致，
+是 JSON 时先解析（任务输出 "3\n"、表单输入 "10" 按数字比较，"true" 为布尔值）。
+若变量出现在字符串字面量中（如 "{{inputs.env}}" == "prod"），则先渲染文本再按结果编译
+（编译结果同样缓存）。
+
+编译结果保存在 ExpressionCache 中，每个编译后的工作流图（按工作流版本缓存）
+持有一个实例，工作流修改后随新图一起重新编译。
+"""
+import ast
+import json
+import operator
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+VARIABLE_PATTERN = re.compile(r'\{\{\s*([a-zA-Z0-9_.]+)\s*\}\}')
+
+# 可能是 JSON 的首字符，其余结果不必尝试 json.loads
+_JSON_START = frozenset('{["-0123456789tfn')
+
+_VAR_PREFIX = "__wf_var_"
+
+
+class ExpressionError(ValueError):
+    """表达式不合法或求值失败"""
+
+
+_MISSING = object()
+
+
+def _coerce(value: Any) -> Any:
+    """字符串值是 JSON 时解析为对应的值（与文本替换后再求值的结果一致），否则原样返回"""
+    if not isinstance(value, str):
+        return value
+    stripped = value.strip()
+    if stripped and stripped[0] in _JSON_START:
+        try:
+            return json.loads(stripped)
+        except ValueError:
+            pass
+    return value
+
+
+def _lookup(state: Dict[str, Any], parts: Tuple[str, ...]) -> Any:
+    current = state
+    for part in parts:
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        else:
+            return _MISSING
+    return current
+
+
+class Template:
+    """编译后的文本模板"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.segments: List[Union[str, Tuple[str, Tuple[str, ...]]]] = []
+        position = 0
+        for match in VARIABLE_PATTERN.finditer(text):
+            if match.start() > position:
+                self.segments.append(text[position:match.start()])
+            self.segments.append((match.group(0), tuple(match.group(1).split('.'))))
+            position = match.end()
+        if position < len(text):
+            self.segments.append(text[position:])
+        self.has_variables = any(isinstance(segment, tuple) for segment in self.segments)
+
+    def render_text(self, state: Dict[str, Any]) -> str:
+        """替换变量，找不到的变量保留原样"""
+        if not self.has_variables:
+            return self.text
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+            raw, path = segment
+            value = _lookup(state, path)
+            if value is _MISSING:
+                parts.append(raw)
+            else:
+                parts.append(str(value) if value is not None else '')
+        return ''.join(parts)
+
+    def value(self, state: Dict[str, Any]) -> Any:
+        """模板只由一个变量组成时返回变量原值（保留列表、字典等类型），否则同 render"""
+        if len(self.segments) == 1 and isinstance(self.segments[0], tuple):
+            value = _lookup(state, self.segments[0][1])
+            if value is not _MISSING:
+                return value
+        return self.render(state)
+
+    def render(self, state: Dict[str, Any]) -> Any:
+        """替换变量，结果是 JSON 时解析为对应的值"""
+        result = self.render_text(state)
+        if result == self.text:
+            return self.text
+        stripped = result.lstrip()
+        if stripped and stripped[0] in _JSON_START:
+            try:
+                return json.loads(result)
+            except (json.JSONDecodeError, TypeError):
+                pass
+        return result
+
+
+# ========== 受限表达式 ==========
+
+Evaluator = Callable[[Dict[str, Any]], Any]
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+
+_UNARY_OPERATORS = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+_COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+
+def _compile_node(node: ast.AST) -> Evaluator:
+    """把 ast 节点编译为接收变量表的闭包"""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body)
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda env: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+
+        def load_name(env):
+            try:
+                return env[name]
+            except KeyError:
+                raise ExpressionError(f"未定义的名称: {name}")
+        return load_name
+
+    if isinstance(node, ast.Attribute):
+        target, attr = _compile_node(node.value), node.attr
+
+        def load_attr(env):
+            value = target(env)
+            if isinstance(value, dict) and attr in value:
+                return value[attr]
+            raise ExpressionError(f"不存在的属性: {attr}")
+        return load_attr
+
+    if isinstance(node, ast.Subscript):
+        target, index = _compile_node(node.value), _compile_node(node.slice)
+
+        def load_item(env):
+            try:
+                return target(env)[index(env)]
+            except (KeyError, IndexError, TypeError) as e:
+                raise ExpressionError(f"下标取值失败: {e}")
+        return load_item
+
+    if isinstance(node, ast.BoolOp):
+        values = [_compile_node(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            def bool_and(env):
+                result = True
+                for value in values:
+                    result = value(env)
+                    if not result:
+                        return result
+                return result
+            return bool_and
+
+        def bool_or(env):
+            result = False
+            for value in values:
+                result = value(env)
+                if result:
+                    return result
+            return result
+        return bool_or
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        op, operand = _UNARY_OPERATORS[type(node.op)], _compile_node(node.operand)
+        return lambda env: op(operand(env))
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        op, left, right = _BINARY_OPERATORS[type(node.op)], _compile_node(node.left), _compile_node(node.right)
+        return lambda env: op(left(env), right(env))
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left)
+        comparisons = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARE_OPERATORS:
+                raise ExpressionError(f"不支持的比较运算: {type(op).__name__}")
+            comparisons.append((_COMPARE_OPERATORS[type(op)], _compile_node(comparator)))
+
+        def compare(env):
+            current = left(env)
+            for op, comparator in comparisons:
+                following = comparator(env)
+                if not op(current, following):
+                    return False
+                current = following
+            return True
+        return compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _compile_node(node.test), _compile_node(node.body), _compile_node(node.orelse)
+        return lambda env: body(env) if test(env) else orelse(env)
+
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        items = [_compile_node(item) for item in node.elts]
+        factory = {ast.List: list, ast.Tuple: tuple, ast.Set: set}[type(node)]
+        return lambda env: factory(item(env) for item in items)
+
+    if isinstance(node, ast.Dict):
+        if any(key is None for key in node.keys):
+            raise ExpressionError("不支持字典展开")
+        pairs = [(_compile_node(key), _compile_node(value)) for key, value in zip(node.keys, node.values)]
+        return lambda env: {key(env): value(env) for key, value in pairs}
+
+    raise ExpressionError(f"不支持的表达式: {type(node).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> Evaluator:
+    """编译受限表达式（按源码缓存）"""
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"表达式语法错误: {e.msg}")
+    return _compile_node(tree)
+
+
+class Condition:
+    """编译后的条件表达式"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.template = Template(expression)
+        self.variables: List[Tuple[str, ...]] = []
+        self.evaluator: Evaluator = None
+
+        source = VARIABLE_PATTERN.sub(self._placeholder, expression)
+        try:
+            evaluator = compile_expression(source)
+        except ExpressionError:
+            # 可能是变量拼接成代码的写法，渲染后再编译
+            return
+        if self.variables and self._spliced(source):
+            return
+        self.evaluator = evaluator
+
+    def _placeholder(self, match) -> str:
+        self.variables.append(tuple(match.group(1).split('.')))
+        return f"{_VAR_PREFIX}{len(self.variables) - 1}"
+
+    def _spliced(self, source: str) -> bool:
+        """变量是否被拼进字符串字面量或其他标识符中（只能按文本渲染）"""
+        names = {f"{_VAR_PREFIX}{index}" for index in range(len(self.variables))}
+        for node in ast.walk(ast.parse(source.strip(), mode="eval")):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and _VAR_PREFIX in node.value:
+                return True
+            if isinstance(node, ast.Name) and node.id.startswith(_VAR_PREFIX) and node.id not in names:
+                return True
+            if isinstance(node, ast.Attribute) and _VAR_PREFIX in node.attr:
+                return True
+        return False
+
+    def evaluate(self, state: Dict[str, Any]) -> bool:
+        env = {
+            "inputs": state.get("inputs", {}),
+            "outputs": state.get("outputs", {}),
+        }
+        if self.evaluator is None:
+            # 变量出现在字符串中或需要文本拼接：先渲染，再编译渲染结果
+            return bool(compile_expression(str(self.template.render(state)))(env))
+
+        for index, path in enumerate(self.variables):
+            value = _lookup(state, path)
+            if value is _MISSING:
+                raise ExpressionError(f"变量不存在: {'.'.join(path)}")
+            env[f"{_VAR_PREFIX}{index}"] = _coerce(value)
+        return bool(self.evaluator(env))
+
+
+class ExpressionCache:
+    """模板与条件的编译缓存"""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._templates: Dict[str, Template] = {}
+        self._conditions: Dict[str, Condition] = {}
+        self._lock = threading.Lock()
+
+    def template(self, text: str) -> Template:
+        compiled = self._templates.get(text)
+        if compiled is None:
+            compiled = self._store(self._templates, text, Template(text))
+        return compiled
+
+    def condition(self, expression: str) -> Condition:
+        compiled = self._conditions.get(expression)
+        if compiled is None:
+            compiled = self._store(self._conditions, expression, Condition(expression))
+        return compiled
+
+    def _store(self, cache: dict, key: str, compiled):
+        with self._lock:
+            if len(cache) >= self.max_size:
+                cache.clear()
+            return cache.setdefault(key, compiled)
+
+
+# 全局实例：不属于任何工作流图时使用
+default_expression_cache = ExpressionCache()
+
+
+__all__ = [
+    "Condition",
+    "ExpressionCache",
+    "ExpressionError",
+    "Template",
+    "compile_expression",
+    "default_expression_cache",
+]
@@ -0,0 +1,179 @@
+# app/modules/workflow/graph.py
+"""
+工作流图编译
+
+把工作流定义（nodes + edges 列表）编译成带索引的 DAG，引擎遍历时
+按节点直接取出入边，不再每个节点都扫描全部边：
+- nodes: 节点ID -> 节点定义
+- out_edges / in_edges: 节点ID -> 出边 / 入边（保持定义中的顺序）
+- successors / predecessors: 节点ID -> 后置 / 前置节点ID
+- join_counts: 节点ID -> 去重后的前置节点数（AND 节点需要等待的数量）
+- start_nodes: 没有入边的节点
+- topo_order: 拓扑序（存在环时只包含无环部分，has_cycle 为 True）
+- expressions: 节点模板与条件表达式的编译缓存（首次求值时编译）
+
+编译结果按 (workflow_id, 默认版本, updated_at) 缓存；
+工作流每次编辑都会刷新 updated_at，因此修改后自动使用新图。
+"""
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.modules.workflow.expression import ExpressionCache
+
+
+class WorkflowGraph:
+    """编译后的工作流图（只读，可在多次执行间共享）"""
+
+    def __init__(self, nodes: List[dict], edges: List[dict]):
+        self.nodes: Dict[str, dict] = {}
+        for node in nodes:
+            self.nodes.setdefault(node.get("id"), node)
+
+        self.out_edges: Dict[str, List[dict]] = {node_id: [] for node_id in self.nodes}
+        self.in_edges: Dict[str, List[dict]] = {node_id: [] for node_id in self.nodes}
+        self.successors: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        self.predecessors: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        for edge in edges:
+            source, target = edge.get("source"), edge.get("target")
+            self.out_edges.setdefault(source, []).append(edge)
+            self.in_edges.setdefault(target, []).append(edge)
+            self.successors.setdefault(source, []).append(target)
+            self.predecessors.setdefault(target, []).append(source)
+
+        self.join_counts: Dict[str, int] = {
+            node_id: len(set(sources)) for node_id, sources in self.predecessors.items()
+        }
+
+        starts = [node for node_id, node in self.nodes.items() if not self.in_edges.get(node_id)]
+        self.start_nodes: List[dict] = starts if starts else list(self.nodes.values())[:1]
+
+        self.topo_order, self.has_cycle = self._topological_order()
+        self.expressions = ExpressionCache()
+
+    def _topological_order(self) -> Tuple[List[str], bool]:
+        """Kahn 算法，O(V+E)"""
+        in_degree = {node_id: 0 for node_id in self.nodes}
+        for node_id in self.nodes:
+            for target in self.successors.get(node_id, []):
+                if target in in_degree:
+                    in_degree[target] += 1
+
+        ready = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+        order = []
+        while ready:
+            node_id = ready.popleft()
+            order.append(node_id)
+            for target in self.successors.get(node_id, []):
+                if target in in_degree:
+                    in_degree[target] -= 1
+                    if in_degree[target] == 0:
+                        ready.append(target)
+        return order, len(order) < len(self.nodes)
+
+    def find_cycle(self) -> List[str]:
+        """
+        找出一个环（迭代 DFS 三色标记，O(V+E)）
+
+        Returns:
+            环上的节点ID（首尾相同），无环时为空列表
+        """
+        if not self.has_cycle:
+            return []
+        white, gray, black = 0, 1, 2
+        color = {node_id: white for node_id in self.successors}
+        for root in self.successors:
+            if color[root] != white:
+                continue
+            color[root] = gray
+            path = [root]
+            stack = [iter(self.successors[root])]
+            while stack:
+                target = next(stack[-1], None)
+                if target is None:
+                    color[path.pop()] = black
+                    stack.pop()
+                    continue
+                state = color.get(target, black)
+                if state == gray:
+                    return path[path.index(target):] + [target]
+                if state == white:
+                    color[target] = gray
+                    path.append(target)
+                    stack.append(iter(self.successors.get(target, [])))
+        return []
+
+    def reachable_from(self, node_ids: List[str]) -> set:
+        """从给定节点出发能到达的所有节点（含自身）"""
+        seen = set(node_ids)
+        queue = deque(node_ids)
+        while queue:
+            for target in self.successors.get(queue.popleft(), []):
+                if target not in seen:
+                    seen.add(target)
+                    queue.append(target)
+        return seen
+
+    def node(self, node_id: str) -> Optional[dict]:
+        return self.nodes.get(node_id)
+
+    def next_ids(self, node_id: str) -> List[str]:
+        return self.successors.get(node_id, [])
+
+    def prev_ids(self, node_id: str) -> List[str]:
+        return self.predecessors.get(node_id, [])
+
+
+def compile_workflow(workflow: Dict[str, Any]) -> WorkflowGraph:
+    return WorkflowGraph(workflow.get("nodes") or [], workflow.get("edges") or [])
+
+
+class WorkflowGraphCache:
+    """编译结果的 LRU 缓存（线程安全）"""
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._cache: "OrderedDict[tuple, WorkflowGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(workflow: Dict[str, Any]) -> tuple:
+        return workflow.get("workflow_id"), workflow.get("default_version"), str(workflow.get("updated_at"))
+
+    def get(self, workflow: Dict[str, Any]) -> WorkflowGraph:
+        """获取工作流的编译图，未命中时编译并缓存"""
+        key = self.key(workflow)
+        with self._lock:
+            graph = self._cache.get(key)
+            if graph is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return graph
+            self.misses += 1
+
+        graph = compile_workflow(workflow)
+        with self._lock:
+            # 同一工作流只保留最新的编译结果
+            for old_key in [k for k in self._cache if k[0] == key[0]]:
+                del self._cache[old_key]
+            self._cache[key] = graph
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return graph
+
+    def invalidate(self, workflow_id: str = None) -> None:
+        with self._lock:
+            if workflow_id is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == workflow_id]:
+                    del self._cache[key]
+
+
+# 全局实例
+graph_cache = WorkflowGraphCache()
+
+
+__all__ = ["WorkflowGraph", "WorkflowGraphCache", "compile_workflow", "graph_cache"]
@@ -45,21 +45,14 @@ class WorkflowJobProvider(JobProvider):
             return None
         
         try:
-            from app.modules.workflow.engine import WorkflowEngine
-            workflow_engine = WorkflowEngine(engine)
-            
-            # 创建执行记录
-            execution_id = workflow_engine.create_execution(
-                workflow_id=workflow_id,
+            # 创建执行记录并提交到工作流运行时，不占用调度器线程等待执行结束
+            execution_id = services.WorkflowService(engine).trigger(
+                workflow_id,
                 triggered_by="schedule",
                 inputs={}
             )
-            
-            # 执行工作流
-            import asyncio
-            asyncio.run(workflow_engine.execute(execution_id))
-            
-            logger.info(f"工作流执行完成: {workflow_id}, execution_id={execution_id}")
+
+            logger.info(f"工作流已提交执行: {workflow_id}, execution_id={execution_id}")
             return execution_id
         except Exception as e:
             logger.error(f"工作流执行失败: {workflow_id}, error: {e}")
@@ -0,0 +1,81 @@
+# app/modules/workflow/limits.py
+"""
+工作流并发上限
+
+- WORKFLOW_MAX_PARALLEL：单次执行同时运行的节点数（工作流可用 max_parallel 单独设置）
+- WORKFLOW_MAX_CONCURRENT_TASKS：所有工作流同时运行的任务节点总数（任务节点会占用 SSH 连接）
+- WORKFLOW_PARK_AFTER：等待节点的等待时间不小于该秒数时挂起执行（写入数据库），不占用协程
+
+全局上限需要跨事件循环生效，因此用线程锁实现计数，
+等待者在各自的事件循环上挂起，名额释放时通过 call_soon_threadsafe 唤醒。
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+
+WORKFLOW_MAX_PARALLEL = int(os.getenv("WORKFLOW_MAX_PARALLEL", "10"))
+WORKFLOW_MAX_CONCURRENT_TASKS = int(os.getenv("WORKFLOW_MAX_CONCURRENT_TASKS", "16"))
+WORKFLOW_PARK_AFTER = int(os.getenv("WORKFLOW_PARK_AFTER", "60"))
+
+
+class CrossLoopSemaphore:
+    """可在多个事件循环间共享的信号量（FIFO）"""
+
+    def __init__(self, value: int):
+        self.value = value
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()  # (loop, future)
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self.value and not self._waiters:
+                self._active += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, future))
+                except ValueError:
+                    pass  # 名额已转交，由 _grant 发现取消后归还
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                if loop.is_closed():
+                    continue
+                # 名额直接转交给等待者，计数不变
+                loop.call_soon_threadsafe(self._grant, future)
+                return
+            self._active -= 1
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"limit": self.value, "active": self._active, "waiting": len(self._waiters)}
+
+
+# 全局实例：所有工作流共享的任务节点并发名额
+task_slots = CrossLoopSemaphore(WORKFLOW_MAX_CONCURRENT_TASKS)
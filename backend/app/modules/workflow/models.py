@@ -9,7 +9,7 @@
 - workflow_versions_table: 工作流版本历史表
 """
 from datetime import datetime
-from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Table, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Index
 from app.core.db.database import metadata
 
 
@@ -31,6 +31,7 @@ workflows_table = Table(
 
     # 状态
     Column("is_active", Boolean, default=True, comment ="是否启用"),
+    Column("max_parallel", Integer, nullable=True, comment ="同时运行的最大节点数（空为全局默认）"),
 
     # 版本控制
     Column("default_version", Integer, default=1, comment ="默认版本号"),
@@ -53,8 +54,9 @@ workflow_executions_table = Table(
     Column("workflow_id", String(100), ForeignKey("workflows.workflow_id"), nullable=False, comment ="工作流ID"),
 
     # 执行信息
-    Column("status", String(20), default="pending", comment ="状态：pending/running/success/failed/cancelled"),
-    Column("triggered_by", String(20), default="system", comment ="触发方式：manual/system/schedule"),
+    Column("status", String(20), default="pending", comment ="状态：pending/running/waiting/success/failed/cancelled"),
+    Column("triggered_by", String(20), default="system", comment ="触发方式：manual/system/schedule/resume"),
+    Column("resume_from", Integer, nullable=True, comment ="恢复自的执行记录ID（从失败处恢复时）"),
 
     # 输入参数
     Column("inputs", JSON, default=dict, comment ="输入参数"),
@@ -62,6 +64,8 @@ workflow_executions_table = Table(
     # 执行时间
     Column("start_time", DateTime, default=datetime.now, comment ="开始时间"),
     Column("end_time", DateTime, comment ="结束时间"),
+    Column("wake_at", DateTime, index=True, comment ="唤醒时间（等待节点挂起时）"),
+    Column("owner", String(100), comment ="执行所在的进程标识（启动时据此识别已退出进程中断的执行）"),
 
     # 结果
     Column("error", Text, comment ="错误信息"),
@@ -69,6 +73,9 @@ workflow_executions_table = Table(
     # 时间戳
     Column("created_at", DateTime, default=datetime.now, comment ="创建时间"),
 
+    # 索引：按工作流查执行历史
+    Index("ix_workflow_executions_workflow_created", "workflow_id", "created_at"),
+
     sqlite_autoincrement=True,
 )
 
@@ -88,22 +95,29 @@ workflow_node_executions_table = Table(
     Column("node_type", String(20), comment ="节点类型"),
 
     # 执行状态
-    Column("status", String(20), default="pending", comment ="状态：pending/running/success/failed/skipped"),
+    Column("status", String(20), default="pending", comment ="状态：pending/running/waiting/success/failed/skipped"),
 
     # 执行时间
     Column("start_time", DateTime, comment ="开始时间"),
     Column("end_time", DateTime, comment ="结束时间"),
+    Column("wake_at", DateTime, comment ="唤醒时间（等待节点挂起时）"),
 
     # 结果
     Column("output", Text, comment ="输出"),
     Column("error", Text, comment ="错误信息"),
 
+    # 结果缓存键（任务节点开启结果缓存时，节点配置 + 解析后的输入的哈希）
+    Column("cache_key", String(64), index=True, comment ="结果缓存键"),
+
     # 执行日志（JSON格式，记录详细的执行过程）
     Column("logs", JSON, default=list, comment ="执行日志：[{timestamp, message, type}]"),
 
     # 时间戳
     Column("created_at", DateTime, default=datetime.now, comment ="创建时间"),
 
+    # 索引：按执行记录查节点
+    Index("ix_workflow_node_executions_execution_node", "execution_id", "node_id"),
+
     sqlite_autoincrement=True,
 )
 
@@ -133,6 +147,9 @@ workflow_versions_table = Table(
     # 时间戳
     Column("created_at", DateTime, default=datetime.now, comment ="创建时间"),
 
+    # 索引：按工作流、版本号查版本
+    Index("ix_workflow_versions_workflow_version", "workflow_id", "version"),
+
     sqlite_autoincrement=True,
 )
 
@@ -0,0 +1,276 @@
+# app/modules/workflow/runtime.py
+"""
+工作流运行时
+
+所有工作流执行共用一个常驻事件循环（独立线程）：
+- submit 只把执行协程投递到循环上，立即返回，不占用调用方线程
+  （手动触发的请求线程、APScheduler 的工作线程）
+- 并发的工作流只是同一循环上的协程，短时间的 wait 节点只是挂起协程
+- 异步 SSH 连接池按事件循环隔离，常驻循环上的连接可在多次执行间复用
+
+长时间的 wait 节点不占用协程：执行以 waiting 状态和唤醒时间（wake_at）保存在数据库中，
+由循环上的唤醒定时器在到期时重新提交，应用重启后同样会被唤醒。
+
+进程退出（关闭时取消、崩溃）会留下 running 状态的执行：定时器启动时先按执行记录的进程标识
+找出不属于任何存活进程的执行，有挂起的等待节点的重新挂起，其余标记为失败，可从失败处恢复。
+
+循环在第一次提交时启动，应用关闭时调用 shutdown 取消未完成的执行并释放连接。
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+
+from app.core.cluster import PROCESS_ID
+
+logger = logging.getLogger(__name__)
+
+# 唤醒定时器的最长轮询间隔（秒），其他进程挂起的执行最迟在该间隔后被发现
+WORKFLOW_WAKE_POLL = int(os.getenv("WORKFLOW_WAKE_POLL", "60"))
+
+# 单次最多唤醒的执行数
+_WAKE_BATCH = 500
+
+
+class WorkflowRuntime:
+    """常驻的工作流执行循环"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._running: Dict[int, Future] = {}
+        self._submitted = 0
+        self._timer_engine = None
+        self._wake_task: Optional[asyncio.Task] = None
+        self._wake_event: Optional[asyncio.Event] = None
+        self._woken = 0
+
+    # ========== 提交 ==========
+
+    def submit(self, engine, execution_id: int) -> Future:
+        """
+        提交一次工作流执行，立即返回
+
+        Args:
+            engine: 数据库引擎
+            execution_id: 执行记录ID
+
+        Returns:
+            执行完成时结束的 Future
+        """
+        from .engine import WorkflowEngine
+
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(WorkflowEngine(engine).execute_workflow(execution_id), loop)
+        with self._start_lock:
+            self._running[execution_id] = future
+            self._submitted += 1
+        future.add_done_callback(lambda f: self._on_done(execution_id, f))
+        return future
+
+    def _on_done(self, execution_id: int, future: Future) -> None:
+        with self._start_lock:
+            self._running.pop(execution_id, None)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"工作流执行异常: execution_id={execution_id}, error: {future.exception()}")
+
+    # ========== 唤醒定时器 ==========
+
+    def start_timers(self, engine) -> None:
+        """
+        启动唤醒定时器（可重复调用）
+
+        已启动时只通知定时器重新计算下一次唤醒时间，新挂起的执行调用此方法即可。
+        """
+        loop = self._ensure_loop()
+        with self._start_lock:
+            if self._timer_engine is None:
+                self._timer_engine = engine
+                loop.call_soon_threadsafe(self._start_wake_task)
+                return
+        loop.call_soon_threadsafe(self._kick)
+
+    def _start_wake_task(self) -> None:
+        self._wake_event = asyncio.Event()
+        self._wake_task = asyncio.get_running_loop().create_task(self._wake_loop())
+
+    def _kick(self) -> None:
+        if self._wake_event is not None:
+            self._wake_event.set()
+
+    async def _wake_loop(self) -> None:
+        try:
+            await asyncio.to_thread(self._reconcile)
+        except Exception as e:
+            logger.error(f"处理中断的工作流执行失败: {e}")
+
+        while True:
+            self._wake_event.clear()
+            try:
+                next_wake = await asyncio.to_thread(self._wake_due)
+            except Exception as e:
+                logger.error(f"唤醒挂起的工作流失败: {e}")
+                next_wake = None
+
+            timeout = WORKFLOW_WAKE_POLL
+            if next_wake is not None:
+                timeout = min(timeout, max((next_wake - datetime.now()).total_seconds(), 0))
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _wake_due(self) -> Optional[datetime]:
+        """提交已到唤醒时间的执行，返回下一次唤醒时间"""
+        from .models import workflow_executions_table as table
+
+        engine = self._timer_engine
+        now = datetime.now()
+        with engine.connect() as conn:
+            due = conn.execute(
+                select(table.c.id)
+                .where(table.c.status == "waiting", table.c.wake_at <= now)
+                .order_by(table.c.wake_at)
+                .limit(_WAKE_BATCH)
+            ).scalars().all()
+
+        for execution_id in due:
+            # 以状态变更认领，避免重复唤醒
+            with engine.begin() as conn:
+                claimed = conn.execute(
+                    update(table)
+                    .where(table.c.id == execution_id, table.c.status == "waiting")
+                    .values(status="running", owner=PROCESS_ID)
+                ).rowcount
+            if claimed:
+                self._woken += 1
+                self.submit(engine, execution_id)
+
+        with engine.connect() as conn:
+            if len(due) >= _WAKE_BATCH:
+                return now
+            return conn.execute(
+                select(func.min(table.c.wake_at)).where(table.c.status == "waiting")
+            ).scalar()
+
+    def _reconcile(self) -> None:
+        """
+        处理已退出进程遗留的 pending/running 执行
+
+        - 有 waiting 状态节点的（挂起后被认领、或唤醒后运行中被中断）：重新挂起，
+          唤醒时间取最早的等待节点，由定时器继续执行，中断的节点唤醒后重新执行
+        - 其余标记为失败，中断的节点标记为取消，可从失败处恢复
+        """
+        from app.core.cluster import cluster_channel
+        from .models import workflow_executions_table as table, workflow_node_executions_table as nodes
+
+        engine = self._timer_engine
+        live = cluster_channel.live_members()
+        # 升级前的记录没有进程标识：只有本进程存活时才能确定已中断
+        owner_gone = or_(table.c.owner.notin_(live), table.c.owner.is_(None)) if len(live) == 1 \
+            else table.c.owner.notin_(live)
+        with engine.connect() as conn:
+            orphaned = conn.execute(
+                select(table.c.id).where(table.c.status.in_(("pending", "running")), owner_gone)
+            ).scalars().all()
+        if not orphaned:
+            return
+
+        now = datetime.now()
+        parked = failed = 0
+        for execution_id in orphaned:
+            with engine.begin() as conn:
+                wake_at = conn.execute(
+                    select(func.min(nodes.c.wake_at))
+                    .where(nodes.c.execution_id == execution_id, nodes.c.status == "waiting")
+                ).scalar()
+                conn.execute(
+                    update(nodes)
+                    .where(nodes.c.execution_id == execution_id, nodes.c.status.in_(("pending", "running")))
+                    .values(status="cancelled", end_time=now, error="进程退出，执行中断")
+                )
+                current = and_(table.c.id == execution_id, table.c.status.in_(("pending", "running")))
+                if wake_at is not None:
+                    parked += conn.execute(
+                        update(table).where(current).values(status="waiting", wake_at=wake_at, owner=None)
+                    ).rowcount
+                else:
+                    failed += conn.execute(
+                        update(table).where(current)
+                        .values(status="failed", end_time=now, wake_at=None, error="进程退出，执行中断")
+                    ).rowcount
+        logger.warning(f"已处理中断的工作流执行: 重新挂起 {parked} 个，标记失败 {failed} 个")
+
+    # ========== 事件循环 ==========
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, args=(loop,),
+                                                name="workflow-runtime", daemon=True)
+                self._thread.start()
+                self._loop = loop
+                logger.info("⚙️ 工作流运行时已启动")
+        return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """取消未完成的执行，释放本循环上的 SSH 连接并停止循环"""
+        with self._start_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+            running = list(self._running.values())
+            wake_task = self._wake_task
+            self._timer_engine = self._wake_task = self._wake_event = None
+        if loop is None:
+            return
+
+        # 挂起的执行保留在数据库中，下次启动后继续唤醒
+        if wake_task is not None:
+            loop.call_soon_threadsafe(wake_task.cancel)
+        for future in running:
+            future.cancel()
+
+        async def close():
+            from app.core.sh.async_ssh_pool import async_ssh_pool
+            await async_ssh_pool.close_all()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"关闭工作流运行时连接失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+        logger.info("工作流运行时已停止")
+
+    def stats(self) -> dict:
+        with self._start_lock:
+            return {
+                "started": self._loop is not None,
+                "running": len(self._running),
+                "submitted": self._submitted,
+                "timers": self._timer_engine is not None,
+                "woken": self._woken,
+            }
+
+
+# 全局实例
+workflow_runtime = WorkflowRuntime()
+
+
+__all__ = ["WorkflowRuntime", "workflow_runtime"]
@@ -35,6 +35,7 @@ class WorkflowBase(BaseModel):
     nodes: List[Dict[str, Any]] = Field(default_factory=list, description="节点定义列表")
     edges: List[Dict[str, Any]] = Field(default_factory=list, description="边定义列表")
     is_active: bool = Field(True, description="是否启用")
+    max_parallel: Optional[int] = Field(None, ge=1, le=1000, description="同时运行的最大节点数（空为全局默认）")
     default_version: int = Field(1, description="默认版本号")
 
 
@@ -51,6 +52,7 @@ class WorkflowUpdate(BaseModel):
     nodes: Optional[List[Dict[str, Any]]] = Field(None, description="节点定义列表")
     edges: Optional[List[Dict[str, Any]]] = Field(None, description="边定义列表")
     is_active: Optional[bool] = Field(None, description="是否启用")
+    max_parallel: Optional[int] = Field(None, ge=1, le=1000, description="同时运行的最大节点数（空为全局默认）")
 
 
 class WorkflowRead(WorkflowBase):
@@ -83,6 +85,8 @@ class WorkflowExecutionBase(BaseModel):
 class WorkflowExecutionRead(WorkflowExecutionBase):
     """工作流执行读取 Schema"""
     id: int
+    resume_from: Optional[int] = None
+    wake_at: Optional[datetime] = None
     start_time: datetime
     end_time: Optional[datetime] = None
     error: Optional[str] = None
@@ -13,6 +13,7 @@ from datetime import datetime
 from sqlalchemy import select, func, update, delete, and_, or_
 
 from app.core.db.utils.query import QueryBuilder
+from app.core.cluster import PROCESS_ID
 from app.core.scheduler import scheduler_service
 from app.modules.workflow.models import (
     workflows_table,
@@ -21,6 +22,7 @@ from app.modules.workflow.models import (
     workflow_versions_table
 )
 from app.modules.workflow import schemas
+from app.modules.workflow.graph import WorkflowGraph, graph_cache
 
 logger = logging.getLogger(__name__)
 
@@ -65,11 +67,13 @@ class WorkflowRepository:
             result = conn.execute(query)
             conn.commit()
             
+            # 丢弃缓存的编译图
+            graph_cache.invalidate(workflow_id)
+
             # 从调度器移除
             if workflow:
                 full_job_id = f"workflows:{workflow['id']}"
-                if full_job_id in scheduler_service.job_ids:
-                    scheduler_service.remove_job(full_job_id)
+                if scheduler_service.remove_job(full_job_id):
                     logger.info(f"🗑️ 工作流已从调度器移除: {workflow['name']}")
             
             return result.rowcount > 0
@@ -234,8 +238,7 @@ class WorkflowService:
                 logger.info(f"✅ 工作流已添加到调度器: {workflow['name']}")
             else:
                 # 从调度器移除
-                if full_job_id in scheduler_service.job_ids:
-                    scheduler_service.remove_job(full_job_id)
+                if scheduler_service.remove_job(full_job_id):
                     logger.info(f"🗑️ 工作流已从调度器移除: {workflow['name']}")
         
         return self.repo.get_by_id(workflow_id)
@@ -296,13 +299,53 @@ class WorkflowService:
         Returns:
             执行记录ID
         """
-        # 创建执行记录
+        execution_id = self._start_execution(workflow_id, triggered_by, inputs or {})
+        
+        logger.info(f"工作流触发: {workflow_id}, execution_id={execution_id}, inputs={inputs}")
+        
+        return execution_id
+    
+    def resume(self, execution_id: int) -> int:
+        """
+        从失败处恢复执行
+        
+        以相同的输入创建新的执行记录，原执行中已成功的节点直接沿用结果，
+        从失败、取消或未执行到的节点开始重新执行。
+        
+        Args:
+            execution_id: 要恢复的执行记录ID（已结束，且执行失败/取消或存在失败的节点）
+        
+        Returns:
+            新的执行记录ID
+        """
+        source = self.get_execution(execution_id)
+        if not source:
+            raise ValueError(f"执行记录不存在: {execution_id}")
+        if source["status"] in ("pending", "running", "waiting"):
+            raise ValueError(f"执行尚未结束，当前状态: {source['status']}")
+        if source["status"] == "success" and not any(
+            node["status"] in ("failed", "cancelled") for node in self.get_node_executions(execution_id)
+        ):
+            raise ValueError("执行中没有失败的节点，无需恢复")
+        
+        new_execution_id = self._start_execution(
+            source["workflow_id"], "resume", source.get("inputs") or {}, resume_from=execution_id
+        )
+        
+        logger.info(f"工作流恢复执行: {source['workflow_id']}, execution_id={new_execution_id}, resume_from={execution_id}")
+        
+        return new_execution_id
+    
+    def _start_execution(self, workflow_id: str, triggered_by: str, inputs: Dict, resume_from: int = None) -> int:
+        """创建执行记录并提交到工作流运行时异步执行，立即返回"""
         now = datetime.now()
         query = workflow_executions_table.insert().values(
             workflow_id=workflow_id,
             status="pending",
             triggered_by=triggered_by,
-            inputs=inputs or {},
+            inputs=inputs,
+            resume_from=resume_from,
+            owner=PROCESS_ID,
             start_time=now,
             created_at=now
         )
@@ -311,17 +354,8 @@ class WorkflowService:
             conn.commit()
             execution_id = result.inserted_primary_key[0]
         
-        # 异步执行工作流
-        from .engine import execute_workflow_sync
-        import threading
-        
-        thread = threading.Thread(
-            target=execute_workflow_sync,
-            args=(self.engine, execution_id)
-        )
-        thread.start()
-        
-        logger.info(f"工作流触发: {workflow_id}, execution_id={execution_id}, inputs={inputs}")
+        from .runtime import workflow_runtime
+        workflow_runtime.submit(self.engine, execution_id)
         
         return execution_id
     
@@ -397,11 +431,18 @@ class WorkflowService:
         errors = []
         warnings = []
         
+        # 一次构建邻接表，后续检查都在其上进行（O(V+E)）
+        graph = WorkflowGraph(nodes, edges)
+
         # 1. 检查节点ID是否唯一
         node_ids = [node.get("id") for node in nodes]
-        duplicate_ids = [nid for nid in node_ids if node_ids.count(nid) > 1]
+        seen_ids, duplicate_ids = set(), []
+        for nid in node_ids:
+            if nid in seen_ids and nid not in duplicate_ids:
+                duplicate_ids.append(nid)
+            seen_ids.add(nid)
         if duplicate_ids:
-            errors.append(f"节点ID重复: {', '.join(set(duplicate_ids))}")
+            errors.append(f"节点ID重复: {', '.join(map(str, duplicate_ids))}")
         
         # 2. 检查是否有开始节点
         start_nodes = [node for node in nodes if node.get("type") == "start"]
@@ -416,7 +457,7 @@ class WorkflowService:
             warnings.append("缺少结束节点，建议添加结束节点以明确工作流终点")
         
         # 4. 检查边是否连接到有效的节点
-        node_id_set = set(node_ids)
+        node_id_set = seen_ids
         invalid_edges = []
         for edge in edges:
             source = edge.get("source")
@@ -446,45 +487,47 @@ class WorkflowService:
             if not job_id:
                 warnings.append(f"任务节点 {node.get('id')} 未关联任务ID")
         
+        # 6.1 检查 Map 节点的列表和任务
+        map_nodes = [node for node in nodes if node.get("type") == "map"]
+        for node in map_nodes:
+            config = node.get("config", {})
+            if not config.get("items"):
+                errors.append(f"Map 节点 {node.get('id')} 缺少列表")
+            if not config.get("job_id"):
+                errors.append(f"Map 节点 {node.get('id')} 未关联任务ID")
+            if config.get("on_error") not in (None, "", "fail_fast", "continue"):
+                errors.append(f"Map 节点 {node.get('id')} 的失败策略必须是 fail_fast 或 continue")
+        
         # 7. 检查是否有孤立的节点（没有入边和出边）
-        connected_sources = {edge.get("source") for edge in edges}
-        connected_targets = {edge.get("target") for edge in edges}
-        isolated_nodes = []
-        for node in nodes:
-            node_id = node.get("id")
-            if node_id not in connected_sources and node_id not in connected_targets:
-                if node.get("type") not in ["start", "end"]:
-                    isolated_nodes.append(node_id)
+        isolated_nodes = [
+            node_id for node_id, node in graph.nodes.items()
+            if not graph.in_edges.get(node_id) and not graph.out_edges.get(node_id)
+            and node.get("type") not in ["start", "end"]
+        ]
         if isolated_nodes:
-            warnings.append(f"存在孤立节点: {', '.join(isolated_nodes)}")
-        
-        # 8. 检查循环依赖
-        def has_cycle(edges, start, visited=None, path=None):
-            if visited is None:
-                visited = set()
-            if path is None:
-                path = []
-            
-            if start in visited:
-                return True, path
-            
-            visited.add(start)
-            path.append(start)
-            
-            for edge in edges:
-                if edge.get("source") == start:
-                    next_node = edge.get("target")
-                    if has_cycle(edges, next_node, visited.copy(), path.copy())[0]:
-                        return True, path
-            
-            return False, path
-        
-        for edge in edges:
-            source = edge.get("source")
-            has_cycle_result, cycle_path = has_cycle(edges, source)
-            if has_cycle_result:
-                errors.append(f"存在循环依赖: {' -> '.join(cycle_path)}")
-                break
+            warnings.append(f"存在孤立节点: {self._preview_ids(isolated_nodes)}")
+        isolated = set(isolated_nodes)
+        
+        # 8. 检查从开始节点无法到达的节点
+        if start_nodes:
+            reachable = graph.reachable_from([node.get("id") for node in start_nodes])
+            unreachable = [node_id for node_id in graph.nodes if node_id not in reachable and node_id not in isolated]
+            if unreachable:
+                warnings.append(f"存在从开始节点无法到达的节点: {self._preview_ids(unreachable)}")
+        
+        # 9. 检查没有后续节点的非结束节点（执行到此处分支就结束了）
+        if end_nodes:
+            dead_ends = [
+                node_id for node_id, node in graph.nodes.items()
+                if not graph.out_edges.get(node_id) and node.get("type") != "end" and node_id not in isolated
+            ]
+            if dead_ends:
+                warnings.append(f"存在没有后续节点的非结束节点: {self._preview_ids(dead_ends)}")
+        
+        # 10. 检查循环依赖
+        cycle = graph.find_cycle()
+        if cycle:
+            errors.append(f"存在循环依赖: {' -> '.join(map(str, cycle))}")
         
         return {
             "valid": len(errors) == 0,
@@ -494,6 +537,14 @@ class WorkflowService:
             "edge_count": len(edges)
         }
 
+    @staticmethod
+    def _preview_ids(node_ids: List[str], limit: int = 20) -> str:
+        """节点ID列表过长时只显示前 limit 个"""
+        preview = ', '.join(map(str, node_ids[:limit]))
+        if len(node_ids) > limit:
+            preview += f" 等 {len(node_ids)} 个"
+        return preview
+
 
 class WorkflowVersionService:
     """工作流版本管理服务"""
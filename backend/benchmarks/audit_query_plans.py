@@ -0,0 +1,180 @@
+# backend/benchmarks/audit_query_plans.py
+"""
+热点查询执行计划审计
+
+调用各模块仓储/服务里的热点查询（只读），通过引擎事件捕获实际发出的 SQL，
+逐条执行 EXPLAIN QUERY PLAN：
+- 计划中出现未使用索引的 SCAN 表名（全表扫描）判定为失败
+- USE TEMP B-TREE（临时排序）只提示，不判失败
+
+默认在临时数据库上按模型建表（含声明的索引）；--db 指定已有数据库时直接审计
+（不做修改），可用来确认旧库的索引是否已由 VersionedAutoMigrator 补齐。
+
+退出码：0 全部通过，1 存在全表扫描。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.audit_query_plans
+    python -m benchmarks.audit_query_plans --db ../data/notes.db -v
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+# 全表扫描：SCAN 表名 后面没有 USING (COVERING) INDEX
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)$")
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="热点查询执行计划审计")
+    parser.add_argument("--db", help="审计已有的 SQLite 数据库文件（默认使用临时数据库）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出每条 SQL 的完整执行计划")
+    return parser.parse_args()
+
+
+def build_cases(engine):
+    """(名称, 调用) 列表：每个调用执行一个模块的热点查询"""
+    from sqlalchemy import desc, select
+
+    from app.core.cluster.channel import ClusterChannel
+    from app.modules.acme import ssl_repository as acme
+    from app.modules.ai_chat.models import messages_table
+    from app.modules.cron import log_store, retention
+    from app.modules.cron import services as cron_services
+    from app.modules.docker.models import docker_operation_logs_table
+    from app.modules.sys.api import check_login_attempts
+    from app.modules.workflow.engine import WorkflowEngine
+    from app.modules.workflow.runtime import WorkflowRuntime
+    from app.modules.workflow.services import WorkflowService, WorkflowVersionService
+
+    def query(stmt):
+        def run():
+            with engine.connect() as conn:
+                conn.execute(stmt).all()
+        return run
+
+    workflows = WorkflowService(engine)
+    versions = WorkflowVersionService(engine)
+    workflow_engine = WorkflowEngine(engine)
+    runtime = WorkflowRuntime()
+    runtime._timer_engine = engine
+
+    return [
+        # 定时任务
+        ("cron.get_executions", lambda: cron_services.get_executions(engine, 1)),
+        ("cron.read_execution_log", lambda: log_store.read_execution_log(engine, 1)),
+        ("cron.retention_candidates", lambda: retention._candidate_ids(engine, 1, datetime.now(), 10)),
+        # 工作流
+        ("workflow.get_executions", lambda: workflows.get_executions("wf")),
+        ("workflow.get_node_executions", lambda: workflows.get_node_executions(1)),
+        ("workflow.engine.load_node_rows", lambda: asyncio.run(workflow_engine._load_node_rows(1))),
+        ("workflow.engine.find_cached_result", lambda: asyncio.run(workflow_engine._find_cached_result("k", 60))),
+        ("workflow.runtime.wake_due", runtime._wake_due),
+        ("workflow.versions.list", lambda: versions.list_versions("wf")),
+        ("workflow.versions.get", lambda: versions.get_version_by_workflow_and_version("wf", 1)),
+        # 登录
+        ("sys.check_login_attempts", lambda: check_login_attempts("127.0.0.1")),
+        # 证书
+        ("acme.certificates.valid_by_domain", lambda: acme.CertificateRepository(engine).get_valid_by_domain("example.com")),
+        ("acme.certificates.expiring_soon", lambda: acme.CertificateRepository(engine).get_expiring_soon(30)),
+        ("acme.certificates.by_application", lambda: acme.CertificateRepository(engine).get_by_application(1)),
+        ("acme.applications.pending_renew", lambda: acme.ApplicationRepository(engine).get_pending_renew()),
+        ("acme.applications.by_dns_auth", lambda: acme.ApplicationRepository(engine).get_by_dns_auth(1)),
+        ("acme.executions.latest", lambda: acme.ExecutionRepository(engine).get_latest_by_application(1)),
+        ("acme.downloads.by_certificate", lambda: acme.DownloadLogRepository(engine).get_by_certificate(1)),
+        ("acme.downloads.count", lambda: acme.DownloadLogRepository(engine).get_download_count(1)),
+        # AI 对话、Docker 操作日志
+        ("ai_chat.messages", query(
+            select(messages_table).where(messages_table.c.conversation_id == 1).order_by(messages_table.c.created_at)
+        )),
+        ("docker.operation_logs", query(
+            select(docker_operation_logs_table)
+            .where(docker_operation_logs_table.c.node_id == 1)
+            .order_by(desc(docker_operation_logs_table.c.created_at))
+            .limit(50)
+        )),
+        # 进程间通道
+        ("cluster.poll", ClusterChannel(owner="audit")._poll),
+    ]
+
+
+def explain(engine, statement, parameters):
+    """返回 (完整计划行, 全表扫描的表, 是否用了临时排序)"""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    details = [row[3] for row in rows]
+    scans = []
+    for detail in details:
+        match = _SCAN.match(detail)
+        if match and "USING" not in match.group(2) and match.group(1) != "CONSTANT":
+            scans.append(match.group(1))
+    return details, scans, any("TEMP B-TREE" in detail for detail in details)
+
+
+def main():
+    args = _parse_args()
+    if args.db:
+        if not os.path.exists(args.db):
+            print(f"数据库不存在: {args.db}")
+            return 2
+        path = os.path.abspath(args.db)
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="plan-audit-"), "audit.db")
+    # 必须在导入 app 之前设置，全局引擎指向被审计的数据库
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from sqlalchemy import event
+
+    from app.core.db.database import engine, metadata
+    import app.core.db.registry  # noqa: F401  加载全部模块的表定义
+
+    if not args.db:
+        metadata.create_all(engine)
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    failures, warnings = 0, 0
+    for name, run in build_cases(engine):
+        captured.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            run()
+        except Exception as e:
+            print(f"❌ {name}: 调用失败 {e}")
+            failures += 1
+            continue
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        if not captured:
+            print(f"⚠️ {name}: 没有捕获到查询")
+            warnings += 1
+            continue
+        for statement, parameters in captured:
+            details, scans, temp_sort = explain(engine, statement, parameters)
+            sql = " ".join(statement.split())
+            if scans:
+                failures += 1
+                print(f"❌ {name}: 全表扫描 {', '.join(scans)}\n    {sql}")
+            elif temp_sort:
+                warnings += 1
+                print(f"⚠️ {name}: 使用临时排序\n    {sql}")
+            else:
+                print(f"✅ {name}")
+            if args.verbose or scans:
+                for detail in details:
+                    print(f"      {detail}")
+
+    print(f"\n审计完成: {failures} 个失败, {warnings} 个提示")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
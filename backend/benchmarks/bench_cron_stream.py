@@ -0,0 +1,105 @@
+# backend/benchmarks/bench_cron_stream.py
+"""
+定时任务输出读取 CPU 占用基准
+
+对比旧的 recv_ready 忙轮询与 read_channel 事件驱动读取：
+N 个并发“任务”各自每隔 interval 秒输出一行，持续 duration 秒，
+统计进程 CPU 时间 / 墙钟时间，折算为每个运行中任务占用的 CPU 核数。
+
+通道使用真实的 paramiko.Channel（无传输层），由生产者线程喂数据，
+因此两种读取方式走的是与线上相同的缓冲区与 fileno 管道逻辑。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_cron_stream --jobs 10 --duration 5
+"""
+import argparse
+import threading
+import time
+
+import paramiko
+
+from app.core.sh.ssh_client import read_channel
+
+
+def make_channel(chanid: int) -> paramiko.Channel:
+    channel = paramiko.Channel(chanid)
+    channel.active = False  # 无传输层，跳过窗口调整
+    return channel
+
+
+def produce(channel: paramiko.Channel, duration: float, interval: float):
+    """模拟远端命令：定时输出，结束时发送退出码并关闭通道"""
+    deadline = time.monotonic() + duration
+    n = 0
+    while time.monotonic() < deadline:
+        channel._feed(f"line {n}\n".encode())
+        n += 1
+        time.sleep(interval)
+    with channel.lock:
+        channel.exit_status = 0
+        channel._set_closed()
+
+
+def busy_poll_reader(channel: paramiko.Channel, sink: list):
+    """旧实现：无休眠循环检查 recv_ready / exit_status_ready"""
+    while True:
+        if channel.recv_ready():
+            sink.append(channel.recv(1024).decode('utf-8', errors='replace'))
+        if channel.recv_stderr_ready():
+            sink.append(channel.recv_stderr(1024).decode('utf-8', errors='replace'))
+        if channel.exit_status_ready():
+            while channel.recv_ready():
+                sink.append(channel.recv(4096).decode('utf-8', errors='replace'))
+            break
+    return channel.recv_exit_status()
+
+
+def event_reader(channel: paramiko.Channel, sink: list):
+    """新实现：selector 阻塞等待"""
+    return read_channel(channel, sink.append, sink.append, should_stop=lambda: False)
+
+
+def run(reader, jobs: int, duration: float, interval: float) -> dict:
+    channels = [make_channel(i) for i in range(jobs)]
+    sinks = [[] for _ in range(jobs)]
+    threads = []
+    for channel, sink in zip(channels, sinks):
+        threads.append(threading.Thread(target=produce, args=(channel, duration, interval)))
+        threads.append(threading.Thread(target=reader, args=(channel, sink)))
+
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+
+    lines = sum("".join(sink).count("\n") for sink in sinks)
+    return {
+        "cpu_seconds": cpu,
+        "wall_seconds": wall,
+        "cores_total": cpu / wall,
+        "cores_per_job": cpu / wall / jobs,
+        "lines": lines,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=10, help="并发任务数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每个任务运行秒数")
+    parser.add_argument("--interval", type=float, default=0.2, help="输出间隔秒数")
+    args = parser.parse_args()
+
+    print(f"jobs={args.jobs} duration={args.duration}s interval={args.interval}s")
+    print(f"{'reader':<12}{'cpu(s)':>10}{'wall(s)':>10}{'cores':>10}{'cores/job':>12}{'lines':>8}")
+    for name, reader in (("busy-poll", busy_poll_reader), ("selector", event_reader)):
+        r = run(reader, args.jobs, args.duration, args.interval)
+        print(f"{name:<12}{r['cpu_seconds']:>10.2f}{r['wall_seconds']:>10.2f}"
+              f"{r['cores_total']:>10.3f}{r['cores_per_job']:>12.4f}{r['lines']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# backend/benchmarks/bench_sqlite_writes.py
+"""
+SQLite 并发写入基准（复现 database is locked）
+
+模拟线上的写入模式：W 个“执行”线程各自不断追加小日志分块并更新状态，
+同时 R 个读线程反复查询执行列表（对应前端轮询）。对比三种配置：
+- baseline：原来的引擎（回滚日志模式，仅 check_same_thread=False，sqlite3 默认 5 秒锁等待）
+- tuned：WAL + synchronous=NORMAL + busy_timeout 等 PRAGMA
+- tuned+queue：在 tuned 基础上经单写线程队列合并提交
+
+统计写入吞吐、单次写入延迟（p50/p99/max）以及 database is locked 错误数。
+每种配置使用独立的临时数据库文件。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_sqlite_writes --writers 16 --readers 4 --duration 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import (Column, Integer, MetaData, String, Table, Text, create_engine, insert, select,
+                        update)
+from sqlalchemy.exc import OperationalError
+
+from app.core.db.database import create_db_engine
+from app.core.db.write_queue import WriteQueue
+
+metadata = MetaData()
+executions = Table(
+    "executions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("status", String(20)),
+    Column("lines", Integer, default=0),
+)
+chunks = Table(
+    "chunks", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("execution_id", Integer, index=True),
+    Column("content", Text),
+)
+
+
+def make_engine(mode: str, path: str):
+    url = f"sqlite:///{path}"
+    if mode == "baseline":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_db_engine(url)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(mode: str, writers: int, readers: int, duration: float, chunk_size: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = make_engine(mode, path)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(executions), [{"id": i + 1, "status": "running"} for i in range(writers)])
+
+    writer_queue = WriteQueue(engine, enabled=(mode == "tuned+queue"))
+    latencies, errors, reads = [], [0], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    payload = "x" * chunk_size
+
+    def write_loop(execution_id: int):
+        n = 0
+        while time.monotonic() < deadline:
+            n += 1
+
+            def work(conn, n=n):
+                conn.execute(insert(chunks).values(execution_id=execution_id, content=payload))
+                conn.execute(update(executions).where(executions.c.id == execution_id).values(lines=n))
+
+            begin = time.monotonic()
+            try:
+                writer_queue.execute(work)
+            except OperationalError:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.monotonic() - begin)
+
+    def read_loop():
+        while time.monotonic() < deadline:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(select(executions)).all()
+                    conn.execute(select(chunks.c.id).order_by(chunks.c.id.desc()).limit(100)).all()
+                with lock:
+                    reads[0] += 1
+            except OperationalError:
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=write_loop, args=(i + 1,)) for i in range(writers)]
+    threads += [threading.Thread(target=read_loop) for _ in range(readers)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - start
+    writer_queue.close()
+    engine.dispose()
+
+    return {
+        "writes_per_second": len(latencies) / wall,
+        "reads_per_second": reads[0] / wall,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies, default=0) * 1000,
+        "locked_errors": errors[0],
+        "batches": writer_queue.stats()["avg_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=16, help="并发写线程数")
+    parser.add_argument("--readers", type=int, default=4, help="并发读线程数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每种配置运行秒数")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="每次写入的日志分块字符数")
+    args = parser.parse_args()
+
+    print(f"writers={args.writers} readers={args.readers} duration={args.duration}s chunk={args.chunk_size}")
+    print(f"{'mode':<14}{'writes/s':>10}{'reads/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}"
+          f"{'locked':>8}{'batch':>8}")
+    for mode in ("baseline", "tuned", "tuned+queue"):
+        r = run(mode, args.writers, args.readers, args.duration, args.chunk_size)
+        print(f"{mode:<14}{r['writes_per_second']:>10.0f}{r['reads_per_second']:>10.0f}{r['p50_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['locked_errors']:>8}{r['batches']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# backend/benchmarks/bench_workflow_validate.py
+"""
+工作流校验基准
+
+生成分层的“菱形密集”DAG：开始节点 -> 若干层（每层 width 个节点，
+每个节点连到下一层的 fanout 个节点）-> 结束节点，对不同规模的图计时
+WorkflowService.validate_workflow_format。
+
+--legacy-max 指定的规模以内同时运行原来的实现（逐节点 count 查重 +
+按边递归复制路径的环检测），用于对比；原实现在菱形图上是指数级的，
+规模稍大就无法完成，因此默认只跑很小的图。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_workflow_validate --sizes 10,100,500,1000,5000
+"""
+import argparse
+import time
+
+from app.modules.workflow.services import WorkflowService
+
+
+def make_graph(size: int, width: int, fanout: int):
+    nodes = [{"id": "start", "type": "start"}]
+    edges = []
+    layers, previous = [], ["start"]
+    count = 0
+    while count < size:
+        layer = []
+        for _ in range(min(width, size - count)):
+            node_id = f"n{count}"
+            nodes.append({"id": node_id, "type": "condition", "config": {"expression": "True"}})
+            layer.append(node_id)
+            count += 1
+        layers.append(layer)
+    for layer in layers:
+        for i, source in enumerate(previous):
+            for k in range(min(fanout, len(layer))):
+                edges.append({"source": source, "target": layer[(i + k) % len(layer)]})
+        previous = layer
+    nodes.append({"id": "end", "type": "end"})
+    edges.extend({"source": source, "target": "end"} for source in previous)
+    return nodes, edges
+
+
+def legacy_validate(nodes, edges):
+    """原实现中的查重与环检测部分"""
+    node_ids = [node.get("id") for node in nodes]
+    [nid for nid in node_ids if node_ids.count(nid) > 1]
+
+    def has_cycle(edges, start, visited=None, path=None):
+        if visited is None:
+            visited = set()
+        if path is None:
+            path = []
+        if start in visited:
+            return True, path
+        visited.add(start)
+        path.append(start)
+        for edge in edges:
+            if edge.get("source") == start:
+                if has_cycle(edges, edge.get("target"), visited.copy(), path.copy())[0]:
+                    return True, path
+        return False, path
+
+    for edge in edges:
+        if has_cycle(edges, edge.get("source"))[0]:
+            break
+
+
+def timed(fn, *args) -> float:
+    begin = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - begin) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,500,1000,2000,5000", help="节点数列表（逗号分隔）")
+    parser.add_argument("--width", type=int, default=4, help="每层节点数")
+    parser.add_argument("--fanout", type=int, default=2, help="每个节点连到下一层的节点数")
+    parser.add_argument("--legacy-max", type=int, default=20, help="不超过该规模时同时运行原实现")
+    args = parser.parse_args()
+
+    service = WorkflowService(engine=None)
+    print(f"width={args.width} fanout={args.fanout}")
+    print(f"{'nodes':>8}{'edges':>8}{'validate(ms)':>14}{'legacy(ms)':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        nodes, edges = make_graph(size, args.width, args.fanout)
+        result = service.validate_workflow_format(nodes, edges)
+        assert result["valid"], result["errors"]
+        elapsed = timed(service.validate_workflow_format, nodes, edges)
+        legacy = f"{timed(legacy_validate, nodes, edges):>14.1f}" if size <= args.legacy_max else f"{'-':>14}"
+        print(f"{len(nodes):>8}{len(edges):>8}{elapsed:>14.1f}{legacy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# backend/benchmarks/check_cron_executor_fairness.py
+"""
+定时任务执行器公平性检查
+
+单节点并发为 1，目标节点上源源不断地提交单节点任务时：
+- 多节点任务（需要所有目标节点同时有名额）应在有限时间内执行，不被饿死
+- 多节点任务因自身的 fanout 名额等待（同一任务上一次还在执行）时，不预留节点，
+  这些节点上的单节点任务照常执行
+
+退出码：0 通过，1 不通过。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.check_cron_executor_fairness
+"""
+import itertools
+import sys
+import threading
+import time
+
+from app.modules.cron.executor import CronExecutor, fanout_slot
+
+# 多节点任务的最长等待（秒）
+MAX_FANOUT_WAIT = 1.0
+
+
+def main():
+    executor = CronExecutor(max_workers=4, max_per_node=1)
+    ids = itertools.count(1)
+    done = {}
+    stop = threading.Event()
+
+    def task(name: str, seconds: float = 0.05):
+        def run():
+            time.sleep(seconds)
+            done[name] = time.monotonic()
+        return run
+
+    def feed():
+        # 节点 1、2 上保持各 3 个排队中的单节点任务
+        while not stop.is_set():
+            for node in (1, 2):
+                with executor._cond:
+                    queued = sum(1 for t in executor._queued.values() if t.slots == (node,))
+                for _ in range(3 - queued):
+                    i = next(ids)
+                    executor.submit(i, node, task(f"single-{i}"))
+            time.sleep(0.005)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    time.sleep(0.3)
+
+    failures = 0
+    submitted = time.monotonic()
+    executor.submit(next(ids), (fanout_slot(1), 1, 2), task("fanout"))
+    time.sleep(MAX_FANOUT_WAIT + 0.5)
+    if "fanout" in done and done["fanout"] - submitted <= MAX_FANOUT_WAIT:
+        print(f"✅ 多节点任务等待 {done['fanout'] - submitted:.3f} 秒后执行")
+    else:
+        failures += 1
+        print(f"❌ 多节点任务 {MAX_FANOUT_WAIT} 秒内未执行")
+
+    executor.submit(next(ids), (fanout_slot(2), 3), task("previous", 1.0))
+    time.sleep(0.1)
+    executor.submit(next(ids), (fanout_slot(2), 3, 4), task("waiting"))
+    executor.submit(next(ids), 4, task("node-4"))
+    time.sleep(0.5)
+    if "node-4" in done and "waiting" not in done:
+        print("✅ 等待自身 fanout 名额的多节点任务不挡住节点 4 上的任务")
+    else:
+        failures += 1
+        print("❌ 节点 4 上的任务被等待中的多节点任务挡住")
+
+    stop.set()
+    feeder.join()
+    executor.shutdown()
+    print(f"\n检查完成: {failures} 项不通过")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# backend/benchmarks/check_workflow_expressions.py
+"""
+工作流条件表达式回归检查
+
+对照原来的求值方式（先把 {{变量}} 按文本替换、结果是 JSON 时解析，再 eval），
+检查编译后的 Condition 在常见写法上的结果一致，重点是字符串类型的任务输出和表单输入
+（如 {{outputs.n1.output}} == 3、{{inputs.count}} > 5）。
+
+退出码：0 全部一致，1 存在不一致。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.check_workflow_expressions
+"""
+import json
+import re
+import sys
+
+from app.modules.workflow.expression import Condition, ExpressionError
+
+STATE = {
+    "inputs": {"count": "10", "env": "prod", "flag": "true", "ratio": "0.5", "name": "web-01", "empty": ""},
+    "outputs": {
+        "n1": {"status": "success", "output": "3", "error": ""},
+        "n3": {"status": "success", "output": "3\n", "error": ""},
+        "n2": {"status": "failed", "output": '{"ok": false, "items": [1, 2]}', "error": "boom"},
+    },
+}
+
+CASES = [
+    ("{{outputs.n1.output}} == 3", True),
+    ("{{outputs.n1.output}} >= 2 and {{outputs.n1.output}} < 4", True),
+    ("{{outputs.n3.output}} == 3", True),
+    ("{{inputs.count}} > 5", True),
+    ("{{inputs.count}} + 1 == 11", True),
+    ("{{inputs.ratio}} < 1", True),
+    ("{{inputs.flag}}", True),
+    ("{{inputs.flag}} == True", True),
+    ('"{{inputs.env}}" == "prod"', True),
+    ('{{inputs.name}} == "web-01"', True),
+    ('{{inputs.empty}} == ""', True),
+    ('{{outputs.n1.status}} == "success"', True),
+    ('{{outputs.n2.status}} != "success"', True),
+    ('outputs.n2.status == "failed"', True),
+    ("inputs.count == '10'", True),
+]
+
+
+class _AttrDict(dict):
+    def __getattr__(self, item):
+        value = self[item]
+        return _AttrDict(value) if isinstance(value, dict) else value
+
+
+def legacy_evaluate(expression: str, state: dict) -> bool:
+    """原实现：文本替换 + json.loads + eval"""
+    def replace(match):
+        current = state
+        for part in match.group(1).split('.'):
+            if isinstance(current, dict) and part in current:
+                current = current[part]
+            else:
+                return match.group(0)
+        return str(current) if current is not None else ''
+
+    resolved = re.sub(r'\{\{\s*([a-zA-Z0-9_.]+)\s*\}\}', replace, expression)
+    if resolved != expression:
+        try:
+            resolved = json.loads(resolved)
+        except (json.JSONDecodeError, TypeError):
+            pass
+    safe_globals = {'__builtins__': {}, 'True': True, 'False': False, 'None': None,
+                    'inputs': _AttrDict(state['inputs']), 'outputs': _AttrDict(state['outputs'])}
+    try:
+        return bool(eval(str(resolved), safe_globals, {}))
+    except Exception:
+        return False
+
+
+def main():
+    failures = 0
+    for expression, expected in CASES:
+        try:
+            result = Condition(expression).evaluate(STATE)
+        except ExpressionError as e:
+            result = f"错误: {e}"
+        legacy = legacy_evaluate(expression, STATE)
+        if result != expected:
+            failures += 1
+            print(f"❌ {expression}: 结果 {result}，期望 {expected}（原实现 {legacy}）")
+        else:
+            note = "" if legacy == expected else f"（原实现为 {legacy}）"
+            print(f"✅ {expression}{note}")
+    print(f"\n检查完成: {len(CASES)} 条, {failures} 条不一致")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
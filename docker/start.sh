@@ -5,7 +5,9 @@ if [ -z "$JWT_SECRET_KEY" ]; then
 fi
 
 # 启动 Uvicorn（后台）
-uvicorn app.main:app --host 127.0.0.1 --port 8000 --workers 1 &
+# 多 worker（UVICORN_WORKERS>1）：数据库初始化/升级由文件锁串行执行；
+# 定时调度和 CPE 自动监控只在调度主进程运行，手动启动的 CPE 监控只在处理该请求的 worker 中运行
+uvicorn app.main:app --host 127.0.0.1 --port 8000 --workers ${UVICORN_WORKERS:-1} &
 
 # 启动 Nginx（前台，保持容器运行）
 nginx -g 'daemon off;'
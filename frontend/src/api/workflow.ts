@@ -62,6 +62,13 @@ export const workflowApi = {
     return request.get(`${BASE_URL}/${workflowId}/executions`, { params: { limit } })
   },
 
+  /**
+   * 从失败处恢复执行
+   */
+  resumeExecution(executionId) {
+    return request.post(`${BASE_URL}/executions/${executionId}/resume`)
+  },
+
   /**
    * 获取节点执行记录
    */